@@ -0,0 +1,107 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from . import dates, hooks, models, schemas
+from .database import on_tenant_evicted, tenant_of
+from .prompts import get_timezone
+
+DIGEST_DAYS = 7
+
+
+def today() -> date:
+    return datetime.now(get_timezone()).date()
+
+
+def upcoming_annotations(db: Session, start: date, end: date) -> List[schemas.AgendaItem]:
+    # starts_on 上的范围扫描：整月标注最长 31 天，所以只需从 start 往前多看 31 天
+    rows = (
+        db.query(models.Annotation, models.Person.name)
+        .join(models.Person, models.Person.id == models.Annotation.person_id)
+        .filter(
+            models.Annotation.starts_on >= dates.widen_start(start),
+            models.Annotation.starts_on <= end.isoformat(),
+            models.Annotation.ends_on >= start.isoformat(),
+        )
+        .order_by(models.Annotation.starts_on, models.Annotation.id)
+        .all()
+    )
+    return [
+        schemas.AgendaItem(
+            kind="annotation",
+            date=ann.starts_on,
+            end_date=ann.ends_on if ann.ends_on != ann.starts_on else None,
+            person_id=ann.person_id,
+            person_name=name,
+            description=ann.description,
+            location=ann.location,
+            annotation_id=ann.id,
+        )
+        for ann, name in rows
+    ]
+
+
+def upcoming_birthdays(db: Session, start: date, end: date) -> List[schemas.AgendaItem]:
+    ranges = dates.month_day_ranges(start, end)
+    rows = (
+        db.query(models.Person.id, models.Person.name, models.Person.birthday, models.Person.birthday_md)
+        .filter(or_(*[and_(models.Person.birthday_md >= lo, models.Person.birthday_md <= hi) for lo, hi in ranges]))
+        .all()
+    )
+    items = []
+    for person_id, name, birthday, month_day in rows:
+        occurrence = dates.next_occurrence(month_day, start)
+        if occurrence > end:
+            continue
+        year = dates.birthday_year(birthday)
+        description = f"{name}生日" if year is None else f"{name}{occurrence.year - year}岁生日"
+        items.append(schemas.AgendaItem(
+            kind="birthday",
+            date=occurrence.isoformat(),
+            person_id=person_id,
+            person_name=name,
+            description=description,
+        ))
+    return items
+
+
+def build_agenda(db: Session, start: date, end: date) -> schemas.AgendaResponse:
+    items = upcoming_annotations(db, start, end) + upcoming_birthdays(db, start, end)
+    items.sort(key=lambda item: (item.date, item.kind, item.person_id))
+    return schemas.AgendaResponse(start=start.isoformat(), end=end.isoformat(), items=items)
+
+
+_digests: Dict[Tuple[str, date], schemas.AgendaResponse] = {}
+_digest_lock = threading.Lock()
+
+
+def daily_digest(db: Session, day: Optional[date] = None) -> schemas.AgendaResponse:
+    day = day or today()
+    key = (tenant_of(db), day)
+    digest = _digests.get(key)
+    if digest is None:
+        digest = build_agenda(db, day, day + timedelta(days=DIGEST_DAYS - 1))
+        with _digest_lock:
+            if len(_digests) > 32:
+                _digests.clear()
+            _digests[key] = digest
+    return digest
+
+
+@on_tenant_evicted
+def _forget_tenant(tenant: str) -> None:
+    with _digest_lock:
+        for key in [k for k in _digests if k[0] == tenant]:
+            del _digests[key]
+
+
+@hooks.on_commit
+def _invalidate_digests(session, changes: hooks.ChangeSet) -> None:
+    if changes.touches("annotations", "persons"):
+        tenant = tenant_of(session)
+        with _digest_lock:
+            for key in [k for k in _digests if k[0] == tenant]:
+                del _digests[key]
@@ -0,0 +1,145 @@
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import metrics
+from .database import DATA_DIR
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 是可选依赖，缺失时不生成缩略图，各尺寸都返回原图
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# 头像按内容寻址存在磁盘上，库里和 /persons、/graph 只带短哈希，图片由 /avatars/{hash} 单独下发。
+# 同样内容的哈希永远指向同样的字节，可以让浏览器/CDN 永久缓存。
+# <img> 请求带不上租户请求头，所以存储不分租户；哈希不可猜，拿到哈希才能取图
+AVATAR_DIR = os.getenv("AVATAR_DIR", os.path.join(DATA_DIR, "avatars"))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+THUMBNAIL_SIZES = tuple(sorted(int(s) for s in os.getenv("AVATAR_THUMBNAIL_SIZES", "48,96,256").split(",") if s.strip()))
+HASH_LENGTH = 32
+HASH_RE = re.compile(rf"^[0-9a-f]{{{HASH_LENGTH}}}$")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_DATA_URL_RE = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+
+
+def media_type(head: bytes) -> Optional[str]:
+    for signature, kind in _SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_hash(value: Optional[str]) -> bool:
+    return bool(value) and HASH_RE.match(value) is not None
+
+
+def path_for(avatar_hash: str, size: Optional[int] = None) -> str:
+    name = avatar_hash if size is None else f"{avatar_hash}.{size}"
+    return os.path.join(AVATAR_DIR, avatar_hash[:2], name)
+
+
+def _write(path: str, data: bytes) -> None:
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _thumbnail(data: bytes, size: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "P")
+        image = ImageOps.fit(image.convert("RGBA" if has_alpha else "RGB"), (size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        if has_alpha:
+            image.save(out, "PNG", optimize=True)
+        else:
+            image.save(out, "JPEG", quality=85, optimize=True)
+        return out.getvalue()
+
+
+def store(data: bytes) -> str:
+    if not data:
+        raise HTTPException(status_code=400, detail="图片为空")
+    if len(data) > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="图片过大")
+    if media_type(data[:16]) is None:
+        raise HTTPException(status_code=400, detail="不支持的图片格式")
+
+    avatar_hash = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    thumbnails = []
+    if Image is not None:
+        try:
+            thumbnails = [(size, _thumbnail(data, size)) for size in THUMBNAIL_SIZES]
+        except Exception as e:
+            logger.info("头像解析失败: %s", e)
+            raise HTTPException(status_code=400, detail="图片无法解析")
+    _write(path_for(avatar_hash), data)
+    for size, thumbnail in thumbnails:
+        _write(path_for(avatar_hash, size), thumbnail)
+    return avatar_hash
+
+
+def store_data_url(value: str) -> str:
+    try:
+        data = base64.b64decode(value.split(",", 1)[1], validate=True)
+    except (IndexError, binascii.Error):
+        raise HTTPException(status_code=400, detail="图片数据无效")
+    return store(data)
+
+
+def normalize(value: Optional[str]) -> Optional[str]:
+    """PATCH 等接口传入的 data URL 转存为哈希；哈希和外部 URL 原样保留。"""
+    if value and _DATA_URL_RE.match(value):
+        return store_data_url(value)
+    return value
+
+
+def resolve(avatar_hash: str, size: Optional[int]) -> Tuple[str, str]:
+    """返回 (文件路径, Content-Type)；缩略图缺失时按需补生成，没有 Pillow 时退回原图。"""
+    original = path_for(avatar_hash)
+    if not os.path.exists(original):
+        raise HTTPException(status_code=404, detail="头像不存在")
+    path = original
+    if size is not None and Image is not None:
+        path = path_for(avatar_hash, size)
+        exists = os.path.exists(path)
+        metrics.cache_lookup("avatar_thumbnail", exists)
+        if not exists:
+            with open(original, "rb") as f:
+                data = f.read()
+            try:
+                _write(path, _thumbnail(data, size))
+            except Exception as e:
+                logger.warning("生成头像缩略图失败 %s: %s", avatar_hash, e)
+                path = original
+    with open(path, "rb") as f:
+        kind = media_type(f.read(16)) or "application/octet-stream"
+    return path, kind
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from . import llm, metrics, prompts, schemas
+
+logger = logging.getLogger(__name__)
+
+# 微批：有请求在途时，新到的短文本先攒几毫秒，打包成一次上游请求，共享同一份系统提示词；
+# 空闲时的单条请求直接发出，不付等待窗口。EXTRACT_BATCH_MAX_SIZE=1 时关闭
+BATCH_WINDOW_SECONDS = float(os.getenv("EXTRACT_BATCH_WINDOW_MS", "5")) / 1000
+BATCH_MAX_SIZE = int(os.getenv("EXTRACT_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_INPUT_CHARS = int(os.getenv("EXTRACT_BATCH_MAX_INPUT_CHARS", "200"))
+OUTPUT_TOKENS_PER_INPUT = 600
+MAX_BATCH_OUTPUT_TOKENS = 8192
+
+
+async def extract_one(api_key: str, text: str, on_delta: Optional[Callable[[str], None]] = None,
+                      ) -> schemas.ExtractResponse:
+    return await llm.complete_structured(
+        api_key,
+        prompts.EXTRACT_PROMPT.render(),
+        text,
+        llm.parse_extract_response,
+        response_schema=schemas.ExtractResponse,
+        max_tokens=2000,
+        timeout=20.0,
+        on_delta=on_delta,
+    )
+
+
+def normalize_batch_payload(data: Any) -> Dict[str, Any]:
+    # 单条结果坏掉只丢这一条，其余照常返回，丢掉的由调用方单独重试
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        raise llm.ResponseParseError("批量结果缺少 results 数组")
+    results = []
+    for item in data["results"]:
+        if not isinstance(item, dict) or not isinstance(item.get("index"), int):
+            continue
+        try:
+            results.append({"index": item["index"], "result": llm.normalize_extract_payload(item.get("result"))})
+        except llm.ResponseParseError:
+            continue
+    return {"results": results}
+
+
+def parse_batch_response(content: Optional[str], model: str) -> schemas.ExtractBatchResponse:
+    return llm.parse_structured(content, schemas.ExtractBatchResponse, model, normalize_batch_payload)
+
+
+def pack(texts: List[str]) -> str:
+    return "\n".join(f"[{i}] {' '.join(text.split())}" for i, text in enumerate(texts, 1))
+
+
+class ExtractBatcher:
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_size: int = BATCH_MAX_SIZE,
+                 max_input_chars: int = BATCH_MAX_INPUT_CHARS):
+        self.window = window
+        self.max_size = max_size
+        self.max_input_chars = max_input_chars
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight = 0
+
+    async def extract(self, api_key: str, text: str) -> schemas.ExtractResponse:
+        if self.max_size <= 1 or len(text) > self.max_input_chars:
+            return await extract_one(api_key, text)
+        cached = llm.result_cache.get((prompts.EXTRACT_PROMPT.render().cache_key, text))
+        if cached is not None:
+            return cached
+
+        if self._inflight == 0 and not self._pending.get(api_key):
+            self._inflight += 1
+            try:
+                return await extract_one(api_key, text)
+            finally:
+                self._inflight -= 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(api_key, [])
+        pending.append((text, future))
+        if len(pending) >= self.max_size:
+            self._start_flush(api_key)
+        elif len(pending) == 1:
+            self._timers[api_key] = loop.call_later(self.window, self._start_flush, api_key)
+        return await future
+
+    def _start_flush(self, api_key: str) -> None:
+        timer = self._timers.pop(api_key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(api_key, [])
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(api_key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        # 同批的调用方都已取消（或都拿到结果）时中止上游请求
+        def abandon(_):
+            if not task.done() and all(future.done() for _, future in batch):
+                task.cancel()
+        for _, future in batch:
+            future.add_done_callback(abandon)
+
+    async def _run(self, api_key: str, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self._inflight += 1
+        try:
+            await self._run_batch(api_key, batch)
+        finally:
+            self._inflight -= 1
+
+    async def _run_batch(self, api_key: str, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        batch = [(text, future) for text, future in batch if not future.done()]
+        if not batch:
+            return
+        metrics.EXTRACT_BATCH_SIZE.observe(len(batch))
+        if len(batch) == 1:
+            await self._run_single(api_key, *batch[0])
+            return
+
+        # 同一批里重复的文本只发一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        by_text: Dict[str, schemas.ExtractResponse] = {}
+        try:
+            prompt = prompts.EXTRACT_BATCH_PROMPT.render()
+            parsed = await llm.complete_structured(
+                api_key,
+                prompt,
+                pack(texts),
+                parse_batch_response,
+                response_schema=schemas.ExtractBatchResponse,
+                max_tokens=min(OUTPUT_TOKENS_PER_INPUT * len(texts), MAX_BATCH_OUTPUT_TOKENS),
+                timeout=30.0,
+                use_cache=False,
+            )
+            for item in parsed.results:
+                if 1 <= item.index <= len(texts):
+                    by_text.setdefault(texts[item.index - 1], item.result)
+        except llm.LLMError as e:
+            logger.warning("批量抽取失败，逐条重试: %s", e)
+
+        single_key = prompts.EXTRACT_PROMPT.render().cache_key
+        retry = []
+        for text, future in batch:
+            result = by_text.get(text)
+            if result is None:
+                retry.append((text, future))
+                continue
+            llm.result_cache.put((single_key, text), result)
+            if not future.done():
+                future.set_result(result.model_copy(deep=True))
+        retry = [(text, future) for text, future in retry if not future.done()]
+        if retry:
+            metrics.EXTRACT_BATCH_FALLBACKS.inc(len(retry))
+            await asyncio.gather(*(self._run_single(api_key, text, future) for text, future in retry))
+
+    async def _run_single(self, api_key: str, text: str, future: asyncio.Future) -> None:
+        try:
+            result = await extract_one(api_key, text)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ExtractBatcher]" = weakref.WeakKeyDictionary()
+
+
+def batcher() -> ExtractBatcher:
+    # 与 llm.get_client 一样按事件循环各建一个
+    loop = asyncio.get_running_loop()
+    instance = _batchers.get(loop)
+    if instance is None:
+        instance = _batchers[loop] = ExtractBatcher()
+    return instance
+
+
+async def extract(api_key: str, text: str) -> schemas.ExtractResponse:
+    return await batcher().extract(api_key, text)
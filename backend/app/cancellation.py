@@ -0,0 +1,81 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from . import metrics
+from .database import DEFAULT_TENANT
+
+# 调用大模型的接口在客户端断开或被显式取消时中止：取消任务后 CancelledError 会打断
+# 正在进行的 httpx 请求并跳出模型降级循环，不再为没人看的结果消耗上游额度
+DISCONNECT_POLL_SECONDS = 0.1
+JOB_ID_RE = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+STATUS_CANCELLED = 499
+
+# 任务只登记在当前进程内；多 worker 部署时取消请求需要落到同一个 worker（如按租户做会话保持）
+_jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+_reasons: Dict[asyncio.Task, str] = {}
+
+
+def _route(request: Request) -> str:
+    return getattr(request.scope.get("route"), "path", None) or request.url.path
+
+
+def _cancel(task: asyncio.Task, reason: str) -> bool:
+    if task.done():
+        return False
+    _reasons.setdefault(task, reason)
+    task.cancel()
+    return True
+
+
+async def _watch_disconnect(request: Request, task: asyncio.Task) -> None:
+    while not task.done():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+        if await request.is_disconnected():
+            _cancel(task, "disconnect")
+            return
+
+
+async def run(request: Request, work: Awaitable[Any], job_id: Optional[str] = None) -> Any:
+    """在可取消的任务里执行 work；带 job_id 时可以通过 cancel() 按 (租户, job_id) 取消。"""
+    key = None
+    if job_id is not None:
+        key = (getattr(request.state, "tenant", DEFAULT_TENANT), job_id)
+        existing = _jobs.get(key)
+        error = None
+        if not JOB_ID_RE.match(job_id):
+            error = HTTPException(status_code=400, detail="任务标识无效")
+        elif existing is not None and not existing.done():
+            error = HTTPException(status_code=409, detail="任务标识正在使用")
+        if error is not None:
+            # 调用方已经建好了协程，不跑也要关掉，免得 "never awaited" 告警
+            if asyncio.iscoroutine(work):
+                work.close()
+            raise error
+
+    task = asyncio.ensure_future(work)
+    if key is not None:
+        _jobs[key] = task
+    watcher = asyncio.ensure_future(_watch_disconnect(request, task))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        # 外层本身被取消（如服务关闭）时照常向上传播
+        if current is not None and current.cancelling():
+            raise
+        reason = _reasons.get(task, "unknown")
+        metrics.HTTP_CANCELLED.inc(route=_route(request), reason=reason)
+        raise HTTPException(status_code=STATUS_CANCELLED, detail="请求已取消")
+    finally:
+        watcher.cancel()
+        _reasons.pop(task, None)
+        if key is not None and _jobs.get(key) is task:
+            del _jobs[key]
+
+
+def cancel(tenant: str, job_id: str) -> bool:
+    task = _jobs.get((tenant, job_id))
+    return task is not None and _cancel(task, "api")
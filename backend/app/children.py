@@ -0,0 +1,114 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from . import models
+
+# 子记录类型 -> (模型, 可编辑字段, 新建时必填字段, 新建默认值)
+CHILD_SPECS: Dict[str, Tuple[Any, Tuple[str, ...], Tuple[str, ...], Dict[str, Any]]] = {
+    "events": (models.Event, ("date", "location", "description"), ("date", "description"), {}),
+    "annotations": (models.Annotation, ("time", "location", "description"), ("time", "description"),
+                    {"confirmed_by_user": True}),
+    "developments": (models.Development, ("content", "type"), ("content",),
+                     {"type": "resource", "confirmed_by_user": True}),
+}
+
+NOT_FOUND_MESSAGES = {
+    "events": "事件不存在",
+    "annotations": "标注不存在",
+    "developments": "发展方向不存在",
+}
+
+
+def get_child(db: Session, kind: str, person_id: int, child_id: int):
+    model = CHILD_SPECS[kind][0]
+    child = db.query(model).filter(model.id == child_id, model.person_id == person_id).first()
+    if not child:
+        raise HTTPException(status_code=404, detail=NOT_FOUND_MESSAGES[kind])
+    return child
+
+
+def apply_fields(obj, data: Dict[str, Any], fields: Iterable[str]) -> bool:
+    # 显式传 null 只允许用在可空列上（如 location），否则在写库前就返回 422
+    columns = obj.__table__.columns
+    fields = tuple(fields)
+    nulls = [f for f in fields if f in data and data[f] is None and not columns[f].nullable]
+    if nulls:
+        raise HTTPException(status_code=422, detail=f"字段不能为空: {', '.join(nulls)}")
+    changed = False
+    for field in fields:
+        if field in data and getattr(obj, field) != data[field]:
+            setattr(obj, field, data[field])
+            changed = True
+    return changed
+
+
+def create_child(db: Session, kind: str, person_id: int, data: Dict[str, Any], strict: bool = True):
+    model, fields, required, defaults = CHILD_SPECS[kind]
+    missing = [f for f in required if not data.get(f)]
+    if missing and strict:
+        raise HTTPException(status_code=422, detail=f"缺少字段: {', '.join(missing)}")
+    values = {**defaults, **{f: data[f] for f in fields if data.get(f) is not None}}
+    for field in missing:
+        values[field] = ""
+    child = model(person_id=person_id, source="user", **values)
+    db.add(child)
+    return child
+
+
+def _content_key(data: Dict[str, Any], fields: Iterable[str], defaults: Dict[str, Any]) -> tuple:
+    return tuple(data.get(f, defaults.get(f)) for f in fields)
+
+
+def sync_children(db: Session, person: models.Person, kind: str, items: List[Dict[str, Any]]) -> int:
+    # 整表语义（PUT）：按 id 对齐，未带 id 的按内容匹配；只写入真正变化的行
+    model, fields, _, defaults = CHILD_SPECS[kind]
+    existing = {c.id: c for c in getattr(person, kind)}
+    by_content: Dict[tuple, List[Any]] = {}
+    for child in existing.values():
+        by_content.setdefault(tuple(getattr(child, f) for f in fields), []).append(child)
+
+    writes = 0
+    kept = set()
+    pending_new = []
+    for item in items:
+        child = existing.get(item.get("id")) if item.get("id") is not None else None
+        if child is not None and child.id not in kept:
+            kept.add(child.id)
+            if apply_fields(child, item, fields):
+                writes += 1
+            continue
+        pending_new.append(item)
+
+    for item in pending_new:
+        candidates = [c for c in by_content.get(_content_key(item, fields, defaults), []) if c.id not in kept]
+        if candidates:
+            kept.add(candidates[0].id)
+            continue
+        create_child(db, kind, person.id, item, strict=False)
+        writes += 1
+
+    for child_id, child in existing.items():
+        if child_id not in kept:
+            db.delete(child)
+            writes += 1
+    return writes
+
+
+def patch_children(db: Session, person: models.Person, kind: str,
+                   upsert: List[Dict[str, Any]], delete: Optional[List[int]] = None) -> int:
+    _, fields, _, _ = CHILD_SPECS[kind]
+    writes = 0
+    for item in upsert:
+        if item.get("id") is None:
+            create_child(db, kind, person.id, item)
+            writes += 1
+            continue
+        child = get_child(db, kind, person.id, item["id"])
+        if apply_fields(child, item, fields):
+            writes += 1
+    for child_id in delete or []:
+        db.delete(get_child(db, kind, person.id, child_id))
+        writes += 1
+    return writes
@@ -0,0 +1,187 @@
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, aliased
+
+from . import embeddings, hooks, models
+
+# 圈子统计（成员数、两两重叠、常见发展方向）物化在 circle_stats 表里：
+# 写入钩子记下受影响的圈子/人物，提交前在同一事务内只重算这些圈子，/circles/stats 只读这一张表
+TOP_TOPICS = 5
+
+PersonCircle = models.PersonCircle
+Stat = models.CircleStat
+
+
+def _affected_by_persons(conn: Connection, person_ids: Iterable[int]) -> Set[int]:
+    person_ids = list(person_ids)
+    if not person_ids:
+        return set()
+    rows = conn.execute(select(PersonCircle.circle_id).where(PersonCircle.person_id.in_(person_ids)).distinct())
+    return {circle_id for (circle_id,) in rows}
+
+
+def _top_topics(rows) -> Dict[int, List[Dict[str, Any]]]:
+    # 大小写、全半角不同的同一方向合并计数，展示第一次出现的写法
+    merged: Dict[int, Dict[str, List[Any]]] = defaultdict(dict)
+    for circle_id, content, count in rows:
+        key = embeddings.normalize(content)
+        if not key:
+            continue
+        entry = merged[circle_id].setdefault(key, [content, 0])
+        entry[1] += count
+    result = {}
+    for circle_id, topics in merged.items():
+        ranked = sorted(topics.values(), key=lambda item: (-item[1], item[0]))[:TOP_TOPICS]
+        result[circle_id] = [{"topic": topic, "count": count} for topic, count in ranked]
+    return result
+
+
+def refresh(conn: Connection, circle_ids: Optional[Set[int]] = None, person_ids: Iterable[int] = ()) -> None:
+    """重算指定圈子（及指定人物所在圈子）的统计；circle_ids 为 None 时全量重算。"""
+    if circle_ids is None:
+        existing_circles = {cid for (cid,) in conn.execute(select(models.Circle.id))}
+        affected = set(existing_circles)
+        conn.execute(delete(Stat).where(Stat.circle_id.not_in(existing_circles)))
+        gone: Set[int] = set()
+    else:
+        affected = set(circle_ids) | _affected_by_persons(conn, person_ids)
+        if not affected:
+            return
+        existing_circles = {cid for (cid,) in conn.execute(select(models.Circle.id))}
+        gone = affected - existing_circles
+        if gone:
+            conn.execute(delete(Stat).where(Stat.circle_id.in_(gone)))
+        affected &= existing_circles
+        if not affected and not gone:
+            return
+
+    counts = dict(conn.execute(
+        select(PersonCircle.circle_id, func.count(func.distinct(PersonCircle.person_id)))
+        .where(PersonCircle.circle_id.in_(affected)).group_by(PersonCircle.circle_id)
+    ).all())
+
+    other = aliased(PersonCircle)
+    overlaps: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for a, b, count in conn.execute(
+        select(PersonCircle.circle_id, other.circle_id, func.count(func.distinct(PersonCircle.person_id)))
+        .join(other, (other.person_id == PersonCircle.person_id) & (other.circle_id != PersonCircle.circle_id))
+        .where(PersonCircle.circle_id.in_(affected))
+        .group_by(PersonCircle.circle_id, other.circle_id)
+    ):
+        overlaps[a][b] = count
+
+    topics = _top_topics(conn.execute(
+        select(PersonCircle.circle_id, models.Development.content,
+               func.count(func.distinct(PersonCircle.person_id)))
+        .join(models.Development, models.Development.person_id == PersonCircle.person_id)
+        .where(PersonCircle.circle_id.in_(affected))
+        .group_by(PersonCircle.circle_id, models.Development.content)
+    ))
+
+    # 重叠是对称的：受影响圈子的新数字也要写进其它圈子的那一行
+    patched = []
+    for circle_id, overlaps_json in conn.execute(
+        select(Stat.circle_id, Stat.overlaps_json).where(Stat.circle_id.not_in(affected | gone))
+    ):
+        current = {int(k): v for k, v in json.loads(overlaps_json or "{}").items()}
+        updated = {k: v for k, v in current.items() if k not in affected and k not in gone}
+        for a in affected:
+            count = overlaps.get(a, {}).get(circle_id)
+            if count:
+                updated[a] = count
+        if updated != current:
+            patched.append({"cid": circle_id, "overlaps": _dumps_overlaps(updated)})
+
+    conn.execute(delete(Stat).where(Stat.circle_id.in_(affected)))
+    if affected:
+        conn.execute(insert(Stat), [
+            {
+                "circle_id": circle_id,
+                "member_count": counts.get(circle_id, 0),
+                "overlaps_json": _dumps_overlaps(overlaps.get(circle_id, {})),
+                "topics_json": json.dumps(topics.get(circle_id, []), ensure_ascii=False),
+            }
+            for circle_id in sorted(affected)
+        ])
+    if patched:
+        conn.execute(
+            update(Stat).where(Stat.circle_id == bindparam("cid")).values(overlaps_json=bindparam("overlaps")),
+            patched,
+        )
+
+
+def _dumps_overlaps(overlaps: Dict[int, int]) -> str:
+    return json.dumps({str(k): overlaps[k] for k in sorted(overlaps)})
+
+
+def _pending(session: Session) -> Dict[str, Any]:
+    state = session.info.get("circle_stats")
+    if state is None:
+        state = session.info["circle_stats"] = {"full": False, "circles": set(), "persons": set(), "new_persons": set()}
+    return state
+
+
+@hooks.on_flush
+def _capture(session: Session, changes: hooks.ChangeSet) -> None:
+    if not changes.touches("person_circles", "developments", "circles", "persons"):
+        return
+    state = _pending(session)
+    if changes.statements:
+        # 批量语句在钩子之后才执行，提交前全量重算
+        state["full"] = True
+        return
+    # 本事务新建的人物此前不在任何圈子里，他的发展方向只有在同时入圈时才影响统计（入圈另有记录）
+    state["new_persons"].update(obj.id for obj in changes.new if isinstance(obj, models.Person))
+    for obj in changes.new + changes.dirty + changes.deleted:
+        if isinstance(obj, models.PersonCircle):
+            state["circles"].add(obj.circle_id)
+        elif isinstance(obj, models.Development) and obj.person_id not in state["new_persons"]:
+            state["persons"].add(obj.person_id)
+        elif isinstance(obj, models.Circle):
+            state["circles"].add(obj.id)
+    if any(isinstance(obj, models.Person) for obj in changes.deleted):
+        state["full"] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _refresh_before_commit(session: Session) -> None:
+    # before_commit 先于提交时的自动 flush，这里先把剩余改动刷出去，钩子才看得到
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    state = session.info.pop("circle_stats", None)
+    if state is None:
+        return
+    conn = session.connection()
+    if state["full"]:
+        refresh(conn)
+    elif state["circles"] or state["persons"]:
+        refresh(conn, state["circles"], state["persons"])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session: Session, previous_transaction) -> None:
+    session.info.pop("circle_stats", None)
+
+
+def stats_payload(db: Session) -> List[Dict[str, Any]]:
+    rows = db.execute(
+        select(models.Circle.id, models.Circle.name, models.Circle.color,
+               Stat.member_count, Stat.overlaps_json, Stat.topics_json)
+        .outerjoin(Stat, Stat.circle_id == models.Circle.id)
+        .order_by(models.Circle.id)
+    )
+    return [
+        {
+            "circle_id": circle_id,
+            "name": name,
+            "color": color,
+            "member_count": member_count or 0,
+            "overlaps": [{"circle_id": int(k), "count": v} for k, v in json.loads(overlaps_json or "{}").items()],
+            "top_topics": json.loads(topics_json or "[]"),
+        }
+        for circle_id, name, color, member_count, overlaps_json, topics_json in rows
+    ]
@@ -1,24 +1,266 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from collections import OrderedDict
+from fastapi import Header, HTTPException, Request
+from typing import Callable, Dict, List, Optional
+import hmac
+import logging
 import os
+import re
+import threading
+import time
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'app.db')}"
+# 连接池参数只对 PostgreSQL 生效；每个 worker 占用 pool_size + max_overflow 个连接，
+# 多 worker 部署时总数要小于数据库的 max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def normalize_url(url: str) -> str:
+    # 接口处理函数运行在线程池里，使用同步 ORM 会话；PostgreSQL 统一走 psycopg 3
+    # （同一个驱动同时支持同步和 asyncio），asyncpg 地址也转成 psycopg
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    for prefix in ("postgresql://", "postgresql+asyncpg://", "postgresql+psycopg_async://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str) -> dict:
+    if is_sqlite(url):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def make_engine(url: str) -> Engine:
+    url = normalize_url(url)
+    return create_engine(url, **engine_options(url))
+
+
+SQLALCHEMY_DATABASE_URL = normalize_url(os.getenv(
+    "DATABASE_URL", f"sqlite:///{os.path.join(DATA_DIR, 'app.db')}"
+))
+IS_SQLITE = is_sqlite(SQLALCHEMY_DATABASE_URL)
+
+# 多租户：默认租户沿用 DATABASE_URL，其它租户按 TENANT_DATABASE_URL 模板各用一个库
+# （默认每个租户一个 SQLite 文件；PostgreSQL 可用 postgresql://.../ps_{tenant}，库需预先创建）
+DEFAULT_TENANT = "default"
+TENANT_DATA_DIR = os.getenv("TENANT_DATA_DIR", os.path.join(DATA_DIR, "tenants"))
+TENANT_DATABASE_URL = os.getenv("TENANT_DATABASE_URL", f"sqlite:///{os.path.join(TENANT_DATA_DIR, '{tenant}.db')}")
+TENANT_MAX_ENGINES = int(os.getenv("TENANT_MAX_ENGINES", "32"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "600"))
+TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def parse_tenant_keys(raw: str) -> Dict[str, str]:
+    keys = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        tenant, _, key = (part.strip() for part in item.partition(":"))
+        if not key or not TENANT_ID_RE.match(tenant) or tenant == DEFAULT_TENANT:
+            raise ValueError(f"TENANT_KEYS 中租户 {tenant!r} 的配置无效")
+        keys[tenant] = key
+    return keys
+
+
+# 只有登记过的租户可用：TENANT_KEYS="acme:密钥,beta:密钥"，请求用 X-Tenant-ID + X-Tenant-Key 认证。
+# 没登记的租户一律 404，不会按需建库；默认租户不需要密钥
+TENANT_KEYS = parse_tenant_keys(os.getenv("TENANT_KEYS", ""))
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"tenant": DEFAULT_TENANT})
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+_evicted_callbacks: List[Callable[[str], None]] = []
+
+
+def on_tenant_evicted(fn: Callable[[str], None]) -> Callable[[str], None]:
+    """租户引擎被淘汰时回调，各模块借此释放按租户缓存的索引、向量矩阵等，内存随引擎 LRU 一起有界。"""
+    _evicted_callbacks.append(fn)
+    return fn
+
+
+def _dispose(evicted) -> None:
+    for tenant, old in evicted:
+        old.dispose()
+        for callback in _evicted_callbacks:
+            try:
+                callback(tenant)
+            except Exception:
+                logger.exception("释放租户 %s 的缓存失败", tenant)
+
+
+class _TenantEngine:
+    __slots__ = ("engine", "last_used", "in_use")
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+
+class TenantEngines:
+    """按租户缓存引擎：LRU 上限 + 空闲回收，首次打开时按需建表/迁移。"""
+
+    def __init__(self, max_engines: int = TENANT_MAX_ENGINES, idle_seconds: float = TENANT_IDLE_SECONDS):
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self._engines: "OrderedDict[str, _TenantEngine]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._init_locks: dict = {}
+
+    def url_for(self, tenant: str) -> str:
+        return normalize_url(TENANT_DATABASE_URL.format(tenant=tenant))
+
+    def acquire(self, tenant: str) -> Engine:
+        if tenant == DEFAULT_TENANT:
+            return engine
+        if tenant not in TENANT_KEYS:
+            raise LookupError(f"租户 {tenant} 未登记")
+        with self._lock:
+            entry = self._engines.get(tenant)
+            if entry is not None:
+                self._engines.move_to_end(tenant)
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                return entry.engine
+            init_lock = self._init_locks.setdefault(tenant, threading.Lock())
+
+        # 建库和迁移放在全局锁之外，避免一个新租户拖慢其它租户
+        with init_lock:
+            with self._lock:
+                entry = self._engines.get(tenant)
+            opened = None
+            if entry is None:
+                opened = _TenantEngine(self._open(tenant))
+            with self._lock:
+                entry = self._engines.setdefault(tenant, opened or entry)
+                self._engines.move_to_end(tenant)
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                evicted = self._evict_locked()
+        # 初始化锁随淘汰一起删除，拿着旧锁的请求可能和新锁并发打开同一租户，多出来的引擎直接关掉
+        if opened is not None and opened is not entry:
+            opened.engine.dispose()
+        _dispose(evicted)
+        return entry.engine
+
+    def release(self, tenant: str) -> None:
+        if tenant == DEFAULT_TENANT:
+            return
+        with self._lock:
+            entry = self._engines.get(tenant)
+            if entry is not None:
+                entry.in_use = max(0, entry.in_use - 1)
+                entry.last_used = time.monotonic()
+
+    def _open(self, tenant: str) -> Engine:
+        from . import migrations  # 避免循环导入：migrations 依赖 Base
+
+        url = self.url_for(tenant)
+        if is_sqlite(url):
+            os.makedirs(TENANT_DATA_DIR, exist_ok=True)
+        tenant_engine = make_engine(url)
+        migrations.ensure_schema(tenant_engine)
+        logger.info("打开租户数据库 %s", tenant)
+        return tenant_engine
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        evicted = []
+        for tenant in list(self._engines):
+            entry = self._engines[tenant]
+            over_limit = len(self._engines) > self.max_engines
+            idle = now - entry.last_used > self.idle_seconds
+            if entry.in_use == 0 and (over_limit or idle):
+                del self._engines[tenant]
+                self._init_locks.pop(tenant, None)
+                evicted.append((tenant, entry.engine))
+        return evicted
+
+    def sweep(self) -> int:
+        with self._lock:
+            evicted = self._evict_locked()
+        _dispose(evicted)
+        return len(evicted)
+
+    def open_tenants(self):
+        with self._lock:
+            return list(self._engines)
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            evicted = [(tenant, entry.engine) for tenant, entry in self._engines.items()]
+            self._engines.clear()
+            self._init_locks.clear()
+        _dispose(evicted)
+
+
+tenant_engines = TenantEngines()
+
+
+@metrics.register_collector
+def _collect_tenant_engines() -> None:
+    tenant_engines.sweep()
+    metrics.TENANT_ENGINES.set(len(tenant_engines.open_tenants()))
+
+
+def tenant_of(session: Session) -> str:
+    return session.info.get("tenant", DEFAULT_TENANT)
+
+
+def session_for(tenant: str) -> Session:
+    """调用方负责 close 后调用 tenant_engines.release(tenant)。"""
+    return SessionLocal(bind=tenant_engines.acquire(tenant), info={"tenant": tenant})
+
+
+def get_tenant(request: Request, x_tenant_id: Optional[str] = Header(None),
+               x_tenant_key: Optional[str] = Header(None)) -> str:
+    tenant = x_tenant_id or DEFAULT_TENANT
+    if not TENANT_ID_RE.match(tenant):
+        raise HTTPException(status_code=400, detail="租户标识无效")
+    if tenant != DEFAULT_TENANT:
+        expected = TENANT_KEYS.get(tenant)
+        if expected is None:
+            raise HTTPException(status_code=404, detail="租户不存在")
+        if not x_tenant_key or not hmac.compare_digest(x_tenant_key.encode("utf-8"), expected.encode("utf-8")):
+            raise HTTPException(status_code=401, detail="租户凭证无效")
+    request.state.tenant = tenant
+    return tenant
+
+
+def get_db(request: Request, x_tenant_id: Optional[str] = Header(None),
+           x_tenant_key: Optional[str] = Header(None)):
+    tenant = get_tenant(request, x_tenant_id, x_tenant_key)
+    db = session_for(tenant)
     try:
         yield db
     finally:
         db.close()
+        tenant_engines.release(tenant)
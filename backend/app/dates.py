@@ -0,0 +1,81 @@
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+# 标注的时间最长是整月，查询时据此收窄 starts_on 的扫描范围
+MAX_SPAN_DAYS = 31
+
+_DAY_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{1,2})$")
+_BIRTHDAY_RE = re.compile(r"^(?:(\d{4})-)?(\d{1,2})-(\d{1,2})$")
+
+
+def parse_time_range(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    if not value:
+        return None, None
+    value = value.strip()
+    try:
+        match = _DAY_RE.match(value)
+        if match:
+            day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            return day.isoformat(), day.isoformat()
+        match = _MONTH_RE.match(value)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            last = calendar.monthrange(year, month)[1]
+            return date(year, month, 1).isoformat(), date(year, month, last).isoformat()
+    except ValueError:
+        pass
+    return None, None
+
+
+def birthday_month_day(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    match = _BIRTHDAY_RE.match(value.strip())
+    if not match:
+        return None
+    month, day = int(match.group(2)), int(match.group(3))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return f"{month:02d}-{day:02d}"
+
+
+def birthday_year(value: Optional[str]) -> Optional[int]:
+    match = _BIRTHDAY_RE.match(value.strip()) if value else None
+    if match and match.group(1):
+        return int(match.group(1))
+    return None
+
+
+def month_day_ranges(start: date, end: date):
+    # 把 [start, end] 转成 MM-DD 区间；跨年时拆成两段，超过一年则覆盖全年。
+    # 月末那天要把当月不存在的日子也带上（平年的 02-29、04-31 等），next_occurrence 会把它们落到月末
+    if (end - start).days >= 365:
+        return [("01-01", "12-31")]
+    first, last = start.strftime("%m-%d"), end.strftime("%m-%d")
+    if end.day == calendar.monthrange(end.year, end.month)[1]:
+        last = f"{end.month:02d}-31"
+    if start.year == end.year:
+        return [(first, last)]
+    return [(first, "12-31"), ("01-01", last)]
+
+
+def next_occurrence(month_day: str, start: date) -> date:
+    month, day = int(month_day[:2]), int(month_day[3:])
+    for year in (start.year, start.year + 1):
+        if month == 2 and day == 29 and not calendar.isleap(year):
+            candidate = date(year, 2, 28)
+        else:
+            try:
+                candidate = date(year, month, day)
+            except ValueError:
+                candidate = date(year, month, calendar.monthrange(year, month)[1])
+        if candidate >= start:
+            return candidate
+    return candidate
+
+
+def widen_start(start: date) -> str:
+    return (start - timedelta(days=MAX_SPAN_DAYS)).isoformat()
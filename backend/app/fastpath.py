@@ -0,0 +1,191 @@
+import functools
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import metrics, schemas
+from .prompts import get_timezone
+
+# 本地规则抽取：只认几类常见短句（和某人吃饭/见面、生日、过敏），
+# 整句都能被规则解释时直接返回，否则交给模型
+MIN_CONFIDENCE = float(os.getenv("EXTRACT_FASTPATH_MIN_CONFIDENCE", "0.9"))
+MAX_LENGTH = 80
+
+# 与 is_similar_event 判定“同一件事”用的是同一组词
+EAT_KEYWORDS = ['吃饭', '吃早饭', '吃午饭', '吃晚饭', '用餐', '进餐', '早餐', '午餐', '晚餐', '早饭', '午饭', '晚饭']
+MEET_KEYWORDS = ['见面', '会面', '碰面', '会见', '相聚', '聚会']
+
+SURNAMES = ("王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕苏卢蒋蔡贾丁魏薛叶阎余潘杜"
+            "戴夏钟汪田任姜范方石姚谭廖邹熊金陆郝孔白崔康毛邱秦江史顾侯邵孟龙万段雷钱汤尹黎易常武乔贺赖龚文")
+COMPOUND_SURNAMES = ("欧阳", "司马", "诸葛", "上官", "东方", "慕容", "皇甫", "令狐", "司徒", "夏侯")
+
+# 形似“姓+名”或“小/老/阿+字”、其实是称谓、职务或时间的词；除非库里真有叫这个名字的人，否则不当人名
+NOT_NAMES = frozenset((
+    "老板", "老师", "老总", "老大", "老公", "老婆", "老妈", "老爸", "老乡", "老友", "老铁", "老哥", "老姐",
+    "老弟", "老妹", "老人", "老外", "老家", "小组", "小孩", "小伙", "小姐", "小哥", "小弟", "小妹", "小区",
+    "阿姨", "阿婆", "高管", "高层", "董事", "董事长", "程序员", "金主", "马上", "常常", "万一", "江湖",
+    "周末", "周一", "周二", "周三", "周四", "周五", "周六", "周日", "周天", "周中", "周年",
+))
+# “小王”“老李”这类昵称库里没有时，交给模型确认是不是人
+NICKNAME_CONFIDENCE = 0.6
+
+# (天数偏移, 是否按月)；今晚/昨晚这类按当天算
+DATE_WORDS: Dict[str, Tuple[int, bool]] = {
+    "大前天": (-3, False), "前天": (-2, False), "昨天": (-1, False), "昨晚": (-1, False),
+    "今天": (0, False), "今晚": (0, False), "刚才": (0, False),
+    "明天": (1, False), "明晚": (1, False), "后天": (2, False), "大后天": (3, False),
+    "下个月": (1, True), "下月": (1, True),
+}
+
+_GIVEN = r"(?:(?![吃喝见在和跟与同对的是生了过一])[一-龥])"
+_NAME = (rf"(?:(?:{'|'.join(COMPOUND_SURNAMES)}){_GIVEN}{{1,2}}"
+         rf"|[{SURNAMES}]{_GIVEN}{{1,2}}|[小老阿]{_GIVEN})")
+_DATE = "|".join(sorted(DATE_WORDS, key=len, reverse=True))
+_KEYWORD = "|".join(sorted(EAT_KEYWORDS + MEET_KEYWORDS, key=len, reverse=True))
+_PRONOUN = "他|她|TA|ta"
+
+class _Patterns:
+    __slots__ = ("event", "birthday", "allergy")
+
+    def __init__(self):
+        self.event = re.compile(
+            rf"^(?P<date>{_DATE})?(?:我们?)?(?:和|跟|与|同)(?P<name>{_NAME})(?P<date2>{_DATE})?"
+            rf"(?:在(?P<location>[^\s，,]{{1,12}}?))?(?P<description>(?:一起)?(?:吃了?|共进)?(?:{_KEYWORD})了?)$"
+        )
+        self.birthday = re.compile(
+            rf"^(?P<name>{_NAME}|{_PRONOUN})?的?生日(?:是|在)?"
+            r"(?:(?P<year>\d{4})[年-])?(?P<month>\d{1,2})[月-](?P<day>\d{1,2})[日号]?$"
+        )
+        self.allergy = re.compile(rf"^(?P<name>{_NAME}|{_PRONOUN})?(?P<note>对[一-龥A-Za-z]{{1,10}}过敏)$")
+
+
+@functools.lru_cache(maxsize=None)
+def patterns() -> _Patterns:
+    # 人名正则很大，编译要十几毫秒，推迟到第一次使用（或启动预热）时
+    return _Patterns()
+
+
+_CLAUSE_SPLIT_RE = re.compile(r"[，,。；;！!、\s]+")
+
+
+@dataclass
+class FastResult:
+    extraction: Optional[schemas.ExtractResponse]
+    confidence: float
+
+
+def _resolve_date(word: Optional[str], today: date) -> Tuple[str, bool]:
+    """返回 (日期文本, 是否在未来)。"""
+    offset, by_month = DATE_WORDS.get(word or "", (0, False))
+    if by_month:
+        month_index = today.month - 1 + offset
+        return f"{today.year + month_index // 12}-{month_index % 12 + 1:02d}", offset > 0
+    return (today + timedelta(days=offset)).isoformat(), offset > 0
+
+
+def _location(raw: Optional[str]) -> Optional[str]:
+    if raw and len(raw) == 3 and raw.endswith("市"):
+        return raw[:-1]
+    return raw
+
+
+def _birthday(match: "re.Match") -> Optional[str]:
+    month, day = int(match.group("month")), int(match.group("day"))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    if match.group("year"):
+        return f"{match.group('year')}-{month:02d}-{day:02d}"
+    return f"{month:02d}-{day:02d}"
+
+
+def _is_nickname(name: str) -> bool:
+    return len(name) == 2 and name[0] in "小老阿"
+
+
+def extract(text: str, today: Optional[date] = None,
+            is_known: Optional[Callable[[str], bool]] = None) -> FastResult:
+    """is_known(name) 查库里是否已有此人，只对可疑的候选名调用；不传时只用 NOT_NAMES 判断。"""
+    text = (text or "").strip()
+    if not text or len(text) > MAX_LENGTH:
+        return FastResult(None, 0.0)
+    today = today or datetime.now(get_timezone()).date()
+
+    names: List[str] = []
+    profile = {"name": "", "birthday": None, "notes": [], "events": []}
+    annotations = []
+    total = covered = 0
+    uncertain = False
+    known: Dict[str, bool] = {}
+
+    def lookup(name: str) -> bool:
+        if name not in known:
+            known[name] = bool(is_known and is_known(name))
+        return known[name]
+
+    compiled = patterns()
+    for clause in _CLAUSE_SPLIT_RE.split(text):
+        if not clause:
+            continue
+        total += len(clause)
+        match = (compiled.event.match(clause) or compiled.birthday.match(clause)
+                 or compiled.allergy.match(clause))
+        if not match:
+            continue
+        name = match.group("name")
+        # “和老板吃饭”里的“老板”不是人名，这一句算没解释出来
+        if name in NOT_NAMES and not lookup(name):
+            continue
+        if match.re is compiled.event:
+            day, future = _resolve_date(match.group("date") or match.group("date2"), today)
+            item = {"location": _location(match.group("location")), "description": match.group("description")}
+            if future:
+                annotations.append({"time": day, **item})
+            else:
+                profile["events"].append({"date": day, **item})
+        elif match.re is compiled.birthday:
+            birthday = _birthday(match)
+            if birthday is None:
+                continue
+            profile["birthday"] = birthday
+        else:
+            profile["notes"].append(match.group("note"))
+        covered += len(clause)
+        if name and not re.fullmatch(_PRONOUN, name) and name not in names:
+            names.append(name)
+            if is_known is not None and _is_nickname(name) and not lookup(name):
+                uncertain = True
+
+    if not names or not total:
+        return FastResult(None, 0.0)
+    confidence = covered / total
+    # 出现多个人名时分不清谁是主要人物、谁该进 relations
+    if len(names) > 1:
+        confidence = min(confidence, 0.5)
+    if uncertain:
+        confidence = min(confidence, NICKNAME_CONFIDENCE)
+    profile["name"] = names[0]
+    extraction = schemas.ExtractResponse(profile=profile, annotations=annotations)
+    return FastResult(extraction, round(confidence, 3))
+
+
+def try_extract(text: str, allow_partial: bool = False,
+                is_known: Optional[Callable[[str], bool]] = None) -> Optional[schemas.ExtractResponse]:
+    """置信度够高时返回本地结果；allow_partial 用于没有模型可用的情况，认出人名就返回。"""
+    result = extract(text, is_known=is_known)
+    if result.confidence >= MIN_CONFIDENCE:
+        metrics.EXTRACT_FASTPATH.inc(outcome="hit")
+        return result.extraction
+    if allow_partial and result.extraction is not None:
+        metrics.EXTRACT_FASTPATH.inc(outcome="partial")
+        return result.extraction
+    metrics.EXTRACT_FASTPATH.inc(outcome="escalated" if not allow_partial else "miss")
+    return None
+
+
+@metrics.register_collector
+def _collect_hit_ratio() -> None:
+    counts = {labels[0]: value for labels, value in metrics.EXTRACT_FASTPATH.items()}
+    total = sum(counts.values())
+    metrics.EXTRACT_FASTPATH_HIT_RATIO.set(counts.get("hit", 0.0) / total if total else 0.0)
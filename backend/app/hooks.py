@@ -0,0 +1,104 @@
+from typing import Any, Callable, Dict, List, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 写入钩子：on_flush 的回调在同一事务内执行（可以继续写库），
+# on_commit 的回调在提交后执行（用于让内存缓存失效，不能再用该 session 写库）
+
+
+class ChangeSet:
+    def __init__(self):
+        self.tables: Set[str] = set()
+        self.new: List[Any] = []
+        self.dirty: List[Any] = []
+        self.deleted: List[Any] = []
+        self.statements: List[Any] = []
+        # flush 回调可以把提交后才需要的数据（如已分配的主键、字段值）放在这里，
+        # 提交后对象属性已过期，commit 回调不应再读对象本身
+        self.payload: Dict[str, List[Any]] = {}
+
+    def merge(self, other: "ChangeSet") -> None:
+        self.tables |= other.tables
+        self.new.extend(other.new)
+        self.dirty.extend(other.dirty)
+        self.deleted.extend(other.deleted)
+        self.statements.extend(other.statements)
+        for key, values in other.payload.items():
+            self.payload.setdefault(key, []).extend(values)
+
+    def objects(self, cls) -> List[Any]:
+        return [o for o in self.new + self.dirty + self.deleted if isinstance(o, cls)]
+
+    def touches(self, *tables: str) -> bool:
+        return any(t in self.tables for t in tables)
+
+
+_flush_listeners: List[Callable[[Session, ChangeSet], None]] = []
+_commit_listeners: List[Callable[[Session, ChangeSet], None]] = []
+
+
+def on_flush(fn: Callable[[Session, ChangeSet], None]):
+    _flush_listeners.append(fn)
+    return fn
+
+
+def on_commit(fn: Callable[[Session, ChangeSet], None]):
+    _commit_listeners.append(fn)
+    return fn
+
+
+def _pending(session: Session) -> ChangeSet:
+    changes = session.info.get("pending_changes")
+    if changes is None:
+        changes = session.info["pending_changes"] = ChangeSet()
+    return changes
+
+
+def _table_of(obj) -> str:
+    return obj.__table__.name
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    changes = ChangeSet()
+    changes.new = list(session.new)
+    changes.dirty = [o for o in session.dirty if session.is_modified(o, include_collections=False)]
+    changes.deleted = list(session.deleted)
+    for obj in changes.new + changes.dirty + changes.deleted:
+        changes.tables.add(_table_of(obj))
+    if not changes.tables:
+        return
+    for fn in _flush_listeners:
+        fn(session, changes)
+    _pending(session).merge(changes)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is None:
+        return
+    changes = ChangeSet()
+    changes.tables.add(table.name)
+    changes.statements.append(orm_execute_state.statement)
+    session = orm_execute_state.session
+    for fn in _flush_listeners:
+        fn(session, changes)
+    _pending(session).merge(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    changes = session.info.pop("pending_changes", None)
+    if changes is None:
+        return
+    for fn in _commit_listeners:
+        fn(session, changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    session.info.pop("pending_changes", None)
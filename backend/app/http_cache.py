@@ -0,0 +1,180 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import hooks, metrics, models, serialize
+from .database import on_tenant_evicted, tenant_of
+
+logger = logging.getLogger(__name__)
+
+# 每个租户的每张表一个版本号，写入时递增；ETag 由“路径 + 查询参数 + 相关表版本”算出。
+# 进程重启后版本号归零，所以 ETag 里带上启动标识，避免旧 ETag 误命中
+#
+# 多个 worker 共用一个数据库时，进程内计数器看不到别的 worker 的写入，所以版本号默认存在
+# table_versions 表里，算 ETag 时读一次（按主键，很便宜）。版本号在提交前、和数据同一个事务里递增，
+# 数据提交了版本号一定跟着变；代价是同一张表的并发写入在版本行上排队，只排在提交前的最后一步。
+# HTTP_CACHE_SHARED_VERSIONS=0 改用进程内计数器，只适用于单 worker
+SHARED_VERSIONS = os.getenv("HTTP_CACHE_SHARED_VERSIONS", "1").lower() not in ("0", "false", "no")
+
+_EPOCH = "db" if SHARED_VERSIONS else uuid.uuid4().hex[:8]
+# 进程内版本号取自全局递增时钟；租户被淘汰后丢掉它的版本号，没记录的表取淘汰时的时钟值，
+# 保证重新打开后不会和淘汰前发出的 ETag 撞上
+_clock = itertools.count(1)
+_floor = 0
+_versions: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+MAX_BODIES = 256
+_bodies: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+
+PERSON_TABLES = ("persons", "events", "annotations", "developments")
+
+
+def bump(tenant: str, tables: Iterable[str]) -> None:
+    with _lock:
+        for table in tables:
+            _versions[(tenant, table)] = next(_clock)
+
+
+def versions(tenant: str, tables: Iterable[str]) -> Tuple[int, ...]:
+    with _lock:
+        return tuple(_versions.get((tenant, t), _floor) for t in tables)
+
+
+def shared_versions(db: Session, tables: Tuple[str, ...]) -> Tuple[int, ...]:
+    rows = dict(db.execute(
+        select(models.TableVersion.table_name, models.TableVersion.version)
+        .where(models.TableVersion.table_name.in_(tables))
+    ).all())
+    return tuple(rows.get(t, 0) for t in tables)
+
+
+def _persist_bump(conn: Connection, tables: Iterable[str]) -> None:
+    # 一条 upsert：表的首行由并发事务同时插入也不会冲突报错（报错会让 PostgreSQL 整个事务作废）
+    tables = sorted(set(tables))
+    if not tables:
+        return
+    insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(models.TableVersion).values([{"table_name": t, "version": 1} for t in tables])
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[models.TableVersion.table_name],
+        set_={"version": models.TableVersion.version + 1},
+    ))
+
+
+# flush 时先递增一次，缩小“已提交但版本号还没变”的窗口；提交后再递增一次兜底
+@hooks.on_flush
+def _bump_on_flush(session: Session, changes: hooks.ChangeSet) -> None:
+    bump(tenant_of(session), changes.tables)
+    if SHARED_VERSIONS:
+        session.info.setdefault("http_cache_tables", set()).update(changes.tables)
+
+
+@event.listens_for(Session, "before_commit")
+def _persist_before_commit(session: Session) -> None:
+    # 提交前别人看不到新版本号，一个事务里所有 flush 涉及的表合并成一次递增
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    tables = session.info.pop("http_cache_tables", None)
+    if tables:
+        _persist_bump(session.connection(), tables)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session: Session, previous_transaction) -> None:
+    session.info.pop("http_cache_tables", None)
+
+
+@hooks.on_commit
+def _bump_on_commit(session: Session, changes: hooks.ChangeSet) -> None:
+    bump(tenant_of(session), changes.tables)
+
+
+def check_workers() -> None:
+    """进程内版本号只在单 worker 下正确：别的 worker 的写入不会让本进程的缓存失效。"""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+    if not SHARED_VERSIONS and workers > 1:
+        raise RuntimeError(f"HTTP_CACHE_SHARED_VERSIONS=0 只支持单 worker，当前 WEB_CONCURRENCY={workers}")
+
+
+def compute_etag(db: Session, tenant: str, key: str, tables: Tuple[str, ...]) -> str:
+    current = shared_versions(db, tables) if SHARED_VERSIONS else versions(tenant, tables)
+    raw = f"{tenant}|{key}|{tables}|{current}"
+    return f'"{_EPOCH}-{hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]}"'
+
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def _cache_key(request: Request) -> str:
+    query = request.url.query
+    return f"{request.url.path}?{query}" if query else request.url.path
+
+
+def cached_response(request: Request, db: Session, tables: Tuple[str, ...], build: Callable[[], Any],
+                    variant: str = "") -> Response:
+    """按表版本做条件 GET：ETag 命中直接 304，响应体缓存命中直接返回，都不查业务表。
+
+    响应还依赖表以外的输入（如当天日期）时，通过 variant 并入缓存键和 ETag。
+    """
+    tenant = tenant_of(db)
+    key = (tenant, f"{_cache_key(request)}|{variant}" if variant else _cache_key(request))
+    etag = compute_etag(db, tenant, key[1], tables)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        matched = _matches(if_none_match, etag)
+        metrics.cache_lookup("http_etag", matched)
+        if matched:
+            return Response(status_code=304, headers=headers)
+
+    with _lock:
+        entry = _bodies.get(key)
+        if entry is not None and entry[0] == etag:
+            _bodies.move_to_end(key)
+            body = entry[1]
+        else:
+            body = None
+    metrics.cache_lookup("http_body", body is not None)
+
+    if body is None:
+        body = serialize.dumps(build())
+        with _lock:
+            _bodies[key] = (etag, body)
+            _bodies.move_to_end(key)
+            while len(_bodies) > MAX_BODIES:
+                _bodies.popitem(last=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@on_tenant_evicted
+def _forget_tenant(tenant: str) -> None:
+    global _floor
+    with _lock:
+        for key in [k for k in _versions if k[0] == tenant]:
+            del _versions[key]
+        for key in [k for k in _bodies if k[0] == tenant]:
+            del _bodies[key]
+        _floor = next(_clock)
+
+
+def clear() -> None:
+    with _lock:
+        _bodies.clear()
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import metrics, models, serialize
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key：首次请求先占位（pending），写入与“已提交”标记在同一个事务里提交，
+# 之后再存响应体。重试时：
+#   - 已有响应 -> 原样返回，不再执行写入
+#   - 仍在处理 / 已提交但响应未存 -> 等待首次请求结束
+#   - 占位超时且未提交（首次请求中途崩溃，写入已回滚）-> 接管重新执行
+#   - 已提交超过宽限期仍没有响应（提交后、存响应前崩溃）-> 用接口提供的 rebuild 按已提交的数据重建响应；
+#     没有 rebuild 的接口接管重新执行，要求其写入本身可重放
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+PENDING_TIMEOUT_SECONDS = 120.0
+COMMITTED_GRACE_SECONDS = 10.0
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+POLL_SECONDS = 0.05
+KEY_RE = re.compile(r"^[A-Za-z0-9_.:-]{1,255}$")
+REPLAY_HEADER = "Idempotent-Replayed"
+
+_table = models.IdempotencyKey
+
+
+def _where(endpoint: str, key: str):
+    return (_table.endpoint == endpoint, _table.key == key)
+
+
+def _orphaned(row, now: float) -> bool:
+    return row.state == "committed" and now - row.created_ts > COMMITTED_GRACE_SECONDS
+
+
+def _reserve(db: Session, endpoint: str, key: str, fingerprint: str, replay_committed: bool = False) -> Optional[Any]:
+    """占位成功返回 None，否则返回已有记录。"""
+    now = time.time()
+    with db.get_bind().begin() as conn:
+        conn.execute(delete(_table).where(_table.created_ts < now - IDEMPOTENCY_TTL_SECONDS))
+        row = conn.execute(select(_table).where(*_where(endpoint, key))).first()
+        if row is None:
+            conn.execute(insert(_table).values(endpoint=endpoint, key=key, fingerprint=fingerprint,
+                                               state="pending", created_ts=now))
+            return None
+        stale = ((row.state == "pending" and now - row.created_ts > PENDING_TIMEOUT_SECONDS)
+                 or (replay_committed and _orphaned(row, now)))
+        if row.fingerprint == fingerprint and stale:
+            taken = conn.execute(
+                update(_table).where(*_where(endpoint, key), _table.state == row.state,
+                                     _table.created_ts == row.created_ts).values(state="pending", created_ts=now)
+            ).rowcount
+            if taken:
+                logger.warning("接管超时未完成的幂等请求 %s %s", endpoint, key)
+                return None
+        return row
+
+
+def _release(db: Session, endpoint: str, key: str) -> None:
+    with db.get_bind().begin() as conn:
+        conn.execute(delete(_table).where(*_where(endpoint, key), _table.state == "pending"))
+
+
+def _finish(db: Session, endpoint: str, key: str, body: bytes) -> None:
+    with db.get_bind().begin() as conn:
+        conn.execute(update(_table).where(*_where(endpoint, key)).values(
+            state="done", status_code=200, response_body=body.decode("utf-8")))
+
+
+@event.listens_for(Session, "before_commit")
+def _mark_committed(session: Session) -> None:
+    held = session.info.get("idempotency")
+    if held is None:
+        return
+    # 直接走连接执行，不触发写入钩子；与业务写入同一事务提交。created_ts 改记提交时刻，宽限期从这里算
+    session.connection().execute(update(_table).where(*_where(*held), _table.state == "pending")
+                                 .values(state="committed", created_ts=time.time()))
+
+
+def execute(db: Session, key: Optional[str], endpoint: str, payload: BaseModel, run: Callable[[], Any],
+            rebuild: Optional[Callable[[], Any]] = None) -> Any:
+    """rebuild：首次请求已提交但没来得及保存响应时，按已提交的数据重新生成响应。"""
+    if key is None:
+        return run()
+    if not KEY_RE.match(key):
+        raise HTTPException(status_code=400, detail="幂等键无效")
+    fingerprint = hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        try:
+            row = _reserve(db, endpoint, key, fingerprint, replay_committed=rebuild is None)
+        except IntegrityError:
+            row = False  # 并发的同键请求刚刚占位
+        if row is None:
+            break
+        if row is not False:
+            if row.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="幂等键已用于内容不同的请求")
+            if row.state == "done":
+                metrics.cache_lookup("idempotency", True)
+                return Response(content=row.response_body, status_code=row.status_code,
+                                media_type="application/json", headers={REPLAY_HEADER: "true"})
+            if rebuild is not None and _orphaned(row, time.time()):
+                logger.warning("幂等请求已提交但响应未保存，按已提交的数据重建 %s %s", endpoint, key)
+                metrics.cache_lookup("idempotency", True)
+                body = serialize.dumps(rebuild())
+                _finish(db, endpoint, key, body)
+                return Response(content=body, status_code=200, media_type="application/json",
+                                headers={REPLAY_HEADER: "true"})
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail="相同幂等键的请求仍在处理中")
+        time.sleep(POLL_SECONDS)
+
+    metrics.cache_lookup("idempotency", False)
+    db.info["idempotency"] = (endpoint, key)
+    try:
+        result = run()
+    except BaseException:
+        db.rollback()
+        _release(db, endpoint, key)
+        raise
+    finally:
+        db.info.pop("idempotency", None)
+    _finish(db, endpoint, key, serialize.dumps(result))
+    return result
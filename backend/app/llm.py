@@ -0,0 +1,622 @@
+import asyncio
+import json
+import re
+import weakref
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+import httpx
+from pydantic import BaseModel, ValidationError
+
+from . import metrics, resilience, schemas
+from .prompts import RenderedPrompt
+
+NVIDIA_API_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
+
+FALLBACK_MODELS = [
+    "z-ai/glm4.7",
+    "deepseek-ai/DeepSeek-V3",
+    "Qwen/Qwen2.5-72B-Instruct",
+    "meta/llama-3.1-405b-instruct"
+]
+
+# structured: "guided_json" 走 nvext 约束解码，"json_object" 走 OpenAI 兼容的 JSON 模式
+MODEL_CAPABILITIES = {
+    "z-ai/glm4.7": {"structured": "json_object"},
+    "deepseek-ai/DeepSeek-V3": {"structured": "json_object"},
+    "Qwen/Qwen2.5-72B-Instruct": {"structured": "guided_json"},
+    "meta/llama-3.1-405b-instruct": {"structured": "guided_json"},
+}
+
+# 400/422 的响应体点名这些参数时才认定模型不支持，记住一段时间后再试；
+# 其它 400/422（提示词有问题、请求过大）只对当次请求去掉参数重试
+UNSUPPORTED_MARKERS = {
+    "structured": ("response_format", "json_schema", "json_object", "guided_json", "nvext"),
+    "prompt_cache": ("cache_control",),
+}
+DOWNGRADE_TTL_SECONDS = 3600.0
+_downgrades: Dict[Tuple[str, str], float] = {}  # (模型, 能力) -> 到期时刻（monotonic）
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+
+# 结构化结果缓存，键里带提示词指纹，提示词版本变化后旧结果自然失效
+class ResultCache:
+    def __init__(self, name: str, maxsize: int = 512):
+        self.name = name
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, BaseModel]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[BaseModel]:
+        value = self._data.get(key)
+        metrics.cache_lookup(self.name, value is not None)
+        if value is None:
+            return None
+        self._data.move_to_end(key)
+        return value.model_copy(deep=True)
+
+    def put(self, key: Any, value: BaseModel) -> None:
+        self._data[key] = value.model_copy(deep=True)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+result_cache = ResultCache("llm_result")
+
+
+class LLMError(Exception):
+    pass
+
+
+class ResponseParseError(LLMError):
+    pass
+
+
+class ModelUnavailable(LLMError):
+    pass
+
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)(?:```|$)")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+# 增量解析模型输出中的第一个 JSON 对象：可以分块 feed，
+# 截断时回退到最后一个完整值并补齐括号，多余的尾逗号直接丢弃
+class TolerantJSONParser:
+    def __init__(self):
+        self._buf: List[str] = []
+        self._started = False
+        self._done = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._expect_key = False
+        self._pending_comma: Optional[int] = None
+        self._drop: List[int] = []
+        self._last_safe: Optional[tuple] = None
+        self.repaired = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> None:
+        for ch in chunk:
+            if self._done:
+                return
+            if not self._started:
+                if ch != "{":
+                    continue
+                self._started = True
+            self._consume(ch)
+
+    def _consume(self, ch: str) -> None:
+        pos = len(self._buf)
+        self._buf.append(ch)
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if not self._string_is_key:
+                    self._last_safe = (pos + 1, "".join(self._stack))
+            return
+
+        if ch == '"':
+            self._in_string = True
+            self._string_is_key = bool(self._stack) and self._stack[-1] == "{" and self._expect_key
+            self._pending_comma = None
+        elif ch in "{[":
+            self._stack.append(ch)
+            self._expect_key = ch == "{"
+            self._pending_comma = None
+            self._last_safe = (pos + 1, "".join(self._stack))
+        elif ch in "}]":
+            if self._pending_comma is not None:
+                self._drop.append(self._pending_comma)
+                self._pending_comma = None
+            if self._stack:
+                self._stack.pop()
+            self._expect_key = False
+            self._last_safe = (pos + 1, "".join(self._stack))
+            if not self._stack:
+                self._done = True
+        elif ch == ",":
+            self._last_safe = (pos, "".join(self._stack))
+            self._pending_comma = pos
+            self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+        elif ch == ":":
+            self._expect_key = False
+        elif not ch.isspace():
+            self._pending_comma = None
+
+    def _text(self, end: Optional[int] = None) -> str:
+        end = len(self._buf) if end is None else end
+        drop = set(i for i in self._drop if i < end)
+        if not drop:
+            return "".join(self._buf[:end])
+        return "".join(c for i, c in enumerate(self._buf[:end]) if i not in drop)
+
+    def snapshot(self) -> Any:
+        if not self._started:
+            raise ResponseParseError("模型输出中没有 JSON 对象")
+        if self._done:
+            text = self._text()
+            if self._drop:
+                self.repaired = True
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ResponseParseError(f"JSON 解析失败: {e}")
+
+        if self._last_safe is None:
+            raise ResponseParseError("JSON 输出被截断，无法修复")
+        cut, stack = self._last_safe
+        text = self._text(cut).rstrip()
+        if text.endswith(","):
+            text = text[:-1]
+        text += "".join(_CLOSERS[c] for c in reversed(stack))
+        self.repaired = True
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ResponseParseError(f"截断的 JSON 修复失败: {e}")
+
+
+def loads_tolerant(content: str) -> Any:
+    parser = TolerantJSONParser()
+    try:
+        parser.feed(content)
+        return parser.snapshot(), parser.repaired
+    except ResponseParseError:
+        fenced = _FENCE_RE.search(content)
+        if not fenced:
+            raise
+    parser = TolerantJSONParser()
+    parser.feed(fenced.group(1))
+    return parser.snapshot(), parser.repaired
+
+
+def _drop_invalid_items(payload: Any, errors: List[Dict[str, Any]]) -> bool:
+    targets = []
+    for err in errors:
+        loc = err.get("loc", ())
+        for i, part in enumerate(loc):
+            if isinstance(part, int):
+                targets.append((tuple(loc[:i]), part))
+                break
+        else:
+            return False
+
+    for path, index in sorted(set(targets), key=lambda t: t[1], reverse=True):
+        node = payload
+        for key in path:
+            node = node[key]
+        del node[index]
+    return True
+
+
+def validate_payload(model_cls: Type[T], payload: Any) -> T:
+    try:
+        return model_cls.model_validate(payload)
+    except ValidationError as e:
+        if not _drop_invalid_items(payload, e.errors()):
+            raise ResponseParseError(f"字段校验失败: {e.errors()[0].get('msg')}")
+    try:
+        return model_cls.model_validate(payload)
+    except ValidationError as e:
+        raise ResponseParseError(f"字段校验失败: {e.errors()[0].get('msg')}")
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [v for v in value if v is not None]
+    return [value]
+
+
+def _as_optional_str(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def normalize_extract_payload(data: Any) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise ResponseParseError("模型返回的 JSON 不是对象")
+
+    profile = data.get("profile")
+    if not isinstance(profile, dict):
+        profile = {}
+
+    events = _as_list(profile.get("events"))
+    if not events:
+        events = _as_list(data.get("events"))
+
+    return {
+        "profile": {
+            "name": _as_optional_str(profile.get("name")) or "",
+            "job": _as_optional_str(profile.get("job")),
+            "birthday": _as_optional_str(profile.get("birthday")),
+            "notes": [str(n) for n in _as_list(profile.get("notes"))],
+            "events": [e for e in events if isinstance(e, dict)],
+        },
+        "annotations": [a for a in _as_list(data.get("annotations")) if isinstance(a, dict)],
+        "developments": [d for d in _as_list(data.get("developments")) if isinstance(d, dict)],
+        "relations": [
+            r for r in _as_list(data.get("relations"))
+            if isinstance(r, dict) and r.get("name")
+        ],
+    }
+
+
+def parse_structured(
+    content: Optional[str],
+    model_cls: Type[T],
+    model: str,
+    normalize: Optional[Callable[[Any], Any]] = None,
+) -> T:
+    try:
+        if not content:
+            raise ResponseParseError("模型返回内容为空")
+        data, repaired = loads_tolerant(content)
+        if normalize is not None:
+            data = normalize(data)
+        result = validate_payload(model_cls, data)
+    except ResponseParseError:
+        metrics.LLM_PARSE_FAILURES.inc(model=model)
+        raise
+    if repaired:
+        metrics.LLM_PARSE_REPAIRS.inc(model=model)
+    return result
+
+
+def parse_extract_response(content: Optional[str], model: str) -> schemas.ExtractResponse:
+    return parse_structured(content, schemas.ExtractResponse, model, normalize_extract_payload)
+
+
+_PROFILE_NAME_RE = re.compile(r'"profile"\s*:\s*\{[^{}\[\]]*?"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class ExtractNameWatcher:
+    """流式抽取时盯住 profile.name，名字一完整就回调，只触发一次。"""
+
+    def __init__(self, on_name: Callable[[str], None]):
+        self.on_name = on_name
+        self.name: Optional[str] = None
+        self._buf: List[str] = []
+
+    def __call__(self, delta: str) -> None:
+        if self.name is not None:
+            return
+        self._buf.append(delta)
+        match = _PROFILE_NAME_RE.search("".join(self._buf))
+        if match is None:
+            return
+        try:
+            name = json.loads(f'"{match.group(1)}"').strip()
+        except json.JSONDecodeError:
+            return
+        if name:
+            self.name = name
+            self.on_name(name)
+
+
+def message_content(result: Dict[str, Any]) -> Optional[str]:
+    message = result["choices"][0]["message"]
+    content = message.get("content")
+    if content is None:
+        content = message.get("reasoning_content", "")
+    return content
+
+
+def _downgraded(model: str, feature: str) -> bool:
+    until = _downgrades.get((model, feature))
+    if until is None:
+        return False
+    if time.monotonic() < until:
+        return True
+    del _downgrades[(model, feature)]
+    return False
+
+
+def _remember_unsupported(model: str, error_body: str) -> None:
+    body = error_body.lower()
+    for feature, markers in UNSUPPORTED_MARKERS.items():
+        if any(marker in body for marker in markers):
+            logger.warning("模型 %s 不支持 %s，%.0f 秒内不再发送", model, feature, DOWNGRADE_TTL_SECONDS)
+            _downgrades[(model, feature)] = time.monotonic() + DOWNGRADE_TTL_SECONDS
+
+
+def _structured_options(model: str, response_schema: Optional[Type[BaseModel]]) -> Dict[str, Any]:
+    if _downgraded(model, "structured"):
+        return {}
+    mode = MODEL_CAPABILITIES.get(model, {}).get("structured")
+    if mode == "guided_json" and response_schema is not None:
+        return {"nvext": {"guided_json": response_schema.model_json_schema()}}
+    if mode in ("guided_json", "json_object"):
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _flatten_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    flat = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        flat.append({**message, "content": content})
+    return flat
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.AsyncClient:
+    # 每个事件循环一个连接池（confirm_data 通过 asyncio.run 在线程里另起循环）
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(verify=False, limits=httpx.Limits(max_keepalive_connections=8))
+        _clients[loop] = client
+    return client
+
+
+async def close_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _post(api_key: str, body: Dict[str, Any], timeout: float) -> httpx.Response:
+    client = get_client()
+    request = client.build_request(
+        "POST",
+        NVIDIA_API_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        json=body,
+        timeout=timeout
+    )
+    # 流式请求只读响应头，响应体由 _read_stream 逐行消费
+    return await client.send(request, stream=bool(body.get("stream")))
+
+
+async def _read_stream(response: httpx.Response, on_delta: Callable[[str], None]) -> Dict[str, Any]:
+    # 把 SSE 分块拼回非流式响应的结构，后续解析逻辑不用区分
+    parts: List[str] = []
+    usage: Dict[str, Any] = {}
+    try:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or ():
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+    finally:
+        await response.aclose()
+    return {"choices": [{"message": {"content": "".join(parts)}}], "usage": usage}
+
+
+def _record_cancelled(model: str, elapsed: float) -> None:
+    # 取消时 httpx 会断开连接，上游不再继续生成；按该模型成功调用的平均耗时估算省下的时间
+    metrics.LLM_CANCELLED.inc(model=model)
+    metrics.LLM_CANCELLED_ELAPSED.inc(elapsed, model=model)
+    typical = metrics.LLM_LATENCY.mean(model=model, outcome="200")
+    if typical is not None and typical > elapsed:
+        metrics.LLM_CANCELLED_SAVED.inc(typical - elapsed, model=model)
+
+
+async def chat_completion(
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    *,
+    temperature: float = 0.3,
+    max_tokens: int = 2000,
+    timeout: float = 20.0,
+    response_schema: Optional[Type[BaseModel]] = None,
+    structured: bool = True,
+    on_delta: Optional[Callable[[str], None]] = None,
+    record_success: bool = True,
+) -> Dict[str, Any]:
+    """on_delta 不为空时以流式方式请求，每收到一段输出就回调一次。
+
+    record_success=False 时 200 不记熔断器的成功，由调用方解析完结果后自己记成功或失败。
+    """
+    breaker = resilience.breaker_for(model)
+    limiter = resilience.limiter_for(model)
+    if not breaker.allow():
+        raise ModelUnavailable(f"模型 {model} 已熔断，跳过")
+    try:
+        acquired = await limiter.acquire()
+    except BaseException:
+        breaker.release()
+        raise
+    if not acquired:
+        breaker.release()
+        raise ModelUnavailable(f"模型 {model} 限流中，跳过")
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if on_delta is not None:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    options = _structured_options(model, response_schema) if structured else {}
+    flat_messages = _flatten_messages(messages)
+    if _downgraded(model, "prompt_cache"):
+        messages = flat_messages
+    has_cache_markers = flat_messages != messages
+
+    start = time.perf_counter()
+    try:
+        response = await _post(api_key, {**payload, "messages": messages, **options}, timeout)
+        # 被拒绝时去掉结构化参数和缓存标注重试一次；错误信息点名不支持的参数才记住
+        if (options or has_cache_markers) and response.status_code in (400, 422):
+            await response.aread()
+            await response.aclose()
+            metrics.LLM_STRUCTURED_DOWNGRADES.inc(model=model)
+            _remember_unsupported(model, response.text)
+            # 重试也是一次上游调用，同样要拿令牌
+            if not await limiter.acquire():
+                raise ModelUnavailable(f"模型 {model} 限流中，跳过")
+            response = await _post(api_key, {**payload, "messages": flat_messages}, timeout)
+        if on_delta is not None and response.status_code == 200:
+            result = await _read_stream(response, on_delta)
+        else:
+            await response.aread()
+            result = None
+    except httpx.HTTPError as e:
+        breaker.record_failure()
+        metrics.LLM_LATENCY.observe(time.perf_counter() - start, model=model, outcome="error")
+        raise LLMError(f"请求失败: {type(e).__name__}")
+    except BaseException as e:
+        breaker.release()
+        if isinstance(e, asyncio.CancelledError):
+            _record_cancelled(model, time.perf_counter() - start)
+        raise
+    metrics.LLM_LATENCY.observe(
+        time.perf_counter() - start, model=model, outcome=str(response.status_code))
+
+    if response.status_code == 429:
+        limiter.on_throttled(resilience.parse_retry_after(response.headers.get("Retry-After")))
+        breaker.release()
+        raise LLMError("API调用被限流，状态码: 429")
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise LLMError(f"API调用失败，状态码: {response.status_code}")
+    if response.status_code != 200:
+        breaker.release()
+        raise LLMError(f"API调用失败，状态码: {response.status_code}")
+
+    if record_success:
+        breaker.record_success()
+    limiter.on_success()
+    if result is None:
+        result = response.json()
+    record_usage(model, result)
+    return result
+
+
+async def complete_structured(
+    api_key: str,
+    prompt: RenderedPrompt,
+    user_content: str,
+    parse: Callable[[Optional[str], str], T],
+    *,
+    response_schema: Optional[Type[BaseModel]] = None,
+    max_tokens: int = 2000,
+    timeout: float = 20.0,
+    temperature: float = 0.3,
+    use_cache: bool = True,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> T:
+    cache_key = (prompt.cache_key, user_content)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    last_error = None
+    for model in FALLBACK_MODELS:
+        budget = prompt.max_tokens_for(model, user_content, max_tokens)
+        if budget is None:
+            last_error = f"输入超出模型 {model} 的上下文预算"
+            continue
+        try:
+            result = await chat_completion(
+                api_key,
+                model,
+                prompt.messages(user_content, model),
+                temperature=temperature,
+                max_tokens=budget,
+                timeout=timeout,
+                response_schema=response_schema,
+                on_delta=on_delta,
+                record_success=False,
+            )
+        except Exception as e:
+            logger.warning("模型 %s 调用失败: %s", model, e)
+            last_error = str(e)
+            continue
+        # 输出一直解析不了的模型和调用失败一样计入熔断，不然回退链每次都要先为它付费
+        breaker = resilience.breaker_for(model)
+        try:
+            content = message_content(result)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("模型 %s 输出: %s", model, (content or "")[:500])
+            parsed = parse(content, model)
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning("模型 %s 输出无法解析: %s", model, e)
+            last_error = str(e)
+            continue
+        breaker.record_success()
+        if use_cache:
+            result_cache.put(cache_key, parsed)
+        return parsed
+    raise LLMError(f"所有模型都调用失败: {last_error}")
+
+
+def record_usage(model: str, result: Dict[str, Any]) -> None:
+    usage = result.get("usage") or {}
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            metrics.LLM_TOKENS.inc(usage[kind], model=model, kind=kind.replace("_tokens", ""))
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached:
+        metrics.LLM_TOKENS.inc(cached, model=model, kind="cached_prompt")
+
+
+@metrics.register_collector
+def _collect_model_state() -> None:
+    for model, state in resilience.snapshot().items():
+        metrics.LLM_BREAKER_STATE.set(0 if state["state"] == resilience.CLOSED else 1, model=model)
+        if state["rate"] is not None:
+            metrics.LLM_RATE_LIMIT.set(state["rate"], model=model)
@@ -0,0 +1,31 @@
+import logging
+import os
+import random
+
+
+# DEBUG 级别的日志（如模型原始输出）只按比例采样输出，其余级别全部保留
+class SampleFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging() -> None:
+    logger = logging.getLogger("app")
+    if logger.handlers:
+        return
+    try:
+        rate = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    except ValueError:
+        rate = 0.1
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(SampleFilter(rate))
+    logger.addHandler(handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
@@ -1,116 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, func, select
+from typing import List, Dict, Any, Optional, Union, Literal
+import asyncio
 import json
+import logging
 import os
-import re
-from difflib import SequenceMatcher
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-import httpx
 
-from .database import engine, SessionLocal, get_db, Base
-from . import models, schemas
+from .database import SessionLocal, get_db, get_tenant, tenant_of
+from . import models, schemas, llm, prompts, metrics, agenda, timeline, children, http_cache, serialize, embeddings, recommend, fastpath, batching, cancellation, idempotency, merge, avatars, strength, circle_stats, startup
+from .merge import is_similar_event
+from .logging_setup import configure_logging
 
 load_dotenv()
+configure_logging()
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+def _parse_detail_comparison(content, model: str) -> schemas.DetailComparison:
+    return llm.parse_structured(content, schemas.DetailComparison, model)
 
 async def determine_more_detailed(desc1: str, desc2: str) -> Dict:
     api_key = os.getenv("NVIDIA_API_KEY")
     
     if api_key and api_key != "your_nvidia_api_key_here":
         try:
-            system_prompt = """你是一个专业的事件描述比较助手。请比较两个事件描述，判断哪个更加详细和具体。
-
-任务要求：
-1. 分析两个事件描述，判断哪一个包含更多具体信息
-2. 考虑时间信息（早/中/晚餐）、地点、参与者等因素
-3. 例如："吃晚饭"比"吃饭"更详细；"和张三在上海吃午饭"比"吃饭"更详细
-
-输出格式要求：
-请严格按照以下JSON格式输出，不要包含任何额外文字：
-{
-  "more_detailed": "desc1" 或 "desc2",
-  "reason": "简短原因"
-}
-"""
-            
-            models = [
-                "z-ai/glm4.7",
-                "deepseek-ai/DeepSeek-V3",
-                "Qwen/Qwen2.5-72B-Instruct",
-                "meta/llama-3.1-405b-instruct"
-            ]
-            
-            for model in models:
-                try:
-                    async with httpx.AsyncClient(timeout=15.0, verify=False) as client:
-                        response = await client.post(
-                            "https://integrate.api.nvidia.com/v1/chat/completions",
-                            headers={
-                                "Authorization": f"Bearer {api_key}",
-                                "Content-Type": "application/json"
-                            },
-                            json={
-                                "model": model,
-                                "messages": [
-                                    {"role": "system", "content": system_prompt},
-                                    {"role": "user", "content": f"desc1: {desc1}\ndesc2: {desc2}"}
-                                ],
-                                "temperature": 0.3,
-                                "max_tokens": 500
-                            }
-                        )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        content = result["choices"][0]["message"]["content"]
-                        json_match = re.search(r'\{[\s\S]*\}', content)
-                        if json_match:
-                            data = json.loads(json_match.group(0))
-                            return data
-                except Exception as e:
-                    print(f"模型 {model} 比较失败: {e}")
-                    continue
+            decision = await llm.complete_structured(
+                api_key,
+                prompts.DETAIL_COMPARE_PROMPT.render(),
+                f"desc1: {desc1}\ndesc2: {desc2}",
+                _parse_detail_comparison,
+                response_schema=schemas.DetailComparison,
+                max_tokens=500,
+                timeout=15.0
+            )
+            return decision.model_dump()
         except Exception as e:
-            print(f"AI比较失败: {e}")
+            logger.warning("AI比较失败: %s", e)
     
     if len(desc2) > len(desc1):
         return {"more_detailed": "desc2", "reason": "desc2更长"}
     else:
         return {"more_detailed": "desc1", "reason": "desc1更长"}
 
-def calculate_similarity(str1: str, str2: str) -> float:
-    return SequenceMatcher(None, str1, str2).ratio()
-
-def is_similar_event(event1: Dict, event2: Dict, threshold: float = 0.5) -> bool:
-    if event1.get('date') != event2.get('date'):
-        return False
-    
-    desc1 = event1.get('description', '')
-    desc2 = event2.get('description', '')
-    
-    similarity = calculate_similarity(desc1, desc2)
-    if similarity >= threshold:
-        return True
-    
-    eat_keywords = ['吃饭', '吃早饭', '吃午饭', '吃晚饭', '用餐', '进餐', '早餐', '午餐', '晚餐', '早饭', '午饭', '晚饭']
-    has_eat1 = any(keyword in desc1 for keyword in eat_keywords)
-    has_eat2 = any(keyword in desc2 for keyword in eat_keywords)
-    if has_eat1 and has_eat2:
-        return True
-    
-    meet_keywords = ['见面', '会面', '碰面', '会见', '相聚', '聚会']
-    has_meet1 = any(keyword in desc1 for keyword in meet_keywords)
-    has_meet2 = any(keyword in desc2 for keyword in meet_keywords)
-    if has_meet1 and has_meet2:
-        return True
-    
-    return False
-
 async def compare_and_filter_new_data(
     existing_person: models.Person,
     extracted_data: schemas.ExtractResponse
@@ -244,7 +181,9 @@ async def compare_and_filter_new_data(
     
     return result
 
-app = FastAPI(title="智能人脉管理工具 API")
+# 导入只定义路由；检查数据库结构、预热索引放在 lifespan 里（见 startup.py）
+app = FastAPI(title="智能人脉管理工具 API", default_response_class=serialize.FastJSONResponse,
+              lifespan=startup.lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -253,192 +192,85 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "智能人脉管理工具 API"}
 
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    # 结构检查通过且后台预热结束（成功或失败）才算就绪，未就绪时返回 503 和当前进度
+    snapshot = startup.state.snapshot()
+    return serialize.FastJSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/extract", response_model=schemas.ExtractResponse)
-async def extract_info(request: schemas.ExtractRequest):
-    api_key = os.getenv("NVIDIA_API_KEY")
+async def extract_info(request: schemas.ExtractRequest, http_request: Request,
+                       x_job_id: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    api_key = _api_key()
+    quick = await _try_fastpath(request.text, api_key, db)
+    if quick is not None:
+        return quick
     
-    if api_key and api_key != "your_nvidia_api_key_here":
-        try:
-            return await extract_with_ai(request.text, api_key)
-        except Exception as e:
-            print(f"AI 提取失败: {e}")
-            raise HTTPException(status_code=500, detail=f"AI信息提取失败: {str(e)}")
+    if api_key:
+        return await cancellation.run(http_request, _extract_or_fail(request.text, api_key), x_job_id)
     
     raise HTTPException(status_code=500, detail="NVIDIA_API_KEY 未配置")
 
-async def extract_with_ai(text: str, api_key: str) -> schemas.ExtractResponse:
-    system_prompt = """你是一个专业的人物信息提取助手。请仔细分析用户输入的文本，按语义智能提取所有相关信息，并严格按照以下JSON格式输出，不要包含任何额外的解释或说明。
-
-{
-  "profile": {
-    "name": "主要人物姓名（必填）",
-    "job": "职业或工作内容（可选）",
-    "birthday": "生日（可选，格式为MM-DD或YYYY-MM-DD，例如：05-20、1990-05-20）",
-    "notes": [
-      "其它个人信息，如过敏、饮食喜好、学校、习惯等。例如：对海鲜过敏、爱吃榴莲、深圳中学、早睡早起"
-    ],
-    "events": [
-      {
-        "date": "日期（格式为YYYY-MM-DD）",
-        "location": "地点（可选）",
-        "description": "事件详细描述"
-      }
-    ]
-  },
-  "annotations": [
-    {
-      "time": "时间（格式为YYYY-MM-DD或YYYY-MM）",
-      "location": "地点（可选）",
-      "description": "关键动作或待办事项描述"
-    }
-  ],
-  "developments": [
-    {
-      "content": "发展方向或领域内容",
-      "type": "resource"
-    }
-  ],
-  "relations": [
-    {
-      "name": "相关人物姓名",
-      "relation_type": "关系类型，如朋友、同事、同学、家人等"
-    }
-  ]
-}
-
-【重要提取规则】
-1. 当前参考日期：2026-02-20
-   - 相对时间转换：
-     - "昨天" → 2026-02-19
-     - "今天" → 2026-02-20
-     - "明天" → 2026-02-21
-     - "下个月" → 2026-03（格式YYYY-MM）
-     - "6月18日" → 06-18（格式MM-DD，用于生日）
-   - 如果文本中没有明确提到时间，但有明确的动作/事件（如"吃晚饭"、"见面"等），默认认为是今天发生的，日期设为2026-02-20
-
-2. 事件(events)：提取过去或已经发生的事情，或者没有明确时间但已经发生或正在发生的事情
-3. 标注(annotations)：只提取未来的计划、约定或待办事项
-4. 发展方向(developments)：提取人物从事的领域、行业或专业方向
-5. 生日提取：仔细查找生日相关表述，如"生日是5月20日"、"5月20日是她生日"、"1990年5月20日出生"等，提取为MM-DD或YYYY-MM-DD格式
-6. 如果某个字段没有明确提到的信息，保持为null或空数组
-7. 绝对不要编造任何信息，只提取文本中明确存在的内容
-8. 注意区分事件和标注：已发生的放events，未来计划放annotations
-9. 对于类似"和张三吃晚饭"这样的文本，"张三"是主要人物姓名，"吃晚饭"是事件描述，日期默认为今天，不要把张三放到relations里！
-10.【关键】事件描述必须忠实于原文，不要随意添加或修改原文中没有的信息。例如：原文是"吃饭"，就保留"吃饭"，不要改成"和我吃饭"、"一起吃饭"等；原文是"吃晚饭"，就保留"吃晚饭"。
-11.【关键】不要添加冗余的、原文中没有明确提到的词语（如"和我"、"我们"、"一起"等），除非原文明确提到。
-12. 事件描述要简洁明了，准确反映原文内容，确保信息质量。
-13.【关键】地点提取要保持一致性：
-    - 对于常见城市名称，使用标准简称，如"上海"、"北京"、"深圳"、"广州"等
-    - 不要添加冗余前缀或后缀，如"上海市"简称为"上海"，"北京市"简称为"北京"
-    - 对于公司、餐厅等具体地点，直接提取原文中的完整名称
-    - 同一地点在多次提取中必须保持相同的表述，例如始终用"上海"而不要一会儿"上海"一会儿"上海市"
-14.【关键】所有信息的提取都要保持用词一致性，避免同一概念有多种不同表述，确保后续数据比对和处理的准确性。
-15.【关键】其它个人信息(notes)提取：仔细识别文本中不属于事件、标注、发展方向的个人信息，例如：
-    - 过敏信息：如"对海鲜过敏"、"对芒果过敏"
-    - 饮食喜好：如"爱吃榴莲"、"喜欢吃辣"、"不喜欢吃香菜"
-    - 学校/教育背景：如"深圳中学"、"清华大学毕业"
-    - 习惯/特点：如"不喜欢喝酒"、"早睡早起"、"性格开朗"
-    - 其他个人信息：任何与人物相关但不属于上述类别的信息
-    - 直接提取原文中的描述，不要添加额外信息，不要分类，直接作为简单文本放入notes数组。"""
-
-    models = [
-        "z-ai/glm4.7",
-        "deepseek-ai/DeepSeek-V3",
-        "Qwen/Qwen2.5-72B-Instruct",
-        "meta/llama-3.1-405b-instruct"
-    ]
-    
-    last_error = None
-    
-    for model in models:
-        try:
-            print(f"开始调用NVIDIA API，模型: {model}，输入文本: {text}")
-            async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-                response = await client.post(
-                    "https://integrate.api.nvidia.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": text}
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 2000
-                    }
-                )
-            
-            print(f"API响应状态码: {response.status_code}")
-            
-            if response.status_code != 200:
-                print(f"API响应: {response.text}")
-                last_error = f"API调用失败，状态码: {response.status_code}"
-                continue
-            
-            result = response.json()
-            print(f"API返回结果: {json.dumps(result, ensure_ascii=False)[:500]}")
-            
-            content = result["choices"][0]["message"]["content"]
-            print(f"模型输出: {content}")
-            
-            if content is None:
-                content = result["choices"][0]["message"].get("reasoning_content", "")
-                print(f"使用 reasoning_content: {content[:500]}")
-            
-            json_match = re.search(r'\{[\s\S]*\}', content)
-            if not json_match:
-                last_error = "模型返回结果格式错误，无法提取JSON"
-                continue
-            
-            json_str = json_match.group(0)
-            data = json.loads(json_str)
-            print(f"解析后的数据: {json.dumps(data, ensure_ascii=False)}")
-            
-            profile = data.get("profile", {})
-            
-            name = profile.get("name", "")
-            if name is None:
-                name = ""
-            
-            events = profile.get("events", [])
-            if not events:
-                events = data.get("events", [])
-            
-            print(f"模型 {model} 调用成功")
-            return schemas.ExtractResponse(
-                profile=schemas.ExtractedProfile(
-                    name=name,
-                    job=profile.get("job"),
-                    birthday=profile.get("birthday"),
-                    notes=profile.get("notes", []),
-                    events=[schemas.EventBase(**e) for e in events]
-                ),
-                annotations=[schemas.AnnotationBase(**a) for a in data.get("annotations", [])],
-                developments=[schemas.DevelopmentBase(**d) for d in data.get("developments", [])],
-                relations=[schemas.ExtractedRelation(**r) for r in data.get("relations", []) if r.get("name")]
-            )
-        except Exception as e:
-            print(f"模型 {model} 调用失败: {e}")
-            import traceback
-            print(f"堆栈跟踪: {traceback.format_exc()}")
-            last_error = str(e)
-            continue
-    
-    print(f"所有模型都调用失败，最后错误: {last_error}")
-    raise HTTPException(status_code=500, detail=f"所有模型都调用失败: {last_error}")
+async def _try_fastpath(text: str, api_key: Optional[str], db: Session) -> Optional[schemas.ExtractResponse]:
+    # 可疑的候选名（称谓、昵称）要查库确认，放到线程池里
+    def is_known(name: str) -> bool:
+        return db.execute(select(models.Person.id).where(models.Person.name == name)).first() is not None
 
+    return await run_in_threadpool(fastpath.try_extract, text, api_key is None, is_known)
 
+async def _extract_or_fail(text: str, api_key: str) -> schemas.ExtractResponse:
+    try:
+        return await extract_with_ai(text, api_key)
+    except Exception as e:
+        logger.error("AI 提取失败: %s", e)
+        raise HTTPException(status_code=500, detail=f"AI信息提取失败: {str(e)}")
+
+def _api_key() -> Optional[str]:
+    api_key = os.getenv("NVIDIA_API_KEY")
+    if api_key and api_key != "your_nvidia_api_key_here":
+        return api_key
+    return None
+
+async def extract_with_ai(text: str, api_key: str, on_delta=None) -> schemas.ExtractResponse:
+    try:
+        # 需要流式输出的调用不参与合批
+        if on_delta is not None:
+            return await batching.extract_one(api_key, text, on_delta=on_delta)
+        return await batching.extract(api_key, text)
+    except llm.LLMError as e:
+        logger.error("所有模型都调用失败，最后错误: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/confirm", response_model=schemas.ConfirmResponse)
-def confirm_data(request: schemas.ConfirmRequest, db: Session = Depends(get_db)):
+def confirm_data(request: schemas.ConfirmRequest, idempotency_key: Optional[str] = Header(None),
+                 db: Session = Depends(get_db)):
+    return idempotency.execute(db, idempotency_key, "/confirm", request, lambda: _confirm(request, db),
+                               rebuild=lambda: _rebuild_confirm(request, db))
+
+def _rebuild_confirm(request: schemas.ConfirmRequest, db: Session) -> schemas.ConfirmResponse:
+    # 首次请求已提交、响应没存下：新建的人取同名里最新的一条，更新的人就是请求里的 person_id
+    if not request.is_new_person:
+        return schemas.ConfirmResponse(success=True, person_id=request.person_id, message="人物更新成功")
+    person_id = db.query(func.max(models.Person.id)).filter(models.Person.name == request.profile.name).scalar()
+    if person_id is None:
+        raise HTTPException(status_code=404, detail="人物不存在")
+    return schemas.ConfirmResponse(success=True, person_id=person_id, message="人物创建成功")
+
+def _confirm(request: schemas.ConfirmRequest, db: Session) -> schemas.ConfirmResponse:
     try:
         if request.is_new_person:
             person = models.Person(
@@ -507,12 +339,12 @@ def confirm_data(request: schemas.ConfirmRequest, db: Session = Depends(get_db))
             if not person:
                 raise HTTPException(status_code=404, detail="人物不存在")
             
-            current_profile = person.profile
+            current_profile = dict(person.profile)
             if request.profile.job:
                 current_profile["job"] = request.profile.job
             if request.profile.birthday:
                 current_profile["birthday"] = request.profile.birthday
-            existing_notes = current_profile.get("notes", [])
+            existing_notes = list(current_profile.get("notes") or [])
             for note in request.profile.notes:
                 if note not in existing_notes:
                     existing_notes.append(note)
@@ -600,66 +432,83 @@ def confirm_data(request: schemas.ConfirmRequest, db: Session = Depends(get_db))
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/persons", response_model=List[schemas.Person])
-def get_persons(db: Session = Depends(get_db)):
-    persons = db.query(models.Person).all()
-    result = []
-    for person in persons:
-        person_dict = {
-            "id": person.id,
-            "name": person.name,
-            "avatar": person.avatar,
-            "profile": person.profile,
-            "created_at": person.created_at,
-            "updated_at": person.updated_at,
-            "events": person.events,
-            "annotations": person.annotations,
-            "developments": person.developments
-        }
-        result.append(schemas.Person(**person_dict))
-    return result
+def get_persons(
+    request: Request,
+    job: Optional[str] = Query(None, description="职业包含该关键词（不区分大小写）"),
+    birthday: Optional[str] = Query(None, description="生日前缀，如 05 或 05-20"),
+    note: Optional[str] = Query(None, description="其它信息包含该关键词（不区分大小写）"),
+    db: Session = Depends(get_db)
+):
+    criteria = []
+    if job:
+        criteria.append(func.lower(models.Person.job).contains(job.lower(), autoescape=True))
+    if birthday:
+        criteria.append(or_(
+            models.Person.birthday.startswith(birthday, autoescape=True),
+            models.Person.birthday.like(f"____-{birthday}%")
+        ))
+    if note:
+        criteria.append(func.lower(models.Person.notes).contains(note.lower(), autoescape=True))
+    return http_cache.cached_response(
+        request, db, http_cache.PERSON_TABLES, lambda: serialize.persons_payload(db, *criteria)
+    )
 
 @app.get("/persons/{person_id}", response_model=schemas.Person)
-def get_person(person_id: int, db: Session = Depends(get_db)):
-    person = db.query(models.Person).filter(models.Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="人物不存在")
-    return schemas.Person(
-        id=person.id,
-        name=person.name,
-        avatar=person.avatar,
-        profile=person.profile,
-        created_at=person.created_at,
-        updated_at=person.updated_at,
-        events=person.events,
-        annotations=person.annotations,
-        developments=person.developments
+def get_person(person_id: int, request: Request, db: Session = Depends(get_db)):
+    return http_cache.cached_response(
+        request, db, http_cache.PERSON_TABLES, lambda: _load_person(db, person_id)
     )
 
+def _load_person(db: Session, person_id: int) -> Dict[str, Any]:
+    person = serialize.person_payload(db, person_id)
+    if person is None:
+        raise HTTPException(status_code=404, detail="人物不存在")
+    return person
+
+@app.get("/persons/{person_id}/timeline", response_model=Union[schemas.TimelinePage, schemas.TimelineSummary])
+def get_person_timeline(
+    person_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    order: Literal["desc", "asc"] = "desc",
+    mode: Literal["items", "summary"] = "items",
+    db: Session = Depends(get_db)
+):
+    if not db.query(models.Person.id).filter(models.Person.id == person_id).first():
+        raise HTTPException(status_code=404, detail="人物不存在")
+    if mode == "summary":
+        return timeline.get_summary(db, person_id)
+    try:
+        decoded = timeline.decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="cursor 无效")
+    return timeline.get_page(db, person_id, decoded, limit, descending=(order == "desc"))
+
 @app.get("/graph", response_model=schemas.GraphResponse)
-def get_graph(db: Session = Depends(get_db)):
-    persons = db.query(models.Person).all()
-    nodes = [schemas.GraphNode(id=p.id, name=p.name, avatar=p.avatar) for p in persons]
-    
-    relations = db.query(models.Relation).all()
-    edges = []
-    seen_pairs = set()
-    for rel in relations:
-        pair = tuple(sorted([rel.from_person_id, rel.to_person_id]))
-        if pair not in seen_pairs:
-            seen_pairs.add(pair)
-            edges.append(schemas.GraphEdge(
-                source=rel.from_person_id,
-                target=rel.to_person_id,
-                relation_type=rel.relation_type
-            ))
-    
-    return schemas.GraphResponse(nodes=nodes, edges=edges)
+def get_graph(request: Request, db: Session = Depends(get_db)):
+    # 边的强度随日期衰减，按天区分缓存；“今天”和强度索引一样按 APP_TIMEZONE 算
+    return http_cache.cached_response(
+        request, db, ("persons", "relations", "events"), lambda: serialize.graph_payload(db),
+        variant=agenda.today().isoformat(),
+    )
+
+@app.get("/graph/strongest", response_model=List[schemas.TieStrength])
+def get_strongest_ties(
+    limit: int = Query(20, ge=1, le=200),
+    person_id: Optional[int] = Query(None, description="只看与此人的关系"),
+    sort: Literal["weight", "interactions", "recent"] = Query("weight"),
+    db: Session = Depends(get_db),
+):
+    if person_id is not None and not db.query(models.Person.id).filter(models.Person.id == person_id).first():
+        raise HTTPException(status_code=404, detail="人物不存在")
+    return strength.strongest(db, limit=limit, person_id=person_id, sort=sort)
 
 @app.post("/graph/layout", response_model=schemas.GraphLayoutResponse)
 def save_graph_layout(request: schemas.GraphLayoutRequest, db: Session = Depends(get_db)):
-    layout = db.query(models.GraphLayout).filter(models.GraphLayout.user_id == "default").first()
+    user_id = tenant_of(db)
+    layout = db.query(models.GraphLayout).filter(models.GraphLayout.user_id == user_id).first()
     if not layout:
-        layout = models.GraphLayout(user_id="default", layout_json=json.dumps(request.layout_json, ensure_ascii=False))
+        layout = models.GraphLayout(user_id=user_id, layout_json=json.dumps(request.layout_json, ensure_ascii=False))
         db.add(layout)
     else:
         layout.layout_json = json.dumps(request.layout_json, ensure_ascii=False)
@@ -667,16 +516,30 @@ def save_graph_layout(request: schemas.GraphLayoutRequest, db: Session = Depends
     return schemas.GraphLayoutResponse(success=True, message="布局保存成功")
 
 @app.get("/graph/layout")
-def get_graph_layout(db: Session = Depends(get_db)):
-    layout = db.query(models.GraphLayout).filter(models.GraphLayout.user_id == "default").first()
+def get_graph_layout(request: Request, db: Session = Depends(get_db)):
+    return http_cache.cached_response(
+        request, db, ("graph_layout",), lambda: _load_graph_layout(db)
+    )
+
+def _load_graph_layout(db: Session) -> Dict[str, Any]:
+    layout = db.query(models.GraphLayout).filter(models.GraphLayout.user_id == tenant_of(db)).first()
     if not layout:
         return {"layout_json": {}}
-    return {"layout_json": json.loads(layout.layout_json)}
+    return {"layout_json": serialize.loads(layout.layout_json)}
 
 @app.get("/circles", response_model=List[schemas.Circle])
-def get_circles(db: Session = Depends(get_db)):
-    circles = db.query(models.Circle).all()
-    return circles
+def get_circles(request: Request, db: Session = Depends(get_db)):
+    return http_cache.cached_response(
+        request, db, ("circles",), lambda: serialize.circles_payload(db)
+    )
+
+# 要注册在 /circles/{circle_id} 之前
+@app.get("/circles/stats", response_model=List[schemas.CircleStats])
+def get_circle_stats(request: Request, db: Session = Depends(get_db)):
+    return http_cache.cached_response(
+        request, db, ("circles", "person_circles", "developments", "persons"),
+        lambda: circle_stats.stats_payload(db),
+    )
 
 @app.post("/circles", response_model=schemas.Circle)
 def create_circle(circle: schemas.CircleCreate, db: Session = Depends(get_db)):
@@ -688,34 +551,10 @@ def create_circle(circle: schemas.CircleCreate, db: Session = Depends(get_db)):
 
 @app.get("/circles/{circle_id}", response_model=schemas.CircleWithMembers)
 def get_circle(circle_id: int, db: Session = Depends(get_db)):
-    circle = db.query(models.Circle).filter(models.Circle.id == circle_id).first()
-    if not circle:
+    circles = serialize.circles_with_members_payload(db, models.Circle.id == circle_id)
+    if not circles:
         raise HTTPException(status_code=404, detail="圈子不存在")
-    
-    members = []
-    for pc in circle.person_circles:
-        person = db.query(models.Person).filter(models.Person.id == pc.person_id).first()
-        if person:
-            person_dict = {
-                "id": person.id,
-                "name": person.name,
-                "avatar": person.avatar,
-                "profile": person.profile,
-                "created_at": person.created_at,
-                "updated_at": person.updated_at,
-                "events": person.events,
-                "annotations": person.annotations,
-                "developments": person.developments
-            }
-            members.append(schemas.Person(**person_dict))
-    
-    return schemas.CircleWithMembers(
-        id=circle.id,
-        name=circle.name,
-        color=circle.color,
-        created_at=circle.created_at,
-        members=members
-    )
+    return serialize.FastJSONResponse(circles[0])
 
 @app.put("/circles/{circle_id}", response_model=schemas.Circle)
 def update_circle(circle_id: int, circle_update: schemas.CircleUpdate, db: Session = Depends(get_db)):
@@ -783,79 +622,38 @@ def remove_person_from_circle(circle_id: int, person_id: int, db: Session = Depe
     return {"success": True, "message": "人物移除成功"}
 
 @app.get("/circles-with-members", response_model=List[schemas.CircleWithMembers])
-def get_circles_with_members(db: Session = Depends(get_db)):
-    circles = db.query(models.Circle).all()
-    result = []
-    for circle in circles:
-        members = []
-        for pc in circle.person_circles:
-            person = db.query(models.Person).filter(models.Person.id == pc.person_id).first()
-            if person:
-                person_dict = {
-                    "id": person.id,
-                    "name": person.name,
-                    "avatar": person.avatar,
-                    "profile": person.profile,
-                    "created_at": person.created_at,
-                    "updated_at": person.updated_at,
-                    "events": person.events,
-                    "annotations": person.annotations,
-                    "developments": person.developments
-                }
-                members.append(schemas.Person(**person_dict))
-        result.append(schemas.CircleWithMembers(
-            id=circle.id,
-            name=circle.name,
-            color=circle.color,
-            created_at=circle.created_at,
-            members=members
-        ))
-    return result
+def get_circles_with_members(request: Request, db: Session = Depends(get_db)):
+    return http_cache.cached_response(
+        request, db, ("circles", "person_circles") + http_cache.PERSON_TABLES,
+        lambda: serialize.circles_with_members_payload(db)
+    )
 
 def get_semantic_similarity(s1: str, s2: str) -> float:
-    s1_lower = s1.lower()
-    s2_lower = s2.lower()
-    
-    synonyms = {
-        'ai': ['人工智能', 'artificial intelligence'],
-        '人工智能': ['ai', 'artificial intelligence'],
-        '芯片': ['半导体', '集成电路'],
-        '半导体': ['芯片', '集成电路'],
-    }
-    
-    if s1_lower in synonyms:
-        if s2_lower in synonyms[s1_lower]:
-            return 1.0
-    if s2_lower in synonyms:
-        if s1_lower in synonyms[s2_lower]:
-            return 1.0
-    
-    return calculate_similarity(s1_lower, s2_lower)
+    return embeddings.similarity(s1, s2)
 
 @app.post("/circles/auto-generate", response_model=schemas.AutoGenerateCirclesResponse)
 def auto_generate_circles(db: Session = Depends(get_db)):
     MORANDI_COLORS = ['#4A7B9C', '#9B6B6B', '#5F7256', '#B5A189', '#9251A8']
     
-    persons = db.query(models.Person).all()
-    
-    content_groups = {}
-    for person in persons:
-        for dev in person.developments:
-            content = dev.content
-            if not content:
-                continue
-            
-            found_group = None
-            for existing_content in content_groups.keys():
-                if get_semantic_similarity(content, existing_content) >= 0.8:
-                    found_group = existing_content
-                    break
-            
-            if found_group:
-                if person.id not in content_groups[found_group]:
-                    content_groups[found_group].append(person.id)
-            else:
-                content_groups[content] = [person.id]
+    rows = db.execute(
+        select(models.Development.person_id, models.Development.content)
+        .order_by(models.Development.person_id, models.Development.id)
+    ).all()
+    rows = [(person_id, content) for person_id, content in rows if content]
+    
+    # 先对不同的内容做一次向量聚类，再把人归到各自内容所在的簇
+    contents = list(dict.fromkeys(content for _, content in rows))
+    leaders = embeddings.cluster(contents)
+    leader_of = {content: contents[leaders[i]] for i, content in enumerate(contents)}
+    
+    content_groups: Dict[str, List[int]] = {}
+    seen = set()
+    for person_id, content in rows:
+        group = leader_of[content]
+        members = content_groups.setdefault(group, [])
+        if (group, person_id) not in seen:
+            seen.add((group, person_id))
+            members.append(person_id)
     
     suggested_circles = []
     for i, (content, person_ids) in enumerate(content_groups.items()):
@@ -869,7 +667,12 @@ def auto_generate_circles(db: Session = Depends(get_db)):
     return schemas.AutoGenerateCirclesResponse(suggested_circles=suggested_circles)
 
 @app.post("/circles/confirm")
-def confirm_circles(request: schemas.ConfirmCirclesRequest, db: Session = Depends(get_db)):
+def confirm_circles(request: schemas.ConfirmCirclesRequest, idempotency_key: Optional[str] = Header(None),
+                    db: Session = Depends(get_db)):
+    return idempotency.execute(db, idempotency_key, "/circles/confirm", request,
+                               lambda: _confirm_circles(request, db))
+
+def _confirm_circles(request: schemas.ConfirmCirclesRequest, db: Session) -> Dict[str, Any]:
     for circle_data in request.circles:
         existing_circle = db.query(models.Circle).filter(models.Circle.name == circle_data.name).first()
         
@@ -913,6 +716,17 @@ def delete_person(person_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"success": True, "message": "人物删除成功"}
 
+@app.post("/persons/merge", response_model=schemas.Person)
+def merge_persons(request: schemas.MergePersonsRequest, db: Session = Depends(get_db)):
+    person = merge.merge_persons(db, request.target_id, request.source_ids)
+    db.commit()
+    db.refresh(person)
+    return _person_response(person)
+
+def _person_response(person: models.Person) -> serialize.FastJSONResponse:
+    # 刚提交的数据是可信的，跳过 response_model 的二次校验
+    return serialize.FastJSONResponse(serialize.person_dict(person))
+
 @app.put("/persons/{person_id}", response_model=schemas.Person)
 def update_person(person_id: int, request: dict, db: Session = Depends(get_db)):
     person = db.query(models.Person).filter(models.Person.id == person_id).first()
@@ -928,60 +742,141 @@ def update_person(person_id: int, request: dict, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="姓名已存在")
         person.name = request["name"]
     
-    if "profile" in request:
+    if "profile" in request and request["profile"] != person.profile:
         person.profile = request["profile"]
     
-    if "events" in request:
-        db.query(models.Event).filter(models.Event.person_id == person_id).delete()
-        for event_data in request["events"]:
-            event = models.Event(
-                person_id=person_id,
-                date=event_data.get("date", ""),
-                location=event_data.get("location"),
-                description=event_data.get("description", ""),
-                source="user"
-            )
-            db.add(event)
-    
-    if "annotations" in request:
-        db.query(models.Annotation).filter(models.Annotation.person_id == person_id).delete()
-        for ann_data in request["annotations"]:
-            ann = models.Annotation(
-                person_id=person_id,
-                time=ann_data.get("time", ""),
-                location=ann_data.get("location"),
-                description=ann_data.get("description", ""),
-                source="user",
-                confirmed_by_user=True
-            )
-            db.add(ann)
-    
-    if "developments" in request:
-        db.query(models.Development).filter(models.Development.person_id == person_id).delete()
-        for dev_data in request["developments"]:
-            dev = models.Development(
-                person_id=person_id,
-                content=dev_data.get("content", ""),
-                type=dev_data.get("type", "resource"),
-                source="user",
-                confirmed_by_user=True
-            )
-            db.add(dev)
+    for kind in children.CHILD_SPECS:
+        if kind in request:
+            children.sync_children(db, person, kind, request[kind] or [])
     
     db.commit()
     db.refresh(person)
     
-    return schemas.Person(
-        id=person.id,
-        name=person.name,
-        avatar=person.avatar,
-        profile=person.profile,
-        created_at=person.created_at,
-        updated_at=person.updated_at,
-        events=person.events,
-        annotations=person.annotations,
-        developments=person.developments
-    )
+    return _person_response(person)
+
+@app.patch("/persons/{person_id}", response_model=schemas.Person)
+def patch_person(person_id: int, request: schemas.PersonPatch, db: Session = Depends(get_db)):
+    person = db.query(models.Person).filter(models.Person.id == person_id).first()
+    if not person:
+        raise HTTPException(status_code=404, detail="人物不存在")
+
+    fields = request.model_fields_set
+    if "name" in fields and request.name and request.name != person.name:
+        existing_person = db.query(models.Person).filter(
+            models.Person.name == request.name,
+            models.Person.id != person_id
+        ).first()
+        if existing_person:
+            raise HTTPException(status_code=400, detail="姓名已存在")
+        person.name = request.name
+    if "avatar" in fields:
+        avatar = avatars.normalize(request.avatar)
+        if avatar != person.avatar:
+            person.avatar = avatar
+    if "profile" in fields and request.profile is not None and request.profile != person.profile:
+        person.profile = request.profile
+
+    for kind in children.CHILD_SPECS:
+        changes = getattr(request, kind)
+        if changes is None:
+            continue
+        upsert = [item.model_dump(exclude_unset=True) for item in changes.upsert]
+        children.patch_children(db, person, kind, upsert, changes.delete)
+
+    db.commit()
+    db.refresh(person)
+    return _person_response(person)
+
+@app.post("/persons/{person_id}/avatar", response_model=schemas.Person)
+def upload_avatar(person_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    person = db.query(models.Person).filter(models.Person.id == person_id).first()
+    if not person:
+        raise HTTPException(status_code=404, detail="人物不存在")
+    avatar_hash = avatars.store(file.file.read(avatars.AVATAR_MAX_BYTES + 1))
+    if avatar_hash != person.avatar:
+        person.avatar = avatar_hash
+        db.commit()
+        db.refresh(person)
+    return _person_response(person)
+
+@app.get("/avatars/{avatar_hash}")
+def get_avatar(avatar_hash: str, request: Request, size: Optional[int] = Query(None)):
+    if not avatars.is_hash(avatar_hash):
+        raise HTTPException(status_code=404, detail="头像不存在")
+    if size is not None and size not in avatars.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size 只能是 {', '.join(map(str, avatars.THUMBNAIL_SIZES))}")
+    # 内容按哈希寻址，同一个地址的字节永不变化
+    headers = {"Cache-Control": avatars.CACHE_CONTROL, "ETag": f'"{avatar_hash}-{size or 0}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    path, media_type = avatars.resolve(avatar_hash, size)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def _child_endpoints(kind: str, response_model, create_model, update_model):
+    def create(person_id: int, request: create_model, db: Session = Depends(get_db)):
+        if not db.query(models.Person.id).filter(models.Person.id == person_id).first():
+            raise HTTPException(status_code=404, detail="人物不存在")
+        child = children.create_child(db, kind, person_id, request.model_dump(exclude_unset=True))
+        db.commit()
+        db.refresh(child)
+        return child
+
+    def update(person_id: int, child_id: int, request: update_model, db: Session = Depends(get_db)):
+        child = children.get_child(db, kind, person_id, child_id)
+        model, fields, _, _ = children.CHILD_SPECS[kind]
+        if children.apply_fields(child, request.model_dump(exclude_unset=True), fields):
+            db.commit()
+            db.refresh(child)
+        return child
+
+    def delete(person_id: int, child_id: int, db: Session = Depends(get_db)):
+        db.delete(children.get_child(db, kind, person_id, child_id))
+        db.commit()
+        return {"success": True}
+
+    app.post(f"/persons/{{person_id}}/{kind}", response_model=response_model)(create)
+    app.put(f"/persons/{{person_id}}/{kind}/{{child_id}}", response_model=response_model)(update)
+    app.patch(f"/persons/{{person_id}}/{kind}/{{child_id}}", response_model=response_model)(update)
+    app.delete(f"/persons/{{person_id}}/{kind}/{{child_id}}")(delete)
+
+_child_endpoints("events", schemas.Event, schemas.EventCreate, schemas.EventUpdate)
+_child_endpoints("annotations", schemas.Annotation, schemas.AnnotationCreate, schemas.AnnotationUpdate)
+_child_endpoints("developments", schemas.Development, schemas.DevelopmentCreate, schemas.DevelopmentUpdate)
+
+@app.get("/persons/{person_id}/similar", response_model=List[schemas.SimilarPerson])
+def get_similar_persons(person_id: int, limit: int = Query(10, ge=1, le=50), db: Session = Depends(get_db)):
+    if not db.query(models.Person.id).filter(models.Person.id == person_id).first():
+        raise HTTPException(status_code=404, detail="人物不存在")
+    return recommend.similar_to_person(db, person_id, limit)
+
+@app.get("/recommend", response_model=List[schemas.SimilarPerson])
+def get_recommendations(
+    topic: str = Query(..., min_length=1, max_length=100, description="话题，如 金融科技、LLM"),
+    person_id: Optional[int] = Query(None, description="给定时优先推荐与此人关系更近的人"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    if person_id is not None and not db.query(models.Person.id).filter(models.Person.id == person_id).first():
+        raise HTTPException(status_code=404, detail="人物不存在")
+    return recommend.recommend_for_topic(db, topic, person_id, limit)
+
+@app.get("/agenda", response_model=schemas.AgendaResponse)
+def get_agenda(
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    start = start or agenda.today()
+    end = end or start + timedelta(days=agenda.DIGEST_DAYS - 1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="查询范围不能超过一年")
+    return agenda.build_agenda(db, start, end)
+
+@app.get("/agenda/digest", response_model=schemas.AgendaResponse)
+def get_agenda_digest(day: Optional[date] = Query(None, alias="date"), db: Session = Depends(get_db)):
+    return agenda.daily_digest(db, day)
 
 @app.post("/extract/check-name")
 def check_name(request: dict, db: Session = Depends(get_db)):
@@ -994,15 +889,98 @@ def check_name(request: dict, db: Session = Depends(get_db)):
             "person": {
                 "id": existing_person.id,
                 "name": existing_person.name,
-                "job": existing_person.profile.get("job"),
-                "birthday": existing_person.profile.get("birthday")
+                "job": existing_person.job,
+                "birthday": existing_person.birthday
             }
         }
     else:
         return {"exists": False}
 
+def _find_person_with_children(db: Session, name: str) -> Optional[models.Person]:
+    return db.query(models.Person).options(
+        selectinload(models.Person.events),
+        selectinload(models.Person.annotations),
+        selectinload(models.Person.developments),
+    ).filter(models.Person.name == name).first()
+
+def _compare_response(result: Dict[str, Any]) -> schemas.CompareResponse:
+    return schemas.CompareResponse(
+        profile=schemas.ExtractedProfile(**result['profile']),
+        annotations=result['annotations'],
+        developments=result['developments'],
+        relations=result['relations'],
+        conflicts=result['conflicts']
+    )
+
+@app.post("/extract/resolve", response_model=schemas.ExtractResolveResponse)
+async def extract_and_resolve(request: schemas.ExtractRequest, http_request: Request,
+                              x_job_id: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """/extract、/extract/check-name、/extract/compare 合并成一次调用。
+
+    流式抽取中一解析出 profile.name 就在线程池里查人并预加载子记录，与模型剩余输出重叠。
+    """
+    api_key = _api_key()
+    quick = await _try_fastpath(request.text, api_key, db)
+    if quick is not None:
+        work = _resolve_quick(quick, db)
+    elif api_key:
+        work = _resolve_with_ai(request.text, api_key, db)
+    else:
+        raise HTTPException(status_code=500, detail="NVIDIA_API_KEY 未配置")
+    return await cancellation.run(http_request, work, x_job_id)
+
+async def _resolve_quick(extracted: schemas.ExtractResponse, db: Session) -> schemas.ExtractResolveResponse:
+    person = await run_in_threadpool(_find_person_with_children, db, extracted.profile.name)
+    return await _resolve_response(extracted, person)
+
+async def _resolve_with_ai(text: str, api_key: str, db: Session) -> schemas.ExtractResolveResponse:
+    lookups: Dict[str, asyncio.Task] = {}
+
+    def start_lookup(name: str) -> None:
+        # 会话不能并发使用：同一时刻只允许一个查询在跑
+        if not lookups:
+            lookups[name] = asyncio.ensure_future(run_in_threadpool(_find_person_with_children, db, name))
+
+    try:
+        extracted = await extract_with_ai(text, api_key, on_delta=llm.ExtractNameWatcher(start_lookup))
+    except BaseException:
+        # 线程池里的查询无法中途取消，等它结束后再让依赖关闭会话
+        if lookups:
+            await asyncio.wait(list(lookups.values()))
+        raise
+
+    name = extracted.profile.name.strip()
+    person = None
+    for early_name, task in lookups.items():
+        found = await task
+        if early_name == name:
+            person = found
+            metrics.cache_lookup("extract_resolve_prefetch", True)
+            break
+    else:
+        # 命中结果缓存（没有流式输出）或最终名字与流式中途看到的不一致时补查一次
+        if name:
+            metrics.cache_lookup("extract_resolve_prefetch", False)
+            person = await run_in_threadpool(_find_person_with_children, db, name)
+
+    return await _resolve_response(extracted, person)
+
+async def _resolve_response(extracted: schemas.ExtractResponse,
+                            person: Optional[models.Person]) -> schemas.ExtractResolveResponse:
+    if person is None:
+        return schemas.ExtractResolveResponse(extraction=extracted, exists=False)
+
+    result = await compare_and_filter_new_data(person, extracted)
+    return schemas.ExtractResolveResponse(
+        extraction=extracted,
+        exists=True,
+        person=schemas.MatchedPerson(id=person.id, name=person.name, job=person.job, birthday=person.birthday),
+        comparison=_compare_response(result)
+    )
+
 @app.post("/extract/compare", response_model=schemas.CompareResponse)
-async def compare_data(request: dict, db: Session = Depends(get_db)):
+async def compare_data(request: dict, http_request: Request, x_job_id: Optional[str] = Header(None),
+                       db: Session = Depends(get_db)):
     person_id = request.get("person_id")
     extracted_data_dict = request.get("extracted_data")
     
@@ -1015,12 +993,14 @@ async def compare_data(request: dict, db: Session = Depends(get_db)):
     
     extracted_data = schemas.ExtractResponse(**extracted_data_dict)
     
-    result = await compare_and_filter_new_data(existing_person, extracted_data)
+    result = await cancellation.run(
+        http_request, compare_and_filter_new_data(existing_person, extracted_data), x_job_id)
     
-    return schemas.CompareResponse(
-        profile=schemas.ExtractedProfile(**result['profile']),
-        annotations=result['annotations'],
-        developments=result['developments'],
-        relations=result['relations'],
-        conflicts=result['conflicts']
-    )
+    return _compare_response(result)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, tenant: str = Depends(get_tenant)):
+    """取消带 X-Job-ID 请求头发起、仍在进行的抽取/比对请求（async：任务只能在事件循环线程里取消）。"""
+    if not cancellation.cancel(tenant, job_id):
+        raise HTTPException(status_code=404, detail="任务不存在或已结束")
+    return {"success": True, "message": "任务已取消"}
@@ -0,0 +1,152 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from . import fastpath, models
+
+
+def calculate_similarity(str1: str, str2: str) -> float:
+    return SequenceMatcher(None, str1, str2).ratio()
+
+
+def is_similar_event(event1: Dict, event2: Dict, threshold: float = 0.5) -> bool:
+    if event1.get('date') != event2.get('date'):
+        return False
+
+    desc1 = event1.get('description', '')
+    desc2 = event2.get('description', '')
+
+    similarity = calculate_similarity(desc1, desc2)
+    if similarity >= threshold:
+        return True
+
+    has_eat1 = any(keyword in desc1 for keyword in fastpath.EAT_KEYWORDS)
+    has_eat2 = any(keyword in desc2 for keyword in fastpath.EAT_KEYWORDS)
+    if has_eat1 and has_eat2:
+        return True
+
+    has_meet1 = any(keyword in desc1 for keyword in fastpath.MEET_KEYWORDS)
+    has_meet2 = any(keyword in desc2 for keyword in fastpath.MEET_KEYWORDS)
+    if has_meet1 and has_meet2:
+        return True
+
+    return False
+
+
+# 合并人物：子记录、关系、圈子成员全部用按集合的 UPDATE/DELETE 改挂到目标人物，
+# SQL 条数与记录数无关；重复判定沿用录入时的规则（事件相似、标注时间+描述、发展方向内容+类型）
+
+
+def _ordered_rows(db: Session, model, fields: Tuple[str, ...], owner_rank: Dict[int, int]) -> List[Any]:
+    columns = [model.id, model.person_id, *(getattr(model, f) for f in fields)]
+    rows = db.execute(select(*columns).where(model.person_id.in_(owner_rank))).all()
+    # 目标人物的记录优先保留，其次按来源人物的顺序
+    return sorted(rows, key=lambda r: (owner_rank[r.person_id], r.id))
+
+
+def _duplicate_events(db: Session, owner_rank: Dict[int, int]) -> Set[int]:
+    rows = _ordered_rows(db, models.Event, ("date", "description"), owner_rank)
+    kept: Dict[str, List[Dict[str, Any]]] = {}
+    drop: Set[int] = set()
+    for row in rows:
+        incoming = {'id': row.id, 'date': row.date, 'description': row.description or ''}
+        same_day = kept.setdefault(row.date, [])
+        # 目标人物原有的事件之间不互相去重，只处理合并进来的
+        similar = None
+        if owner_rank[row.person_id]:
+            similar = next((e for e in same_day if is_similar_event(e, incoming)), None)
+        if similar is None:
+            same_day.append(incoming)
+        elif len(incoming['description']) > len(similar['description']):
+            # 与确认录入时一致：保留描述更详细的一条
+            drop.add(similar['id'])
+            same_day[same_day.index(similar)] = incoming
+        else:
+            drop.add(row.id)
+    return drop
+
+
+def _duplicate_by_key(db: Session, model, fields: Tuple[str, ...], owner_rank: Dict[int, int]) -> Set[int]:
+    rows = _ordered_rows(db, model, fields, owner_rank)
+    seen = set()
+    drop: Set[int] = set()
+    for row in rows:
+        key = tuple(row[2:])
+        if key in seen and owner_rank[row.person_id]:
+            drop.add(row.id)
+        seen.add(key)
+    return drop
+
+
+def _fold_profile(target: models.Person, sources: List[models.Person]) -> None:
+    profile = dict(target.profile or {})
+    notes = list(profile.get('notes') or [])
+    for source in sources:
+        for key, value in (source.profile or {}).items():
+            if key == 'notes':
+                notes.extend(n for n in value or [] if n not in notes)
+            elif value and not profile.get(key):
+                profile[key] = value
+        if not target.avatar and source.avatar:
+            target.avatar = source.avatar
+    if notes or 'notes' in profile:
+        profile['notes'] = notes
+    if profile != target.profile:
+        target.profile = profile
+
+
+def merge_persons(db: Session, target_id: int, source_ids: List[int]) -> models.Person:
+    source_ids = list(dict.fromkeys(source_ids))
+    if target_id in source_ids:
+        raise HTTPException(status_code=400, detail="不能将人物合并到自身")
+    persons = {p.id: p for p in db.query(models.Person).filter(models.Person.id.in_([target_id, *source_ids]))}
+    if len(persons) != len(source_ids) + 1:
+        raise HTTPException(status_code=404, detail="人物不存在")
+    target = persons[target_id]
+    owner_rank = {pid: rank for rank, pid in enumerate([target_id, *source_ids])}
+
+    drops = {
+        models.Event: _duplicate_events(db, owner_rank),
+        models.Annotation: _duplicate_by_key(db, models.Annotation, ("time", "description"), owner_rank),
+        models.Development: _duplicate_by_key(db, models.Development, ("content", "type"), owner_rank),
+    }
+    for model, ids in drops.items():
+        if ids:
+            db.execute(delete(model).where(model.id.in_(ids)), execution_options={"synchronize_session": False})
+        db.execute(update(model).where(model.person_id.in_(source_ids)).values(person_id=target_id),
+                   execution_options={"synchronize_session": False})
+
+    Relation = models.Relation
+    db.execute(update(Relation).where(Relation.from_person_id.in_(source_ids)).values(from_person_id=target_id),
+               execution_options={"synchronize_session": False})
+    db.execute(update(Relation).where(Relation.to_person_id.in_(source_ids)).values(to_person_id=target_id),
+               execution_options={"synchronize_session": False})
+    # 来源与目标之间原有的关系变成自环；同一对人之间只保留最早的一条（与确认录入时的判重一致）
+    involved = or_(Relation.from_person_id == target_id, Relation.to_person_id == target_id)
+    other = aliased(Relation)
+    first_of_pair = (select(func.min(other.id))
+                     .where(or_(other.from_person_id == target_id, other.to_person_id == target_id))
+                     .group_by(other.from_person_id, other.to_person_id))
+    db.execute(delete(Relation).where(involved, or_(Relation.from_person_id == Relation.to_person_id,
+                                                    Relation.id.not_in(first_of_pair))),
+               execution_options={"synchronize_session": False})
+
+    PersonCircle = models.PersonCircle
+    db.execute(update(PersonCircle).where(PersonCircle.person_id.in_(source_ids)).values(person_id=target_id),
+               execution_options={"synchronize_session": False})
+    member = aliased(PersonCircle)
+    first_of_circle = (select(func.min(member.id)).where(member.person_id == target_id)
+                       .group_by(member.circle_id))
+    db.execute(delete(PersonCircle).where(PersonCircle.person_id == target_id,
+                                          PersonCircle.id.not_in(first_of_circle)),
+               execution_options={"synchronize_session": False})
+
+    _fold_profile(target, [persons[pid] for pid in source_ids])
+    for pid in source_ids:
+        db.expunge(persons[pid])
+    db.execute(delete(models.Person).where(models.Person.id.in_(source_ids)),
+               execution_options={"synchronize_session": False})
+    return target
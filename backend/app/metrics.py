@@ -0,0 +1,299 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [(n, v) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for n, v in pairs:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{n}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 每个桶的计数 + sum + count
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def mean(self, **labels) -> Optional[float]:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[-1]:
+                return None
+            return state[-2] / state[-1]
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._values.items()}
+        for key, state in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} "
+                    f"{_format_value(cumulative)}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {_format_value(state[-1])}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+_metrics: List[_Metric] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn: Callable[[], None]) -> Callable[[], None]:
+    # 在 /metrics 被抓取时调用，用于刷新熔断状态、缓存命中率等按需计算的指标
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    for collect in _collectors:
+        collect()
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = _register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+HTTP_LATENCY = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")))
+SQL_QUERIES_PER_REQUEST = _register(Histogram(
+    "http_request_sql_queries", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS))
+SQL_SECONDS_PER_REQUEST = _register(Histogram(
+    "http_request_sql_duration_seconds", "Total SQL time per HTTP request", ("route",)))
+HTTP_CANCELLED = _register(Counter(
+    "http_requests_cancelled_total", "Requests abandoned before completion", ("route", "reason")))
+SQL_QUERY_LATENCY = _register(Histogram(
+    "sql_query_duration_seconds", "Latency of individual SQL statements"))
+
+LLM_LATENCY = _register(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call latency", ("model", "outcome")))
+LLM_TOKENS = _register(Counter(
+    "llm_tokens_total", "Tokens reported by the upstream usage block", ("model", "kind")))
+LLM_PARSE_FAILURES = _register(Counter(
+    "llm_parse_failures_total", "Model answers that could not be parsed or validated", ("model",)))
+LLM_PARSE_REPAIRS = _register(Counter(
+    "llm_parse_repairs_total", "Model answers that needed JSON repair", ("model",)))
+LLM_STRUCTURED_DOWNGRADES = _register(Counter(
+    "llm_structured_downgrades_total", "Requests retried without structured-output options", ("model",)))
+LLM_CANCELLED = _register(Counter(
+    "llm_requests_cancelled_total", "In-flight upstream LLM calls aborted because the caller went away", ("model",)))
+LLM_CANCELLED_ELAPSED = _register(Counter(
+    "llm_cancelled_elapsed_seconds_total", "Upstream time already spent on aborted calls", ("model",)))
+LLM_CANCELLED_SAVED = _register(Counter(
+    "llm_cancelled_saved_seconds_total",
+    "Estimated upstream time saved by aborting calls (mean successful latency minus elapsed)", ("model",)))
+LLM_BREAKER_STATE = _register(Gauge(
+    "llm_circuit_open", "1 if the model circuit breaker is open or half-open", ("model",)))
+LLM_RATE_LIMIT = _register(Gauge(
+    "llm_rate_limit_per_second", "Current adaptive rate limit per model", ("model",)))
+
+EXTRACT_BATCH_SIZE = _register(Histogram(
+    "extract_batch_size", "Inputs packed into one upstream extraction request", (), COUNT_BUCKETS))
+EXTRACT_BATCH_FALLBACKS = _register(Counter(
+    "extract_batch_fallbacks_total", "Batched inputs re-sent individually after a missing or invalid result"))
+EXTRACT_FASTPATH = _register(Counter(
+    "extract_fastpath_total", "Extraction requests by local rule-based fast path outcome", ("outcome",)))
+EXTRACT_FASTPATH_HIT_RATIO = _register(Gauge(
+    "extract_fastpath_hit_ratio", "Share of extraction requests answered by the fast path with high confidence"))
+
+TIE_STRENGTH_REFRESHES = _register(Counter(
+    "tie_strength_refreshes_total", "Relationship strength recomputations", ("mode",)))
+TIE_STRENGTH_REFRESH_SECONDS = _register(Histogram(
+    "tie_strength_refresh_seconds", "Time spent recomputing relationship strength", ("mode",)))
+
+TENANT_ENGINES = _register(Gauge(
+    "tenant_engines_open", "Per-tenant database engines currently cached"))
+
+CACHE_REQUESTS = _register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")))
+CACHE_HIT_RATIO = _register(Gauge(
+    "cache_hit_ratio", "Hit ratio since process start", ("cache",)))
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@register_collector
+def _collect_cache_ratios() -> None:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.items():
+        hits_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_total[1] += value
+        if result == "hit":
+            hits_total[0] += value
+    for cache, (hits, total) in totals.items():
+        CACHE_HIT_RATIO.set(hits / total if total else 0.0, cache=cache)
+
+
+class _RequestStats:
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_request_stats: contextvars.ContextVar[Optional[_RequestStats]] = contextvars.ContextVar(
+    "request_sql_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    SQL_QUERY_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+
+
+# 纯 ASGI 中间件，避免 BaseHTTPMiddleware 的额外任务和响应体拷贝
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method=method, route=route_path, status=str(status["code"]))
+            HTTP_LATENCY.observe(elapsed, method=method, route=route_path)
+            SQL_QUERIES_PER_REQUEST.observe(stats.queries, route=route_path)
+            SQL_SECONDS_PER_REQUEST.observe(stats.sql_seconds, route=route_path)
+
+
+def current_request_stats() -> Optional[_RequestStats]:
+    return _request_stats.get()
@@ -0,0 +1,180 @@
+import json
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from fastapi import HTTPException
+
+from .database import Base
+from . import avatars, circle_stats, dates
+from . import models  # noqa: F401  注册全部表到 Base.metadata
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _profile_columns(conn: Connection) -> None:
+    _add_column(conn, "persons", "job", "VARCHAR")
+    _add_column(conn, "persons", "birthday", "VARCHAR")
+    _create_index(conn, "ix_persons_job", "persons", "job")
+    _create_index(conn, "ix_persons_birthday", "persons", "birthday")
+
+    rows = conn.execute(text("SELECT id, profile_json FROM persons")).fetchall()
+    updates = []
+    for person_id, profile_json in rows:
+        try:
+            profile = json.loads(profile_json or "{}")
+        except ValueError:
+            continue
+        if not isinstance(profile, dict):
+            continue
+        updates.append({"id": person_id, "job": profile.get("job"), "birthday": profile.get("birthday")})
+    if updates:
+        conn.execute(text("UPDATE persons SET job = :job, birthday = :birthday WHERE id = :id"), updates)
+
+
+def _agenda_columns(conn: Connection) -> None:
+    _add_column(conn, "persons", "birthday_md", "VARCHAR")
+    _add_column(conn, "annotations", "starts_on", "VARCHAR")
+    _add_column(conn, "annotations", "ends_on", "VARCHAR")
+    _create_index(conn, "ix_persons_birthday_md", "persons", "birthday_md")
+    _create_index(conn, "ix_annotations_starts_on", "annotations", "starts_on")
+
+    rows = conn.execute(text("SELECT id, birthday FROM persons WHERE birthday IS NOT NULL")).fetchall()
+    updates = [{"id": pid, "md": dates.birthday_month_day(b)} for pid, b in rows]
+    if updates:
+        conn.execute(text("UPDATE persons SET birthday_md = :md WHERE id = :id"), updates)
+
+    rows = conn.execute(text("SELECT id, time FROM annotations")).fetchall()
+    updates = []
+    for ann_id, time_value in rows:
+        start, end = dates.parse_time_range(time_value)
+        updates.append({"id": ann_id, "start": start, "end": end})
+    if updates:
+        conn.execute(text("UPDATE annotations SET starts_on = :start, ends_on = :end WHERE id = :id"), updates)
+
+
+def _timeline_indexes(conn: Connection) -> None:
+    _create_index(conn, "ix_events_person_date_id", "events", "person_id, date, id")
+    _create_index(conn, "ix_annotations_person_starts_on_id", "annotations", "person_id, starts_on, id")
+
+
+def _avatar_store(conn: Connection) -> None:
+    # 内嵌在 avatar 列里的 data URL 转存到头像存储，列里只留哈希
+    rows = conn.execute(text("SELECT id, avatar FROM persons WHERE avatar LIKE 'data:%'")).fetchall()
+    updates = []
+    for person_id, value in rows:
+        try:
+            updates.append({"id": person_id, "avatar": avatars.store_data_url(value)})
+        except HTTPException as e:
+            logger.warning("人物 %s 的头像无法转存，保留原值: %s", person_id, e.detail)
+    if updates:
+        conn.execute(text("UPDATE persons SET avatar = :avatar WHERE id = :id"), updates)
+
+
+def _circle_stats(conn: Connection) -> None:
+    circle_stats.refresh(conn)
+
+
+def _notes_column(conn: Connection) -> None:
+    _add_column(conn, "persons", "notes", "TEXT")
+    rows = conn.execute(text("SELECT id, profile_json FROM persons")).fetchall()
+    updates = []
+    for person_id, profile_json in rows:
+        try:
+            profile = json.loads(profile_json or "{}")
+        except ValueError:
+            continue
+        if isinstance(profile, dict):
+            updates.append({"id": person_id, "notes": models.notes_text(profile.get("notes"))})
+    if updates:
+        conn.execute(text("UPDATE persons SET notes = :notes WHERE id = :id"), updates)
+
+
+def _annotation_sort_index(conn: Connection) -> None:
+    # 时间线按 coalesce(starts_on, '') 排序，原来的 (person_id, starts_on, id) 索引用不上
+    conn.execute(text("DROP INDEX IF EXISTS ix_annotations_person_starts_on_id"))
+    _create_index(conn, "ix_annotations_person_sort_date_id", "annotations", "person_id, coalesce(starts_on, ''), id")
+
+
+# (版本号, 说明, 升级函数)；只追加，不修改已发布的条目
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "persons.job / persons.birthday 列", _profile_columns),
+    (2, "标注日期区间与生日月日列", _agenda_columns),
+    (3, "时间线复合索引", _timeline_indexes),
+    (4, "头像 data URL 转存为哈希", _avatar_store),
+    (5, "圈子统计物化表", _circle_stats),
+    (6, "persons.notes 列", _notes_column),
+    (7, "标注时间线按排序表达式建索引", _annotation_sort_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+
+
+def current_version(conn: Connection) -> int:
+    _ensure_version_table(conn)
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def _set_version(conn: Connection, version: int) -> None:
+    _ensure_version_table(conn)
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+def migrate(engine: Engine) -> int:
+    with engine.begin() as conn:
+        fresh = not inspect(conn).has_table("persons")
+        Base.metadata.create_all(bind=conn)
+        if fresh:
+            # 新库直接按最新模型建表，不需要逐步迁移
+            _set_version(conn, LATEST_VERSION)
+            return LATEST_VERSION
+
+        version = current_version(conn)
+        for target, description, upgrade in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info("执行数据库迁移 %s: %s", target, description)
+            upgrade(conn)
+            _set_version(conn, target)
+            version = target
+        return version
+
+
+class SchemaTooNewError(RuntimeError):
+    pass
+
+
+def ensure_schema(engine: Engine) -> int:
+    """启动时的版本检查：已是最新版本时只读一次 schema_version，不反射、不建表；否则执行 migrate。"""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except DBAPIError:
+        version = None  # 新库还没有 schema_version 表
+    if version == LATEST_VERSION:
+        return version
+    if version is not None and version > LATEST_VERSION:
+        raise SchemaTooNewError(f"数据库结构版本 {version} 高于当前代码支持的 {LATEST_VERSION}，请升级后端")
+    return migrate(engine)
@@ -1,8 +1,18 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, Float
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql import func, literal_column
 from .database import Base
+from . import dates
 import json
+from types import MappingProxyType
+
+def _frozen(profile):
+    return MappingProxyType(profile) if isinstance(profile, dict) else profile
+
+def notes_text(notes):
+    if not isinstance(notes, list):
+        return None
+    return "\n".join(str(n) for n in notes if n) or None
 
 class Person(Base):
     __tablename__ = "persons"
@@ -11,6 +21,11 @@ class Person(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     avatar = Column(String, nullable=True)
     profile_json = Column(Text, nullable=False, default='{}')
+    job = Column(String, nullable=True, index=True)
+    birthday = Column(String, nullable=True, index=True)
+    birthday_md = Column(String, nullable=True, index=True)
+    # profile.notes 按行拼接，供“其它信息”搜索，不去匹配 JSON 的键名和转义
+    notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -21,16 +36,38 @@ class Person(Base):
     relations_to = relationship("Relation", foreign_keys="Relation.to_person_id", back_populates="to_person", cascade="all, delete-orphan")
     person_circles = relationship("PersonCircle", back_populates="person", cascade="all, delete-orphan")
 
+    # 解析结果按 profile_json 字符串缓存在实例上，只有 profile_json 变化时才重新解析。
+    # 返回只读映射，多个调用方共用同一份；要修改先 dict(...) 复制（嵌套的 notes 列表也要复制），
+    # 改完赋值回 profile，经过 @validates 同步列
     @property
     def profile(self):
-        return json.loads(self.profile_json)
+        raw = self.profile_json
+        cached = self.__dict__.get("_profile_cache")
+        if cached is None or cached[0] is not raw:
+            cached = (raw, _frozen(json.loads(raw) if raw else {}))
+            self.__dict__["_profile_cache"] = cached
+        return cached[1]
 
     @profile.setter
     def profile(self, value):
-        self.profile_json = json.dumps(value, ensure_ascii=False)
+        self.profile_json = json.dumps(value, ensure_ascii=False, default=dict)
+
+    @validates("profile_json")
+    def _sync_profile_columns(self, key, value):
+        profile = json.loads(value) if value else {}
+        self.__dict__["_profile_cache"] = (value, _frozen(profile))
+        if isinstance(profile, dict):
+            self.job = profile.get("job")
+            self.birthday = profile.get("birthday")
+            self.birthday_md = dates.birthday_month_day(self.birthday)
+            self.notes = notes_text(profile.get("notes"))
+        return value
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_person_date_id", "person_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     person_id = Column(Integer, ForeignKey("persons.id"), nullable=False)
@@ -61,6 +98,8 @@ class Annotation(Base):
     id = Column(Integer, primary_key=True, index=True)
     person_id = Column(Integer, ForeignKey("persons.id"), nullable=False)
     time = Column(String, nullable=False)
+    starts_on = Column(String, nullable=True, index=True)
+    ends_on = Column(String, nullable=True)
     location = Column(String, nullable=True)
     description = Column(String, nullable=False)
     source = Column(String, nullable=False, default='user')
@@ -69,6 +108,16 @@ class Annotation(Base):
 
     person = relationship("Person", back_populates="annotations")
 
+    @validates("time")
+    def _sync_time_range(self, key, value):
+        self.starts_on, self.ends_on = dates.parse_time_range(value)
+        return value
+
+# 时间线的排序键：没有起始日期的标注按 "" 排。索引建在同一个表达式上（'' 写成字面量，
+# 绑定参数对不上索引表达式），ORDER BY 才能直接走索引
+ANNOTATION_SORT_DATE = func.coalesce(Annotation.starts_on, literal_column("''"))
+Index("ix_annotations_person_sort_date_id", Annotation.person_id, ANNOTATION_SORT_DATE, Annotation.id)
+
 class Development(Base):
     __tablename__ = "developments"
 
@@ -103,9 +152,41 @@ class PersonCircle(Base):
     person = relationship("Person", back_populates="person_circles")
     circle = relationship("Circle", back_populates="person_circles")
 
+class CircleStat(Base):
+    """圈子统计的物化结果，由写入钩子在同一事务内维护（见 circle_stats.py）。"""
+    __tablename__ = "circle_stats"
+
+    # 不设外键：删除圈子后统计行在同一事务的提交前清理，不挡住删除
+    circle_id = Column(Integer, primary_key=True)
+    member_count = Column(Integer, nullable=False, default=0)
+    # {"其它圈子 id": 共同成员数}，只记非零项
+    overlaps_json = Column(Text, nullable=False, default='{}')
+    # [{"topic": 发展方向, "count": 人数}]，按人数降序
+    topics_json = Column(Text, nullable=False, default='[]')
+
 class GraphLayout(Base):
     __tablename__ = "graph_layout"
 
     user_id = Column(String, primary_key=True, default='default')
     layout_json = Column(Text, nullable=False, default='{}')
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """写接口的幂等记录：同一个 Idempotency-Key 重试时直接返回首次的响应。"""
+    __tablename__ = "idempotency_keys"
+
+    endpoint = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    # pending: 处理中；committed: 写入已提交、响应尚未保存；done: 响应已保存
+    state = Column(String, nullable=False, default="pending")
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_ts = Column(Float, nullable=False, index=True)
@@ -0,0 +1,247 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# 按模型的上下文预算（提示词 + 输入 + 输出，单位：估算 token）
+MODEL_TOKEN_BUDGET = {
+    "z-ai/glm4.7": 128000,
+    "deepseek-ai/DeepSeek-V3": 64000,
+    "Qwen/Qwen2.5-72B-Instruct": 32768,
+    "meta/llama-3.1-405b-instruct": 128000,
+}
+DEFAULT_TOKEN_BUDGET = 8192
+MIN_OUTPUT_TOKENS = 256
+
+# 支持在 system 消息上标注可缓存前缀的模型
+PROMPT_CACHE_MODELS = {
+    "deepseek-ai/DeepSeek-V3",
+    "z-ai/glm4.7",
+}
+
+WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+def get_timezone() -> tzinfo:
+    name = os.getenv("APP_TIMEZONE", "Asia/Shanghai")
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        # Windows 上没有 tzdata 时退回到固定的东八区
+        return timezone(timedelta(hours=8), name)
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _next_month(day) -> str:
+    if day.month == 12:
+        return f"{day.year + 1}-01"
+    return f"{day.year}-{day.month + 1:02d}"
+
+
+def date_context(now: Optional[datetime] = None) -> Dict[str, str]:
+    tz = get_timezone()
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    today = now.date()
+    return {
+        "today": today.isoformat(),
+        "yesterday": (today - timedelta(days=1)).isoformat(),
+        "tomorrow": (today + timedelta(days=1)).isoformat(),
+        "next_month": _next_month(today),
+        "weekday": WEEKDAYS[today.weekday()],
+        "timezone": str(tz),
+    }
+
+
+class RenderedPrompt:
+    def __init__(self, template: "PromptTemplate", dynamic: str):
+        self.template = template
+        self.dynamic = dynamic
+        self.text = template.static + dynamic
+        self.tokens = template.static_tokens + estimate_tokens(dynamic)
+
+    @property
+    def cache_key(self) -> Tuple[str, str]:
+        return (self.template.fingerprint, self.dynamic)
+
+    def messages(self, user_content: str, model: str, cache_prefix: bool = True) -> List[Dict[str, Any]]:
+        if cache_prefix and model in PROMPT_CACHE_MODELS:
+            system_content: Any = [
+                {"type": "text", "text": self.template.static, "cache_control": {"type": "ephemeral"}},
+            ]
+            if self.dynamic:
+                system_content.append({"type": "text", "text": self.dynamic})
+        else:
+            system_content = self.text
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_content}
+        ]
+
+    def max_tokens_for(self, model: str, user_content: str, max_tokens: int) -> Optional[int]:
+        budget = MODEL_TOKEN_BUDGET.get(model, DEFAULT_TOKEN_BUDGET)
+        available = budget - self.tokens - estimate_tokens(user_content)
+        if available < MIN_OUTPUT_TOKENS:
+            return None
+        return min(max_tokens, available)
+
+
+# 静态部分在前、日期等动态部分在后，保证跨天调用时前缀不变、可被上游缓存
+class PromptTemplate:
+    def __init__(self, name: str, version: int, static: str, dynamic: str = ""):
+        self.name = name
+        self.version = version
+        self.static = static
+        self.dynamic = dynamic
+        self.static_tokens = estimate_tokens(static)
+        digest = hashlib.sha256((static + "\0" + dynamic).encode("utf-8")).hexdigest()[:12]
+        self.fingerprint = f"{name}:v{version}:{digest}"
+        self._render = lru_cache(maxsize=8)(self._render_uncached)
+
+    def _render_uncached(self, context_items: Tuple[Tuple[str, str], ...]) -> RenderedPrompt:
+        return RenderedPrompt(self, self.dynamic.format(**dict(context_items)) if self.dynamic else "")
+
+    def render(self, now: Optional[datetime] = None) -> RenderedPrompt:
+        if not self.dynamic:
+            return self._render(())
+        return self._render(tuple(sorted(date_context(now).items())))
+
+
+_registry: Dict[str, PromptTemplate] = {}
+
+
+def register(template: PromptTemplate) -> PromptTemplate:
+    _registry[template.name] = template
+    return template
+
+
+def get(name: str) -> PromptTemplate:
+    return _registry[name]
+
+
+def versions() -> Dict[str, str]:
+    return {name: t.fingerprint for name, t in _registry.items()}
+
+
+EXTRACT_PROMPT = register(PromptTemplate(
+    "extract",
+    2,
+    """你是一个专业的人物信息提取助手。请仔细分析用户输入的文本，按语义智能提取所有相关信息，并严格按照以下JSON格式输出，不要包含任何额外的解释或说明。
+
+{
+  "profile": {
+    "name": "主要人物姓名（必填）",
+    "job": "职业或工作内容（可选）",
+    "birthday": "生日（可选，格式为MM-DD或YYYY-MM-DD，例如：05-20、1990-05-20）",
+    "notes": [
+      "其它个人信息，如过敏、饮食喜好、学校、习惯等。例如：对海鲜过敏、爱吃榴莲、深圳中学、早睡早起"
+    ],
+    "events": [
+      {
+        "date": "日期（格式为YYYY-MM-DD）",
+        "location": "地点（可选）",
+        "description": "事件详细描述"
+      }
+    ]
+  },
+  "annotations": [
+    {
+      "time": "时间（格式为YYYY-MM-DD或YYYY-MM）",
+      "location": "地点（可选）",
+      "description": "关键动作或待办事项描述"
+    }
+  ],
+  "developments": [
+    {
+      "content": "发展方向或领域内容",
+      "type": "resource"
+    }
+  ],
+  "relations": [
+    {
+      "name": "相关人物姓名",
+      "relation_type": "关系类型，如朋友、同事、同学、家人等"
+    }
+  ]
+}
+
+【重要提取规则】
+1. 事件(events)：提取过去或已经发生的事情，或者没有明确时间但已经发生或正在发生的事情
+2. 标注(annotations)：只提取未来的计划、约定或待办事项
+3. 发展方向(developments)：提取人物从事的领域、行业或专业方向
+4. 生日提取：仔细查找生日相关表述，如"生日是5月20日"、"5月20日是她生日"、"1990年5月20日出生"等，提取为MM-DD或YYYY-MM-DD格式
+5. 如果某个字段没有明确提到的信息，保持为null或空数组
+6. 绝对不要编造任何信息，只提取文本中明确存在的内容
+7. 注意区分事件和标注：已发生的放events，未来计划放annotations
+8. 对于类似"和张三吃晚饭"这样的文本，"张三"是主要人物姓名，"吃晚饭"是事件描述，日期默认为今天，不要把张三放到relations里！
+9.【关键】事件描述必须忠实于原文，不要随意添加或修改原文中没有的信息。例如：原文是"吃饭"，就保留"吃饭"，不要改成"和我吃饭"、"一起吃饭"等；原文是"吃晚饭"，就保留"吃晚饭"。
+10.【关键】不要添加冗余的、原文中没有明确提到的词语（如"和我"、"我们"、"一起"等），除非原文明确提到。
+11. 事件描述要简洁明了，准确反映原文内容，确保信息质量。
+12.【关键】地点提取要保持一致性：
+    - 对于常见城市名称，使用标准简称，如"上海"、"北京"、"深圳"、"广州"等
+    - 不要添加冗余前缀或后缀，如"上海市"简称为"上海"，"北京市"简称为"北京"
+    - 对于公司、餐厅等具体地点，直接提取原文中的完整名称
+    - 同一地点在多次提取中必须保持相同的表述，例如始终用"上海"而不要一会儿"上海"一会儿"上海市"
+13.【关键】所有信息的提取都要保持用词一致性，避免同一概念有多种不同表述，确保后续数据比对和处理的准确性。
+14.【关键】其它个人信息(notes)提取：仔细识别文本中不属于事件、标注、发展方向的个人信息，例如：
+    - 过敏信息：如"对海鲜过敏"、"对芒果过敏"
+    - 饮食喜好：如"爱吃榴莲"、"喜欢吃辣"、"不喜欢吃香菜"
+    - 学校/教育背景：如"深圳中学"、"清华大学毕业"
+    - 习惯/特点：如"不喜欢喝酒"、"早睡早起"、"性格开朗"
+    - 其他个人信息：任何与人物相关但不属于上述类别的信息
+    - 直接提取原文中的描述，不要添加额外信息，不要分类，直接作为简单文本放入notes数组。
+""",
+    """15. 当前参考日期：{today}（{weekday}，时区 {timezone}）
+   - 相对时间转换：
+     - "昨天" → {yesterday}
+     - "今天" → {today}
+     - "明天" → {tomorrow}
+     - "下个月" → {next_month}（格式YYYY-MM）
+     - "6月18日" → 06-18（格式MM-DD，用于生日）
+   - 如果文本中没有明确提到时间，但有明确的动作/事件（如"吃晚饭"、"见面"等），默认认为是今天发生的，日期设为{today}"""
+))
+
+# 批量抽取复用单条抽取的规则和日期上下文，只在末尾追加打包格式说明，
+# 单条与批量两个前缀各自都能被上游缓存
+EXTRACT_BATCH_PROMPT = register(PromptTemplate(
+    "extract_batch",
+    1,
+    EXTRACT_PROMPT.static + """
+【批量模式】
+用户消息包含多条相互独立的文本，每条以“[序号]”开头。请逐条按上述规则单独提取，条目之间不要共享任何信息，
+并严格按照以下JSON格式输出，不要包含任何额外的解释或说明：
+{
+  "results": [
+    {"index": 序号, "result": {按上面格式对这一条文本的提取结果}}
+  ]
+}
+每条输入都必须有且只有一个对应结果，index 与输入中的序号一致。
+""",
+    EXTRACT_PROMPT.dynamic
+))
+
+DETAIL_COMPARE_PROMPT = register(PromptTemplate(
+    "detail_compare",
+    1,
+    """你是一个专业的事件描述比较助手。请比较两个事件描述，判断哪个更加详细和具体。
+
+任务要求：
+1. 分析两个事件描述，判断哪一个包含更多具体信息
+2. 考虑时间信息（早/中/晚餐）、地点、参与者等因素
+3. 例如："吃晚饭"比"吃饭"更详细；"和张三在上海吃午饭"比"吃饭"更详细
+
+输出格式要求：
+请严格按照以下JSON格式输出，不要包含任何额外文字：
+{
+  "more_detailed": "desc1" 或 "desc2",
+  "reason": "简短原因"
+}
+"""
+))
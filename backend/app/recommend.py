@@ -0,0 +1,350 @@
+import threading
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import embeddings, hooks, models, schemas
+from .database import on_tenant_evicted, tenant_of
+
+# 综合三类信号打分：发展方向的语义相似度、共同圈子、关系图上的远近
+WEIGHT_DEVELOPMENT = 0.4
+WEIGHT_CIRCLE = 0.3
+WEIGHT_GRAPH = 0.3
+# 二度人脉（共同联系人）最多按直接关系的一半计
+SECOND_DEGREE_FACTOR = 0.5
+TOPIC_MIN_SCORE = 0.5
+
+_NO_IDS = np.zeros(0, dtype=np.int64)
+
+
+class Scores(NamedTuple):
+    """一路信号的稀疏打分：ids 升序，scores/counts 与之对齐。"""
+    ids: np.ndarray
+    scores: np.ndarray
+    counts: np.ndarray
+
+
+EMPTY_SCORES = Scores(_NO_IDS, np.zeros(0), _NO_IDS)
+
+
+def scores_from(mapping: Dict[int, float]) -> Scores:
+    ids = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+    values = np.fromiter(mapping.values(), dtype=np.float64, count=len(mapping))
+    order = np.argsort(ids)
+    return Scores(ids[order], values[order], np.zeros(len(ids), dtype=np.int64))
+
+
+def _store(array: np.ndarray, index: int, value: int) -> np.ndarray:
+    if index >= len(array):
+        grown = np.zeros(max(index + 1, 2 * len(array)), dtype=array.dtype)
+        grown[:len(array)] = array
+        array = grown
+    array[index] = value
+    return array
+
+
+def _row(rows: Dict[int, np.ndarray], sets: Dict[int, Set[int]], key: int) -> np.ndarray:
+    row = rows.get(key)
+    if row is None:
+        members = sets.get(key, ())
+        row = rows[key] = np.fromiter(members, dtype=np.int64, count=len(members))
+    return row
+
+
+class NetworkIndex:
+    """人物的稀疏特征：所在圈子、直接联系人，按写入增量维护。
+
+    集合是写入的底稿；打分用的是按行缓存的数组（圈子 -> 成员、人物 -> 联系人，
+    相当于 CSR 矩阵的一行）和按人物 id 下标的圈子数、联系人数，写入只作废改动到的行。
+    """
+
+    def __init__(self):
+        self.circles_of: Dict[int, Set[int]] = defaultdict(set)
+        self.members_of: Dict[int, Set[int]] = defaultdict(set)
+        self.neighbors: Dict[int, Set[int]] = defaultdict(set)
+        self.relation_type: Dict[Tuple[int, int], str] = {}
+        self.lock = threading.RLock()
+        self._member_rows: Dict[int, np.ndarray] = {}
+        self._neighbor_rows: Dict[int, np.ndarray] = {}
+        self._circle_count = np.zeros(0, dtype=np.int64)
+        self._degree = np.zeros(0, dtype=np.int64)
+
+    def _count_circles(self, person_id: int) -> None:
+        self._circle_count = _store(self._circle_count, person_id, len(self.circles_of.get(person_id, ())))
+
+    def _touch_neighbors(self, person_id: int) -> None:
+        self._neighbor_rows.pop(person_id, None)
+        self._degree = _store(self._degree, person_id, len(self.neighbors.get(person_id, ())))
+
+    def add_membership(self, person_id: int, circle_id: int) -> None:
+        self.circles_of[person_id].add(circle_id)
+        self.members_of[circle_id].add(person_id)
+        self._member_rows.pop(circle_id, None)
+        self._count_circles(person_id)
+
+    def remove_membership(self, person_id: int, circle_id: int) -> None:
+        self.circles_of.get(person_id, set()).discard(circle_id)
+        self.members_of.get(circle_id, set()).discard(person_id)
+        self._member_rows.pop(circle_id, None)
+        self._count_circles(person_id)
+
+    def add_relation(self, a: int, b: int, relation_type: str) -> None:
+        self.neighbors[a].add(b)
+        self.neighbors[b].add(a)
+        self.relation_type[(a, b)] = relation_type
+        self._touch_neighbors(a)
+        self._touch_neighbors(b)
+
+    def remove_relation(self, a: int, b: int) -> None:
+        self.relation_type.pop((a, b), None)
+        # 关系按双向各存一条，两条都删掉后才断开
+        if (b, a) not in self.relation_type:
+            self.neighbors.get(a, set()).discard(b)
+            self.neighbors.get(b, set()).discard(a)
+            self._touch_neighbors(a)
+            self._touch_neighbors(b)
+
+    def remove_person(self, person_id: int) -> None:
+        for circle_id in self.circles_of.pop(person_id, set()):
+            self.members_of.get(circle_id, set()).discard(person_id)
+            self._member_rows.pop(circle_id, None)
+        self._count_circles(person_id)
+        for other in self.neighbors.pop(person_id, set()):
+            self.neighbors.get(other, set()).discard(person_id)
+            self.relation_type.pop((person_id, other), None)
+            self.relation_type.pop((other, person_id), None)
+            self._touch_neighbors(other)
+        self._touch_neighbors(person_id)
+
+    def remove_circle(self, circle_id: int) -> None:
+        for person_id in self.members_of.pop(circle_id, set()):
+            self.circles_of.get(person_id, set()).discard(circle_id)
+            self._count_circles(person_id)
+        self._member_rows.pop(circle_id, None)
+
+    def circle_scores(self, person_id: int) -> Scores:
+        # 二值向量的余弦：共同圈子数 / sqrt(|A| * |B|)
+        mine = self.circles_of.get(person_id)
+        if not mine:
+            return EMPTY_SCORES
+        members = np.concatenate([_row(self._member_rows, self.members_of, c) for c in mine])
+        ids, shared = np.unique(members, return_counts=True)
+        keep = ids != person_id
+        ids, shared = ids[keep], shared[keep]
+        return Scores(ids, shared / np.sqrt(len(mine) * self._circle_count[ids]), shared)
+
+    def graph_scores(self, person_id: int) -> Scores:
+        mine = self.neighbors.get(person_id)
+        if not mine:
+            return EMPTY_SCORES
+        direct = _row(self._neighbor_rows, self.neighbors, person_id)
+        second = np.concatenate([_row(self._neighbor_rows, self.neighbors, n) for n in mine])
+        others, common = np.unique(second, return_counts=True)
+        keep = others != person_id
+        others, common = others[keep], common[keep]
+
+        ids = np.union1d(others, direct)
+        scores = np.zeros(len(ids))
+        counts = np.zeros(len(ids), dtype=np.int64)
+        pos = np.searchsorted(ids, others)
+        scores[pos] = SECOND_DEGREE_FACTOR * common / np.sqrt(len(mine) * self._degree[others])
+        counts[pos] = common
+        scores[np.searchsorted(ids, direct)] = 1.0
+        return Scores(ids, scores, counts)
+
+    def relation_between(self, a: int, b: int) -> Optional[str]:
+        return self.relation_type.get((a, b)) or self.relation_type.get((b, a))
+
+
+_indexes: Dict[str, NetworkIndex] = {}
+_generations: Dict[str, int] = {}
+_registry_lock = threading.Lock()
+
+
+@on_tenant_evicted
+def _forget_tenant(tenant: str) -> None:
+    with _registry_lock:
+        _indexes.pop(tenant, None)
+        _generations.pop(tenant, None)
+
+
+def index_for(db: Session) -> NetworkIndex:
+    tenant = tenant_of(db)
+    with _registry_lock:
+        index = _indexes.get(tenant)
+        generation = _generations.get(tenant, 0)
+    if index is not None:
+        return index
+
+    index = NetworkIndex()
+    for person_id, circle_id in db.execute(select(models.PersonCircle.person_id, models.PersonCircle.circle_id)):
+        index.add_membership(person_id, circle_id)
+    relations = select(models.Relation.from_person_id, models.Relation.to_person_id, models.Relation.relation_type)
+    for a, b, relation_type in db.execute(relations):
+        index.add_relation(a, b, relation_type)
+    with _registry_lock:
+        if _generations.get(tenant, 0) == generation:
+            _indexes.setdefault(tenant, index)
+            index = _indexes[tenant]
+    return index
+
+
+@hooks.on_flush
+def _capture_network(session: Session, changes: hooks.ChangeSet) -> None:
+    if not changes.touches("person_circles", "relations", "persons", "circles"):
+        return
+    ops = changes.payload.setdefault("network", [])
+    if changes.statements:
+        ops.append(("reset",))
+        return
+    for obj in changes.new + changes.dirty:
+        if isinstance(obj, models.PersonCircle):
+            ops.append(("add_membership", obj.person_id, obj.circle_id))
+        elif isinstance(obj, models.Relation):
+            ops.append(("add_relation", obj.from_person_id, obj.to_person_id, obj.relation_type))
+    for obj in changes.deleted:
+        if isinstance(obj, models.PersonCircle):
+            ops.append(("remove_membership", obj.person_id, obj.circle_id))
+        elif isinstance(obj, models.Relation):
+            ops.append(("remove_relation", obj.from_person_id, obj.to_person_id))
+        elif isinstance(obj, models.Person):
+            ops.append(("remove_person", obj.id))
+        elif isinstance(obj, models.Circle):
+            ops.append(("remove_circle", obj.id))
+
+
+@hooks.on_commit
+def _apply_network(session: Session, changes: hooks.ChangeSet) -> None:
+    ops = changes.payload.get("network")
+    if not ops:
+        return
+    tenant = tenant_of(session)
+    with _registry_lock:
+        _generations[tenant] = _generations.get(tenant, 0) + 1
+        index = _indexes.get(tenant)
+        if index is None:
+            return
+        if any(op[0] == "reset" for op in ops):
+            _indexes.pop(tenant, None)
+            return
+    with index.lock:
+        for name, *args in ops:
+            getattr(index, name)(*args)
+
+
+def _development_scores(db: Session, person_id: int, limit: int) -> Dict[int, float]:
+    return dict(embeddings.similar_persons(db, person_id, limit=limit, min_score=0.3))
+
+
+def _load_persons(db: Session, ids: List[int]) -> Dict[int, Tuple[str, Optional[str]]]:
+    if not ids:
+        return {}
+    rows = db.execute(
+        select(models.Person.id, models.Person.name, models.Person.avatar).where(models.Person.id.in_(ids))
+    )
+    return {pid: (name, avatar) for pid, name, avatar in rows}
+
+
+def rank(circle: Scores, graph: Scores, development: Scores, limit: int,
+         candidates: Optional[np.ndarray] = None):
+    """三路信号按权重合成总分，返回前 limit 名的 (ids, 总分, 共同圈子, 共同联系人, 发展相似度)。"""
+    signals = (circle, graph, development)
+    size = 1 + max((int(s.ids[-1]) for s in signals if len(s.ids)), default=-1)
+    if candidates is not None and len(candidates):
+        size = max(size, int(candidates.max()) + 1)
+    # 按人物 id 展开成稠密向量累加，省去逐路按 id 对齐
+    total = np.zeros(size)
+    dev_score = np.zeros(size)
+    shared = np.zeros(size, dtype=np.int64)
+    common = np.zeros(size, dtype=np.int64)
+    total[development.ids] += WEIGHT_DEVELOPMENT * development.scores
+    dev_score[development.ids] = development.scores
+    total[circle.ids] += WEIGHT_CIRCLE * circle.scores
+    shared[circle.ids] = circle.counts
+    total[graph.ids] += WEIGHT_GRAPH * graph.scores
+    common[graph.ids] = graph.counts
+    if candidates is None:
+        present = np.zeros(size, dtype=bool)
+        for signal in signals:
+            present[signal.ids] = True
+        candidates = np.flatnonzero(present)
+
+    scores = total[candidates]
+    if 0 < limit < len(candidates):
+        # 先 partition 出第 limit 名的分数，只对不低于它的候选完整排序
+        threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+    top = candidates[np.lexsort((candidates, -scores))[:limit]]
+    return top, total[top], shared[top], common[top], dev_score[top]
+
+
+def similar_to_person(db: Session, person_id: int, limit: int = 10) -> List[schemas.SimilarPerson]:
+    index = index_for(db)
+    with index.lock:
+        circle = index.circle_scores(person_id)
+        graph = index.graph_scores(person_id)
+    development = scores_from(_development_scores(db, person_id, limit=max(limit * 5, 50)))
+    top = list(zip(*(column.tolist() for column in rank(circle, graph, development, limit))))
+
+    persons = _load_persons(db, [other for other, *_ in top])
+    result = []
+    for other, score, shared, common, dev_score in top:
+        if other not in persons:
+            continue
+        name, avatar = persons[other]
+        result.append(schemas.SimilarPerson(
+            person_id=other, name=name, avatar=avatar, score=round(score, 4),
+            shared_circles=shared, common_contacts=common,
+            relation_type=index.relation_between(person_id, other),
+            development_similarity=round(dev_score, 4),
+        ))
+    return result
+
+
+def recommend_for_topic(db: Session, topic: str, person_id: Optional[int] = None,
+                        limit: int = 10) -> List[schemas.SimilarPerson]:
+    """按话题找人；给定 person_id 时，同等相关的人里优先推荐离这个人更近的。"""
+    store = embeddings.store_for(db)
+    matches: Dict[int, Tuple[float, int]] = {}
+    for dev_id, other, score in store.search(embeddings.embed(topic), min_score=TOPIC_MIN_SCORE,
+                                             limit=max(limit * 20, 200)):
+        if other != person_id and score > matches.get(other, (0.0, 0))[0]:
+            matches[other] = (score, dev_id)
+    development = scores_from({other: score for other, (score, _) in matches.items()})
+
+    index = None
+    if person_id is not None:
+        index = index_for(db)
+        with index.lock:
+            circle = index.circle_scores(person_id)
+            graph = index.graph_scores(person_id)
+        ids, total, shared, common, dev_score = rank(circle, graph, development, limit,
+                                                     candidates=development.ids)
+    else:
+        # 不给人时只按话题相关度排
+        order = np.lexsort((development.ids, -development.scores))[:limit]
+        ids, total, dev_score = development.ids[order], development.scores[order], development.scores[order]
+        shared = common = np.zeros(len(ids), dtype=np.int64)
+    top = list(zip(*(column.tolist() for column in (ids, total, shared, common, dev_score))))
+
+    persons = _load_persons(db, [other for other, *_ in top])
+    dev_ids = [matches[other][1] for other, *_ in top]
+    contents = dict(db.execute(
+        select(models.Development.id, models.Development.content).where(models.Development.id.in_(dev_ids))
+    ).all()) if top else {}
+    result = []
+    for other, score, shared, common, dev_score in top:
+        if other not in persons:
+            continue
+        name, avatar = persons[other]
+        result.append(schemas.SimilarPerson(
+            person_id=other, name=name, avatar=avatar, score=round(score, 4),
+            shared_circles=shared, common_contacts=common,
+            relation_type=index.relation_between(person_id, other) if index is not None else None,
+            development_similarity=round(dev_score, 4), matched_development=contents.get(matches[other][1]),
+        ))
+    return result
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 3
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_OPEN_SECONDS = 30.0
+BREAKER_MAX_OPEN_SECONDS = 300.0
+BREAKER_HALF_OPEN_PROBES = 1
+
+LIMITER_RATE = 5.0
+LIMITER_BURST = 10
+LIMITER_MIN_RATE = 0.1
+LIMITER_MAX_RATE = 20.0
+LIMITER_MAX_WAIT = 2.0
+
+
+# 按模型的熔断器：滑动窗口内失败率超过阈值即打开，冷却后放少量探测请求（半开），
+# 探测成功则关闭，失败则以加倍的冷却时间重新打开
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        max_open_seconds: float = BREAKER_MAX_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._open_seconds = open_seconds
+        self._probes = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probes = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._open_seconds = self.base_open_seconds
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open_seconds = min(self._open_seconds * 2, self.max_open_seconds)
+                self._open()
+                return
+            self._outcomes.append(False)
+            if len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def release(self) -> None:
+        # 既不算成功也不算失败的结果（如 429），只归还半开探测名额
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+
+# 令牌桶限流：收到 429 时速率减半并遵守 Retry-After，成功时线性恢复（AIMD）
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float = LIMITER_RATE,
+        burst: int = LIMITER_BURST,
+        min_rate: float = LIMITER_MIN_RATE,
+        max_rate: float = LIMITER_MAX_RATE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, max_wait: float) -> Optional[float]:
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def try_acquire(self) -> bool:
+        return self._reserve(0.0) is not None
+
+    async def acquire(self, max_wait: float = LIMITER_MAX_WAIT) -> bool:
+        wait = self._reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.setdefault(model, CircuitBreaker())
+    return breaker
+
+
+def limiter_for(model: str) -> AdaptiveRateLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _registry_lock:
+            limiter = _limiters.setdefault(model, AdaptiveRateLimiter())
+    return limiter
+
+
+def snapshot() -> Dict[str, Dict[str, object]]:
+    return {
+        model: {
+            "state": breaker.state,
+            "rejected": breaker.rejected,
+            "rate": _limiters[model].rate if model in _limiters else None,
+            "throttled": _limiters[model].throttled if model in _limiters else 0,
+        }
+        for model, breaker in sorted(_breakers.items())
+    }
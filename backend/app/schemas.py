@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 class EventBase(BaseModel):
@@ -19,6 +19,14 @@ class Event(EventBase):
     class Config:
         from_attributes = True
 
+class EventUpdate(BaseModel):
+    date: Optional[str] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+
+class EventPatch(EventUpdate):
+    id: Optional[int] = None
+
 class AnnotationBase(BaseModel):
     time: str
     location: Optional[str] = None
@@ -37,6 +45,14 @@ class Annotation(AnnotationBase):
     class Config:
         from_attributes = True
 
+class AnnotationUpdate(BaseModel):
+    time: Optional[str] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+
+class AnnotationPatch(AnnotationUpdate):
+    id: Optional[int] = None
+
 class DevelopmentBase(BaseModel):
     content: str
     type: str = "resource"
@@ -54,6 +70,25 @@ class Development(DevelopmentBase):
     class Config:
         from_attributes = True
 
+class DevelopmentUpdate(BaseModel):
+    content: Optional[str] = None
+    type: Optional[str] = None
+
+class DevelopmentPatch(DevelopmentUpdate):
+    id: Optional[int] = None
+
+class EventChanges(BaseModel):
+    upsert: List[EventPatch] = Field(default_factory=list)
+    delete: List[int] = Field(default_factory=list)
+
+class AnnotationChanges(BaseModel):
+    upsert: List[AnnotationPatch] = Field(default_factory=list)
+    delete: List[int] = Field(default_factory=list)
+
+class DevelopmentChanges(BaseModel):
+    upsert: List[DevelopmentPatch] = Field(default_factory=list)
+    delete: List[int] = Field(default_factory=list)
+
 class RelationBase(BaseModel):
     to_person_id: int
     relation_type: str
@@ -83,6 +118,18 @@ class PersonUpdate(BaseModel):
     avatar: Optional[str] = None
     profile: Optional[Dict[str, Any]] = None
 
+class PersonPatch(BaseModel):
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+    profile: Optional[Dict[str, Any]] = None
+    events: Optional[EventChanges] = None
+    annotations: Optional[AnnotationChanges] = None
+    developments: Optional[DevelopmentChanges] = None
+
+class MergePersonsRequest(BaseModel):
+    target_id: int
+    source_ids: List[int] = Field(..., min_length=1)
+
 class Person(PersonBase):
     id: int
     created_at: datetime
@@ -157,6 +204,17 @@ class ExtractResponse(BaseModel):
     developments: List[DevelopmentBase] = Field(default_factory=list)
     relations: List[ExtractedRelation] = Field(default_factory=list)
 
+class ExtractBatchItem(BaseModel):
+    index: int
+    result: ExtractResponse
+
+class ExtractBatchResponse(BaseModel):
+    results: List[ExtractBatchItem] = Field(default_factory=list)
+
+class DetailComparison(BaseModel):
+    more_detailed: Literal["desc1", "desc2"]
+    reason: str = ""
+
 class ConfirmRequest(BaseModel):
     original_text: str
     is_new_person: bool
@@ -181,6 +239,17 @@ class GraphEdge(BaseModel):
     source: int
     target: int
     relation_type: str
+    weight: float = 0.0
+
+class TieStrength(BaseModel):
+    source: int
+    target: int
+    source_name: str
+    target_name: str
+    relation_type: str
+    weight: float
+    interactions: float
+    last_interaction: Optional[str] = None
 
 class GraphResponse(BaseModel):
     nodes: List[GraphNode]
@@ -193,12 +262,76 @@ class GraphLayoutResponse(BaseModel):
     success: bool
     message: str
 
+class AgendaItem(BaseModel):
+    kind: Literal["annotation", "birthday"]
+    date: str
+    end_date: Optional[str] = None
+    person_id: int
+    person_name: str
+    description: str
+    location: Optional[str] = None
+    annotation_id: Optional[int] = None
+
+class AgendaResponse(BaseModel):
+    start: str
+    end: str
+    items: List[AgendaItem]
+
+class TimelineItem(BaseModel):
+    kind: Literal["event", "annotation"]
+    id: int
+    date: str
+    time: Optional[str] = None
+    location: Optional[str] = None
+    description: str
+    source: str
+
+class TimelinePage(BaseModel):
+    items: List[TimelineItem]
+    next_cursor: Optional[str] = None
+
+class TimelineMonth(BaseModel):
+    month: str
+    events: int = 0
+    annotations: int = 0
+
+class TimelineSummary(BaseModel):
+    person_id: int
+    months: List[TimelineMonth]
+
+class SimilarPerson(BaseModel):
+    person_id: int
+    name: str
+    avatar: Optional[str] = None
+    score: float
+    shared_circles: int = 0
+    common_contacts: int = 0
+    relation_type: Optional[str] = None
+    development_similarity: float = 0.0
+    matched_development: Optional[str] = None
+
 class ConflictItem(BaseModel):
     field: str
     existing: Any
     new: Any
     action: Optional[str] = None
 
+class CircleOverlap(BaseModel):
+    circle_id: int
+    count: int
+
+class TopicCount(BaseModel):
+    topic: str
+    count: int
+
+class CircleStats(BaseModel):
+    circle_id: int
+    name: str
+    color: str
+    member_count: int
+    overlaps: List[CircleOverlap] = []
+    top_topics: List[TopicCount] = []
+
 class SuggestedCircle(BaseModel):
     name: str
     color: str
@@ -216,3 +349,15 @@ class CompareResponse(BaseModel):
     developments: List[DevelopmentBase]
     relations: List[ExtractedRelation]
     conflicts: List[ConflictItem]
+
+class MatchedPerson(BaseModel):
+    id: int
+    name: str
+    job: Optional[str] = None
+    birthday: Optional[str] = None
+
+class ExtractResolveResponse(BaseModel):
+    extraction: ExtractResponse
+    exists: bool
+    person: Optional[MatchedPerson] = None
+    comparison: Optional[CompareResponse] = None
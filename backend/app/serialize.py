@@ -0,0 +1,180 @@
+import json
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models, strength
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，缺失时退回标准库 json
+    orjson = None
+
+# 读接口的快速序列化路径：直接按列查询拼 dict，不经过 ORM 实体和 Pydantic 校验。
+# 输出字段顺序与 schemas 中的响应模型保持一致，前端看到的 JSON 不变
+
+EVENT_COLUMNS = ("date", "location", "description", "id", "person_id", "source", "created_at")
+ANNOTATION_COLUMNS = ("time", "location", "description", "id", "person_id", "source", "confirmed_by_user",
+                      "created_at")
+DEVELOPMENT_COLUMNS = ("content", "type", "id", "person_id", "source", "confirmed_by_user", "created_at")
+PERSON_COLUMNS = ("name", "avatar", "profile_json", "id", "created_at", "updated_at")
+CIRCLE_COLUMNS = ("name", "color", "id", "created_at")
+
+CHILD_COLUMNS = {
+    "events": (models.Event, EVENT_COLUMNS),
+    "annotations": (models.Annotation, ANNOTATION_COLUMNS),
+    "developments": (models.Development, DEVELOPMENT_COLUMNS),
+}
+
+
+def _isoformat(value: datetime) -> str:
+    # 与 Pydantic 一致：UTC 时间用 Z 结尾
+    text = value.isoformat()
+    if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+        text = text[:-6] + "Z"
+    return text
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, datetime):
+        return _isoformat(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(raw: Optional[str]) -> Any:
+    if not raw:
+        return {}
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _columns(model, names: Iterable[str]):
+    return [getattr(model, name) for name in names]
+
+
+def _rows(db: Session, model, names, *criteria) -> List[Dict[str, Any]]:
+    stmt = select(*_columns(model, names)).where(*criteria).order_by(model.id)
+    return [dict(zip(names, row)) for row in db.execute(stmt)]
+
+
+def _person_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": row["name"],
+        "avatar": row["avatar"],
+        "profile": loads(row["profile_json"]),
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "events": [],
+        "annotations": [],
+        "developments": [],
+    }
+
+
+def persons_payload(db: Session, *criteria) -> List[Dict[str, Any]]:
+    """按条件批量取人物及其子记录，固定 4 条查询，与人数无关。"""
+    persons = [_person_dict(row) for row in _rows(db, models.Person, PERSON_COLUMNS, *criteria)]
+    if not persons:
+        return persons
+    by_id = {p["id"]: p for p in persons}
+    # 有筛选条件时用子查询限定子记录范围，避免把大量 id 塞进 IN 列表
+    scope = select(models.Person.id).where(*criteria) if criteria else None
+    for kind, (model, names) in CHILD_COLUMNS.items():
+        child_criteria = (model.person_id.in_(scope),) if scope is not None else ()
+        for child in _rows(db, model, names, *child_criteria):
+            owner = by_id.get(child["person_id"])
+            if owner is not None:
+                owner[kind].append(child)
+    return persons
+
+
+def person_payload(db: Session, person_id: int) -> Optional[Dict[str, Any]]:
+    persons = persons_payload(db, models.Person.id == person_id)
+    return persons[0] if persons else None
+
+
+def person_dict(person: models.Person) -> Dict[str, Any]:
+    """已加载的 ORM 实体（如写接口刚提交的人物）转成响应 dict。"""
+    result = {
+        "name": person.name,
+        "avatar": person.avatar,
+        "profile": person.profile,
+        "id": person.id,
+        "created_at": person.created_at,
+        "updated_at": person.updated_at,
+    }
+    for kind, (_, names) in CHILD_COLUMNS.items():
+        result[kind] = [{name: getattr(child, name) for name in names} for child in getattr(person, kind)]
+    return result
+
+
+def circles_payload(db: Session) -> List[Dict[str, Any]]:
+    return _rows(db, models.Circle, CIRCLE_COLUMNS)
+
+
+def circles_with_members_payload(db: Session, *criteria) -> List[Dict[str, Any]]:
+    circles = _rows(db, models.Circle, CIRCLE_COLUMNS, *criteria)
+    if not circles:
+        return circles
+    circle_ids = select(models.Circle.id).where(*criteria) if criteria else None
+    membership_stmt = select(models.PersonCircle.circle_id, models.PersonCircle.person_id) \
+        .order_by(models.PersonCircle.id)
+    person_scope = select(models.PersonCircle.person_id)
+    if circle_ids is not None:
+        membership_stmt = membership_stmt.where(models.PersonCircle.circle_id.in_(circle_ids))
+        person_scope = person_scope.where(models.PersonCircle.circle_id.in_(circle_ids))
+
+    persons = {p["id"]: p for p in persons_payload(db, models.Person.id.in_(person_scope))}
+    members: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for circle_id, person_id in db.execute(membership_stmt):
+        person = persons.get(person_id)
+        if person is not None:
+            members[circle_id].append(person)
+    for circle in circles:
+        circle["members"] = members.get(circle["id"], [])
+    return circles
+
+
+def graph_payload(db: Session) -> Dict[str, Any]:
+    nodes = [
+        {"id": pid, "name": name, "avatar": avatar}
+        for pid, name, avatar in db.execute(
+            select(models.Person.id, models.Person.name, models.Person.avatar).order_by(models.Person.id)
+        )
+    ]
+    ties = strength.index_for(db)
+    edges = []
+    seen_pairs = set()
+    relations = select(
+        models.Relation.from_person_id, models.Relation.to_person_id, models.Relation.relation_type
+    ).order_by(models.Relation.id)
+    for source, target, relation_type in db.execute(relations):
+        pair = (source, target) if source <= target else (target, source)
+        if pair not in seen_pairs:
+            seen_pairs.add(pair)
+            tie = ties.get(source, target)
+            edges.append({"source": source, "target": target, "relation_type": relation_type,
+                          "weight": round(tie.weight, 4) if tie is not None else 0.0})
+    return {"nodes": nodes, "edges": edges}
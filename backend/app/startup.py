@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import agenda, embeddings, fastpath, http_cache, llm, migrations, models, recommend, strength
+from .database import SessionLocal, engine, tenant_engines
+from .prompts import get_timezone
+
+logger = logging.getLogger(__name__)
+
+# 启动只做必需的事：检查数据库结构版本（已是最新时只读一行）。各类索引和缓存本来就是首次使用时才建，
+# 这里在后台按顺序预热默认租户，/readyz 在预热结束前返回 503，进程管理器据此决定何时切流量。
+# 预热失败只记日志，不影响就绪——对应的索引仍会在第一次请求时构建
+WARMUP = os.getenv("STARTUP_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def _warm_name_index(db: Session) -> None:
+    # 走 persons.name 索引扫一遍，把索引页读进数据库缓存，check-name / resolve 的首次查询不落盘
+    db.execute(select(func.count()).select_from(models.Person).where(models.Person.name >= "")).scalar()
+
+
+WARMUP_TASKS: List[Tuple[str, Callable[[Session], Any]]] = [
+    ("name_index", _warm_name_index),
+    ("graph_adjacency", recommend.index_for),
+    ("tie_strength", strength.index_for),
+    ("embeddings", embeddings.store_for),
+    ("fastpath_patterns", lambda db: fastpath.patterns()),
+    ("agenda_digest", agenda.daily_digest),
+]
+
+
+class Readiness:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.schema_version: Optional[int] = None
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+
+    def reset(self, task_names: List[str]) -> None:
+        with self.lock:
+            self.started = time.monotonic()
+            self.schema_version = None
+            self.tasks = {name: {"state": "pending"} for name in task_names}
+
+    def update(self, name: str, **fields) -> None:
+        with self.lock:
+            self.tasks[name].update(fields)
+
+    def ready(self) -> bool:
+        with self.lock:
+            return self.schema_version is not None and all(
+                t["state"] in ("done", "failed") for t in self.tasks.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        ready = self.ready()
+        with self.lock:
+            return {
+                "ready": ready,
+                "uptime_seconds": round(time.monotonic() - self.started, 3),
+                "schema_version": self.schema_version,
+                "warmup": {name: dict(task) for name, task in self.tasks.items()},
+            }
+
+
+state = Readiness()
+
+
+def warm() -> None:
+    db = SessionLocal()
+    try:
+        for name, task in WARMUP_TASKS:
+            state.update(name, state="running")
+            start = time.perf_counter()
+            try:
+                task(db)
+                db.rollback()
+            except Exception as e:
+                db.rollback()
+                logger.warning("预热 %s 失败: %s", name, e)
+                state.update(name, state="failed", error=str(e))
+                continue
+            state.update(name, state="done", seconds=round(time.perf_counter() - start, 3))
+    finally:
+        db.close()
+    logger.info("预热完成，用时 %.2fs", time.monotonic() - state.started)
+
+
+def _refresh_digest() -> None:
+    db = SessionLocal()
+    try:
+        agenda.daily_digest(db)
+    finally:
+        db.close()
+
+
+async def refresh_digest_daily() -> None:
+    # 每天（APP_TIMEZONE）零点过后预先算好默认租户当天的议程摘要，当天第一个请求不用现算
+    while True:
+        now = datetime.now(get_timezone())
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), now.tzinfo)
+        await asyncio.sleep((midnight - now).total_seconds() + 1)
+        try:
+            await run_in_threadpool(_refresh_digest)
+        except Exception as e:
+            logger.warning("预计算议程摘要失败: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    state.reset([name for name, _ in WARMUP_TASKS] if WARMUP else [])
+    http_cache.check_workers()
+    version = await run_in_threadpool(migrations.ensure_schema, engine)
+    with state.lock:
+        state.schema_version = version
+    logger.info("数据库结构版本 %s，启动检查用时 %.3fs", version, time.monotonic() - state.started)
+
+    warmup = asyncio.ensure_future(run_in_threadpool(warm)) if WARMUP else None
+    digest = asyncio.ensure_future(refresh_digest_daily()) if WARMUP else None
+    try:
+        yield
+    finally:
+        # 预热在线程里跑，无法中途打断；关闭时不等它
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+        if digest is not None:
+            digest.cancel()
+        await llm.close_client()
+        tenant_engines.dispose_all()
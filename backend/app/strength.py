@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from . import agenda, dates, hooks, metrics, models, schemas
+from .database import on_tenant_evicted, tenant_of
+
+# 关系强度 = 关系类型分 + 互动分。互动指两人“同时出现”：一方的事件描述里提到另一方，
+# 或两人在同一天都有事件；每次互动按距今天数指数衰减后累加，再用 1 - e^(-x/SATURATION) 压到 [0, 1)
+HALF_LIFE_DAYS = float(os.getenv("TIE_HALF_LIFE_DAYS", "180"))
+SATURATION = 3.0
+UNDATED_DECAY = 0.5  # 日期写成“上周”等无法解析时按半衰计
+WEIGHT_RELATION_TYPE = 0.4
+WEIGHT_INTERACTION = 0.6
+DEFAULT_TYPE_WEIGHT = 0.5
+
+# 关系类型按关键词匹配，先匹配先得
+RELATION_TYPE_WEIGHTS: Tuple[Tuple[Tuple[str, ...], float], ...] = (
+    (("家人", "父", "母", "夫", "妻", "兄", "弟", "姐", "妹", "亲戚", "伴侣"), 1.0),
+    (("朋友", "好友", "闺蜜", "室友"), 0.8),
+    (("同学", "校友", "导师", "老师"), 0.65),
+    (("同事", "上级", "下属", "领导", "合伙"), 0.6),
+    (("合作", "客户", "供应商", "投资"), 0.45),
+)
+
+Pair = Tuple[int, int]
+
+
+class Tie:
+    __slots__ = ("relation_type", "weight", "interactions", "last_interaction")
+
+    def __init__(self, relation_type: str, weight: float, interactions: float, last_interaction: Optional[str]):
+        self.relation_type = relation_type
+        self.weight = weight
+        self.interactions = interactions
+        self.last_interaction = last_interaction
+
+
+def type_weight(relation_type: Optional[str]) -> float:
+    if relation_type:
+        for keywords, weight in RELATION_TYPE_WEIGHTS:
+            if any(k in relation_type for k in keywords):
+                return weight
+    return DEFAULT_TYPE_WEIGHT
+
+
+def _pair(a: int, b: int) -> Pair:
+    return (a, b) if a <= b else (b, a)
+
+
+def compute(pairs: Dict[Pair, str], events: Iterable[Tuple[int, str, str]], names: Dict[int, str],
+            today: date) -> Dict[Pair, Tie]:
+    """pairs: 人物对 -> 关系类型；events: (person_id, date, description)。"""
+    order = list(pairs)
+    if not order:
+        return {}
+    neighbors: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for i, (a, b) in enumerate(order):
+        neighbors[a].append((b, i))
+        neighbors[b].append((a, i))
+
+    # 同一对人同一天只算一次互动
+    evidence: Set[Tuple[int, str]] = set()
+    present: Dict[str, Set[int]] = defaultdict(set)
+    for person_id, day, description in events:
+        mine = neighbors.get(person_id)
+        if not mine:
+            continue
+        day = day or ""
+        present[day].add(person_id)
+        for other, i in mine:
+            name = names.get(other)
+            if name and description and name in description:
+                evidence.add((i, day))
+    for day, persons in present.items():
+        if not day or len(persons) < 2:
+            continue
+        for person_id in persons:
+            for other, i in neighbors[person_id]:
+                if other in persons:
+                    evidence.add((i, day))
+
+    # 衰减与汇总向量化
+    ordinals: Dict[str, int] = {}
+    for _, day in evidence:
+        if day not in ordinals:
+            start, _ = dates.parse_time_range(day)
+            ordinals[day] = date.fromisoformat(start).toordinal() if start else -1
+    n = len(order)
+    interactions = np.zeros(n)
+    last = np.full(n, -1, dtype=np.int64)
+    if evidence:
+        index = np.fromiter((i for i, _ in evidence), dtype=np.int64, count=len(evidence))
+        day_ordinal = np.fromiter((ordinals[d] for _, d in evidence), dtype=np.int64, count=len(evidence))
+        age = np.clip(today.toordinal() - day_ordinal, 0, None)
+        decay = np.where(day_ordinal < 0, UNDATED_DECAY, np.power(0.5, age / HALF_LIFE_DAYS))
+        interactions = np.bincount(index, weights=decay, minlength=n)
+        # 未来的约定不算“最近一次互动”
+        past = np.where(day_ordinal <= today.toordinal(), day_ordinal, -1)
+        np.maximum.at(last, index, past)
+    type_weights = np.fromiter((type_weight(pairs[p]) for p in order), dtype=float, count=n)
+    weights = WEIGHT_RELATION_TYPE * type_weights + WEIGHT_INTERACTION * (1.0 - np.exp(-interactions / SATURATION))
+
+    return {
+        p: Tie(pairs[p], float(weights[i]), float(interactions[i]),
+               date.fromordinal(int(last[i])).isoformat() if last[i] > 0 else None)
+        for i, p in enumerate(order)
+    }
+
+
+def _load(db: Session, persons: Optional[Set[int]] = None):
+    relations = select(models.Relation.from_person_id, models.Relation.to_person_id,
+                       models.Relation.relation_type).order_by(models.Relation.id)
+    if persons is not None:
+        relations = relations.where(or_(models.Relation.from_person_id.in_(persons),
+                                        models.Relation.to_person_id.in_(persons)))
+    pairs: Dict[Pair, str] = {}
+    for a, b, relation_type in db.execute(relations):
+        if a != b:
+            # 与 /graph 一致：同一对人取最早的一条关系的类型
+            pairs.setdefault(_pair(a, b), relation_type)
+
+    events = select(models.Event.person_id, models.Event.date, models.Event.description)
+    names = select(models.Person.id, models.Person.name)
+    if persons is not None:
+        involved = {p for pair in pairs for p in pair}
+        events = events.where(models.Event.person_id.in_(involved))
+        names = names.where(models.Person.id.in_(involved))
+    return pairs, db.execute(events).all(), dict(db.execute(names).all())
+
+
+class TieIndex:
+    """所有有关系的人物对的强度；按天全量重算（衰减随日期变化），写入后只重算涉及的人。"""
+
+    def __init__(self, day: date, ties: Dict[Pair, Tie]):
+        self.day = day
+        self.ties = ties
+        self.dirty: Set[int] = set()
+        self.lock = threading.RLock()
+
+    def refresh(self, db: Session) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, set()
+            start = time.perf_counter()
+            pairs, events, names = _load(db, dirty)
+            for pair in [p for p in self.ties if p[0] in dirty or p[1] in dirty]:
+                del self.ties[pair]
+            self.ties.update(compute(pairs, events, names, self.day))
+            _observe("incremental", start)
+
+    def get(self, a: int, b: int) -> Optional[Tie]:
+        return self.ties.get(_pair(a, b))
+
+
+def _observe(mode: str, start: float) -> None:
+    metrics.TIE_STRENGTH_REFRESHES.inc(mode=mode)
+    metrics.TIE_STRENGTH_REFRESH_SECONDS.observe(time.perf_counter() - start, mode=mode)
+
+
+_indexes: Dict[str, TieIndex] = {}
+_generations: Dict[str, int] = {}
+_registry_lock = threading.Lock()
+
+
+@on_tenant_evicted
+def _forget_tenant(tenant: str) -> None:
+    with _registry_lock:
+        _indexes.pop(tenant, None)
+        _generations.pop(tenant, None)
+
+
+def index_for(db: Session, today: Optional[date] = None) -> TieIndex:
+    tenant = tenant_of(db)
+    today = today or agenda.today()
+    with _registry_lock:
+        index = _indexes.get(tenant)
+        generation = _generations.get(tenant, 0)
+    if index is not None and index.day == today:
+        index.refresh(db)
+        return index
+
+    start = time.perf_counter()
+    index = TieIndex(today, compute(*_load(db), today))
+    _observe("full", start)
+    with _registry_lock:
+        if _generations.get(tenant, 0) == generation:
+            current = _indexes.get(tenant)
+            if current is None or current.day != today:
+                _indexes[tenant] = index
+            index = _indexes[tenant]
+    return index
+
+
+@hooks.on_flush
+def _capture_ties(session: Session, changes: hooks.ChangeSet) -> None:
+    if not changes.touches("events", "relations", "persons"):
+        return
+    touched = changes.payload.setdefault("ties", [])
+    if changes.statements:
+        touched.append(None)
+        return
+    for obj in changes.new + changes.dirty + changes.deleted:
+        if isinstance(obj, models.Event):
+            touched.append(obj.person_id)
+        elif isinstance(obj, models.Relation):
+            touched.extend((obj.from_person_id, obj.to_person_id))
+        elif isinstance(obj, models.Person):
+            touched.append(obj.id)
+
+
+@hooks.on_commit
+def _apply_ties(session: Session, changes: hooks.ChangeSet) -> None:
+    touched = changes.payload.get("ties")
+    if not touched:
+        return
+    tenant = tenant_of(session)
+    with _registry_lock:
+        _generations[tenant] = _generations.get(tenant, 0) + 1
+        index = _indexes.get(tenant)
+        if index is None:
+            return
+        if None in touched:
+            _indexes.pop(tenant, None)
+            return
+    with index.lock:
+        index.dirty.update(touched)
+
+
+def strongest(db: Session, limit: int = 20, person_id: Optional[int] = None,
+              sort: str = "weight") -> List[schemas.TieStrength]:
+    index = index_for(db)
+    with index.lock:
+        items = [(pair, tie) for pair, tie in index.ties.items()
+                 if person_id is None or person_id in pair]
+    if sort == "recent":
+        key = lambda item: (item[1].last_interaction or "", item[1].weight)
+    elif sort == "interactions":
+        key = lambda item: (item[1].interactions, item[1].weight)
+    else:
+        key = lambda item: (item[1].weight, item[1].interactions)
+    items.sort(key=key, reverse=True)
+    top = items[:limit]
+
+    ids = {p for pair, _ in top for p in pair}
+    names = dict(db.execute(select(models.Person.id, models.Person.name)
+                            .where(models.Person.id.in_(ids))).all()) if ids else {}
+    result = []
+    for (a, b), tie in top:
+        # 指定了人物时把他放在 source 一侧
+        if person_id is not None and b == person_id:
+            a, b = b, a
+        if a not in names or b not in names:
+            continue
+        result.append(schemas.TieStrength(
+            source=a, target=b, source_name=names[a], target_name=names[b],
+            relation_type=tie.relation_type, weight=round(tie.weight, 4),
+            interactions=round(tie.interactions, 4), last_interaction=tie.last_interaction,
+        ))
+    return result
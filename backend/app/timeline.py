@@ -0,0 +1,101 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, false, func, or_, true
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# 同一天内事件排在标注之前（倒序时相反），保证 (date, kind, id) 是全序
+KIND_RANK = {"event": 0, "annotation": 1}
+
+Cursor = Tuple[str, int, int]
+
+
+def encode_cursor(key: Cursor) -> str:
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    date, rank, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    return str(date), int(rank), int(item_id)
+
+
+def _after(date_col, id_col, rank: int, cursor: Optional[Cursor], descending: bool):
+    if cursor is None:
+        return true()
+    c_date, c_rank, c_id = cursor
+    if rank == c_rank:
+        tie = id_col < c_id if descending else id_col > c_id
+    elif (rank < c_rank) == descending:
+        tie = true()
+    else:
+        tie = false()
+    before = date_col < c_date if descending else date_col > c_date
+    return or_(before, and_(date_col == c_date, tie))
+
+
+def _ordered(query, date_col, id_col, descending: bool):
+    if descending:
+        return query.order_by(date_col.desc(), id_col.desc())
+    return query.order_by(date_col, id_col)
+
+
+def get_page(db: Session, person_id: int, cursor: Optional[Cursor], limit: int,
+             descending: bool = True) -> schemas.TimelinePage:
+    event_date = models.Event.date
+    events = _ordered(
+        db.query(models.Event).filter(
+            models.Event.person_id == person_id,
+            _after(event_date, models.Event.id, KIND_RANK["event"], cursor, descending),
+        ),
+        event_date, models.Event.id, descending,
+    ).limit(limit + 1).all()
+
+    ann_date = models.ANNOTATION_SORT_DATE
+    annotations = _ordered(
+        db.query(models.Annotation).filter(
+            models.Annotation.person_id == person_id,
+            _after(ann_date, models.Annotation.id, KIND_RANK["annotation"], cursor, descending),
+        ),
+        ann_date, models.Annotation.id, descending,
+    ).limit(limit + 1).all()
+
+    keyed: List[Tuple[Cursor, schemas.TimelineItem]] = []
+    for e in events:
+        keyed.append(((e.date, KIND_RANK["event"], e.id), schemas.TimelineItem(
+            kind="event", id=e.id, date=e.date, location=e.location,
+            description=e.description, source=e.source,
+        )))
+    for a in annotations:
+        keyed.append(((a.starts_on or "", KIND_RANK["annotation"], a.id), schemas.TimelineItem(
+            kind="annotation", id=a.id, date=a.starts_on or a.time, time=a.time, location=a.location,
+            description=a.description, source=a.source,
+        )))
+    keyed.sort(key=lambda pair: pair[0], reverse=descending)
+
+    page = keyed[:limit]
+    next_cursor = encode_cursor(page[-1][0]) if len(keyed) > limit else None
+    return schemas.TimelinePage(items=[item for _, item in page], next_cursor=next_cursor)
+
+
+def get_summary(db: Session, person_id: int) -> schemas.TimelineSummary:
+    event_month = func.substr(models.Event.date, 1, 7)
+    ann_month = func.substr(models.Annotation.starts_on, 1, 7)
+    months = {}
+    for month, count in (
+        db.query(event_month, func.count(models.Event.id))
+        .filter(models.Event.person_id == person_id)
+        .group_by(event_month)
+    ):
+        months.setdefault(month, schemas.TimelineMonth(month=month)).events = count
+    for month, count in (
+        db.query(ann_month, func.count(models.Annotation.id))
+        .filter(models.Annotation.person_id == person_id, models.Annotation.starts_on.isnot(None))
+        .group_by(ann_month)
+    ):
+        months.setdefault(month, schemas.TimelineMonth(month=month)).annotations = count
+    return schemas.TimelineSummary(person_id=person_id, months=[months[m] for m in sorted(months)])
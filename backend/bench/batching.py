@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict
+
+
+async def _run(batcher, notes, concurrency: int) -> Dict[str, float]:
+    from app import llm, metrics
+    from . import mock_llm
+
+    llm.result_cache.clear()
+    before_prompt = sum(v for (_, kind), v in metrics.LLM_TOKENS.items() if kind == "prompt")
+    before_requests = mock_llm.REQUESTS
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(text: str) -> None:
+        nonlocal failures
+        async with semaphore:
+            try:
+                await batcher.extract("bench-key", text)
+            except llm.LLMError:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in notes))
+    elapsed = time.perf_counter() - start
+    prompt = sum(v for (_, kind), v in metrics.LLM_TOKENS.items() if kind == "prompt") - before_prompt
+    requests = mock_llm.REQUESTS - before_requests
+    done = len(notes) - failures
+    return {
+        "notes/s": done / elapsed,
+        "prompt tokens/note": prompt / max(done, 1),
+        "upstream requests": requests,
+        "failed": failures,
+        "seconds": elapsed,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="短文本抽取：逐条请求与微批打包的吞吐对比（本地 mock 上游）")
+    parser.add_argument("--notes", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=64, help="同时在途的录入请求数")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mock 上游每次请求的固定耗时")
+    parser.add_argument("--ms-per-token", type=float, default=0.5, help="mock 上游每个输出 token 的生成耗时")
+    args = parser.parse_args(argv)
+    # 逐条模式下限流触发的模型降级会刷大量告警，这里只看汇总
+    logging.disable(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="personasphere-batching-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    try:
+        from app import batching, resilience
+        from . import mock_llm
+
+        mock_llm.install()
+        mock_llm.LATENCY_SECONDS = args.latency_ms / 1000
+        mock_llm.SECONDS_PER_OUTPUT_TOKEN = args.ms_per_token / 1000
+        notes = [f"第{i}条：周{i % 7 + 1}和客户{i}在公司聊了合作，对方做跨境支付" for i in range(args.notes)]
+
+        rows = {}
+        for label, batcher in (("individual", batching.ExtractBatcher(max_size=1)),
+                               ("batched", batching.ExtractBatcher())):
+            # 每轮都换回默认的按模型限流，比较的是真实限流条件下的吞吐
+            resilience._limiters.clear()
+            rows[label] = asyncio.run(_run(batcher, notes, args.concurrency))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.notes} notes, concurrency {args.concurrency}, mock latency {args.latency_ms:.0f} ms "
+          f"+ {args.ms_per_token} ms/token, default rate limits")
+    columns = list(rows["individual"])
+    print(f"  {'':<12}" + "".join(f"{c:>20}" for c in columns))
+    for label, row in rows.items():
+        print(f"  {label:<12}" + "".join(f"{row[c]:>20.1f}" for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import re
+import weakref
+
+import httpx
+
+from app import llm, prompts, resilience
+
+# 模拟上游耗时：固定开销 + 按输出 token 计的生成时间，默认不等待
+LATENCY_SECONDS = 0.0
+SECONDS_PER_OUTPUT_TOKEN = 0.0
+REQUESTS = 0
+
+_INDEX_RE = re.compile(r"^\[(\d+)\] ", re.M)
+
+EXTRACT_ANSWER = {
+    "profile": {
+        "name": "张三",
+        "job": "投资人",
+        "birthday": "05-20",
+        "notes": ["对海鲜过敏"],
+        "events": [{"date": "2026-02-20", "location": "上海", "description": "吃晚饭"}],
+    },
+    "annotations": [{"time": "2026-03", "location": None, "description": "约饭"}],
+    "developments": [{"content": "金融科技", "type": "resource"}],
+    "relations": [],
+}
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+def _answer(body: dict) -> dict:
+    system = _text(body["messages"][0]["content"])
+    user = _text(body["messages"][-1]["content"])
+    if "事件描述比较" in system:
+        content = {"more_detailed": "desc2", "reason": "更具体"}
+    elif "【批量模式】" in system:
+        content = {"results": [{"index": int(i), "result": EXTRACT_ANSWER} for i in _INDEX_RE.findall(user)]}
+    else:
+        content = EXTRACT_ANSWER
+    text = json.dumps(content, ensure_ascii=False)
+    prompt_tokens = sum(prompts.estimate_tokens(_text(m["content"])) for m in body["messages"])
+    return {
+        "choices": [{"message": {"content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": prompts.estimate_tokens(text)},
+    }
+
+
+def _sse(answer: dict, chunk_size: int = 16) -> bytes:
+    # 按 OpenAI 兼容的流式格式把内容切成小段发送，最后一块带 usage
+    content = answer["choices"][0]["message"]["content"]
+    lines = []
+    for start in range(0, len(content), chunk_size):
+        delta = {"choices": [{"index": 0, "delta": {"content": content[start:start + chunk_size]}}]}
+        lines.append("data: " + json.dumps(delta, ensure_ascii=False))
+    lines.append("data: " + json.dumps({"choices": [], "usage": answer["usage"]}))
+    lines.append("data: [DONE]")
+    return ("\n\n".join(lines) + "\n\n").encode("utf-8")
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global REQUESTS
+    REQUESTS += 1
+    body = json.loads(request.content)
+    answer = _answer(body)
+    delay = LATENCY_SECONDS + SECONDS_PER_OUTPUT_TOKEN * answer["usage"]["completion_tokens"]
+    if delay:
+        await asyncio.sleep(delay)
+    if body.get("stream"):
+        return httpx.Response(200, content=_sse(answer), headers={"Content-Type": "text/event-stream"})
+    return httpx.Response(200, json=answer)
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _mock_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def install() -> None:
+    # 在传输层替换上游，解析、熔断、缓存等逻辑仍然照常执行；限流放开以免干扰计时
+    llm.get_client = _mock_client
+    for model in llm.FALLBACK_MODELS:
+        resilience._limiters[model] = resilience.AdaptiveRateLimiter(rate=1e9, burst=10 ** 9, max_rate=1e9)
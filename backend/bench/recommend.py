@@ -0,0 +1,78 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+
+def _build(persons: int, circles: int, circles_per_person: int, relations: int, seed: int):
+    from app import recommend
+
+    rnd = random.Random(seed)
+    index = recommend.NetworkIndex()
+    for person_id in range(1, persons + 1):
+        for circle_id in rnd.sample(range(1, circles + 1), min(circles_per_person, circles)):
+            index.add_membership(person_id, circle_id)
+    for _ in range(relations):
+        a, b = rnd.sample(range(1, persons + 1), 2)
+        index.add_relation(a, b, "friend")
+    return index
+
+
+def _measure(index, persons: int, queries: int, limit: int, seed: int) -> Dict[str, float]:
+    import numpy as np
+
+    from app import recommend
+
+    rnd = random.Random(seed)
+    samples: List[float] = []
+    for _ in range(queries):
+        person_id = rnd.randint(1, persons)
+        # 发展方向一路由向量检索给出，这里按 similar_to_person 的候选数随机造
+        development = recommend.scores_from({rnd.randint(1, persons): rnd.random() for _ in range(max(limit * 5, 50))})
+        start = time.perf_counter()
+        with index.lock:
+            circle = index.circle_scores(person_id)
+            graph = index.graph_scores(person_id)
+        recommend.rank(circle, graph, development, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50 ms": statistics.median(samples),
+        "p99 ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "candidates": float(np.mean([len(index.circle_scores(p).ids) for p in range(1, 21)])),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="相似人物推荐：圈子/关系两路稀疏打分加合成排序的内存内耗时（不含数据库读）")
+    parser.add_argument("--persons", type=int, default=100_000)
+    parser.add_argument("--circles", type=int, nargs="+", default=[500, 20],
+                        help="圈子总数；越少每个圈子越大，共同圈子候选越多")
+    parser.add_argument("--circles-per-person", type=int, default=2)
+    parser.add_argument("--relations", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rows = {}
+    for circles in args.circles:
+        start = time.perf_counter()
+        index = _build(args.persons, circles, args.circles_per_person, args.relations, seed=circles)
+        built = time.perf_counter() - start
+        row = _measure(index, args.persons, args.queries, args.limit, seed=circles)
+        row["build s"] = built
+        rows[f"{circles} circles"] = row
+
+    print(f"{args.persons} persons, {args.relations} relations, {args.circles_per_person} circles/person, "
+          f"top {args.limit} of {args.queries} queries")
+    columns = list(next(iter(rows.values())))
+    print(f"  {'':<14}" + "".join(f"{c:>14}" for c in columns))
+    for label, row in rows.items():
+        print(f"  {label:<14}" + "".join(f"{row[c]:>14.1f}" for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+IMPORT_SCENARIO = "import app.main"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def build_scenarios(client) -> Dict[str, Callable[[int], Any]]:
+    from app import http_cache, strength
+    from . import mock_llm
+
+    target_id = 1
+    target = {}
+
+    def compare(i: int):
+        if not target:
+            target.update(client.get(f"/persons/{target_id}").json())
+        person = target
+        event = person["events"][0] if person["events"] else {"date": "2026-02-20", "description": "吃饭"}
+        return client.post("/extract/compare", json={
+            "person_id": target_id,
+            "extracted_data": {
+                "profile": {
+                    "name": person["name"],
+                    "job": "基金合伙人",
+                    "notes": [f"备注{i}"],
+                    "events": [{"date": event["date"], "description": f"{event['description']}，聊了{i}个项目"}],
+                },
+                "annotations": [{"time": "2026-04", "description": f"回访{i}"}],
+                "developments": [{"content": "金融科技", "type": "resource"}],
+                "relations": [],
+            },
+        })
+
+    def confirm_new(i: int):
+        return client.post("/confirm", json={
+            "original_text": f"和基准{i}吃晚饭",
+            "is_new_person": True,
+            "profile": {
+                "name": f"基准人物{i}",
+                "job": "工程师",
+                "notes": [],
+                "events": [{"date": "2026-02-20", "description": "吃晚饭"}],
+            },
+            "annotations": [{"time": "2026-03-01", "description": "约饭"}],
+            "developments": [{"content": "大模型", "type": "resource"}],
+            "relations": [{"name": f"基准联系人{i % 5}", "relation_type": "朋友"}],
+        })
+
+    def confirm_update(i: int):
+        return client.post("/confirm", json={
+            "original_text": f"更新{i}",
+            "is_new_person": False,
+            "person_id": target_id + 1,
+            "profile": {
+                "name": "",
+                "notes": [f"更新备注{i}"],
+                "events": [{"date": "2026-02-19", "description": f"喝咖啡{i}"}],
+            },
+            "annotations": [],
+            "developments": [],
+            "relations": [],
+        })
+
+    extract_target = {}
+
+    def ensure_extract_target():
+        # mock 抽取结果固定是“张三”，先建好这个人，让解析链路走到比对分支
+        if not extract_target:
+            name = mock_llm.EXTRACT_ANSWER["profile"]["name"]
+            found = client.post("/extract/check-name", json={"name": name}).json()
+            if not found["exists"]:
+                client.post("/confirm", json={
+                    "original_text": name, "is_new_person": True,
+                    "profile": {"name": name, "job": "律师", "notes": [],
+                                "events": [{"date": "2026-02-20", "description": "吃饭"}]},
+                    "annotations": [], "developments": [], "relations": [],
+                })
+            extract_target["name"] = name
+
+    def extract_three_calls(i: int):
+        ensure_extract_target()
+        extracted = client.post("/extract", json={"text": f"和张三吃晚饭 #{i}"}).json()
+        found = client.post("/extract/check-name", json={"name": extracted["profile"]["name"]}).json()
+        return client.post("/extract/compare", json={"person_id": found["person"]["id"], "extracted_data": extracted})
+
+    def extract_resolve(i: int):
+        ensure_extract_target()
+        return client.post("/extract/resolve", json={"text": f"和张三吃晚饭 #{i}"})
+
+    def cold(path: str):
+        # 清空响应体缓存，测的是真正查库 + 序列化的开销
+        def run(i: int):
+            http_cache.clear()
+            return client.get(path)
+        return run
+
+    def strength_rebuild(i: int):
+        # 每天第一次请求 /graph 时全量重算关系强度
+        http_cache.clear()
+        strength._indexes.clear()
+        return client.get("/graph")
+
+    return {
+        "GET /persons": lambda i: client.get("/persons"),
+        "GET /persons (cold)": cold("/persons"),
+        "GET /graph": lambda i: client.get("/graph"),
+        "GET /graph (cold)": cold("/graph"),
+        "GET /graph (strength rebuild)": strength_rebuild,
+        "GET /graph/strongest": lambda i: client.get("/graph/strongest", params={"limit": 50}),
+        "GET /circles/stats": lambda i: client.get("/circles/stats"),
+        "GET /circles/stats (cold)": cold("/circles/stats"),
+        "GET /circles-with-members": lambda i: client.get("/circles-with-members"),
+        "GET /circles-with-members (cold)": cold("/circles-with-members"),
+        "POST /circles/auto-generate": lambda i: client.post("/circles/auto-generate"),
+        "POST /confirm (new)": confirm_new,
+        "POST /confirm (update)": confirm_update,
+        "POST /extract/compare": compare,
+        "extract -> check-name -> compare": extract_three_calls,
+        "POST /extract/resolve": extract_resolve,
+        "POST /extract (fast path)": lambda i: client.post("/extract", json={"text": "昨天和张三在上海吃晚饭"}),
+        "GET /persons/{id}/similar": lambda i: client.get(f"/persons/{1 + i % 50}/similar"),
+        "GET /recommend?topic=": lambda i: client.get("/recommend", params={"topic": ("fintech", "大模型", "芯片")[i % 3]}),
+    }
+
+
+def run_scenario(fn: Callable[[int], Any], counter: QueryCounter, iterations: int, warmup: int,
+                 offset: int) -> Dict[str, float]:
+    for i in range(warmup):
+        fn(offset + i)
+
+    latencies, queries = [], []
+    for i in range(iterations):
+        counter.count = 0
+        start = time.perf_counter()
+        response = fn(offset + warmup + i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        if response.status_code >= 400:
+            raise RuntimeError(f"请求失败 {response.status_code}: {response.text[:200]}")
+
+    # 内存单独跑一次，避免 tracemalloc 的开销污染延迟数据
+    tracemalloc.start()
+    fn(offset + warmup + iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries": round(statistics.mean(queries), 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+# 在全新的解释器里计时 `import app.main`；类级监听器覆盖导入过程中创建的所有引擎
+_IMPORT_PROBE = """
+import json, sys, time, tracemalloc
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, "before_cursor_execute", lambda *a, **k: queries.append(1))
+if sys.argv[1] == "memory":
+    tracemalloc.start()
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "queries": len(queries), "peak": tracemalloc.get_traced_memory()[1]}))
+"""
+
+
+def measure_import(iterations: int, warmup: int) -> Dict[str, float]:
+    backend_dir = os.path.dirname(BENCH_DIR)
+
+    def probe(mode: str) -> Dict[str, float]:
+        output = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, mode], cwd=backend_dir, env=os.environ,
+                                check=True, capture_output=True, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    for _ in range(warmup):
+        probe("time")
+    runs = [probe("time") for _ in range(iterations)]
+    latencies = [run["ms"] for run in runs]
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries": round(statistics.mean(run["queries"] for run in runs), 1),
+        "peak_kib": round(probe("memory")["peak"] / 1024, 1),
+    }
+
+
+def comparable(results: Dict[str, Any], baseline: Dict[str, Any]) -> bool:
+    return baseline.get("spec") == results["spec"] and baseline.get("backend", "sqlite") == results["backend"]
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    if not comparable(results, baseline):
+        return []
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p99_ms", "peak_kib"):
+            if current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+        if current["queries"] > previous["queries"]:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    print(f"{'scenario':<34}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>12}")
+    for name, row in results["scenarios"].items():
+        print(f"{name:<34}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['queries']:>10}{row['peak_kib']:>12}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PersonaSphere 后端基准测试")
+    parser.add_argument("--persons", type=int, default=500)
+    parser.add_argument("--events", type=int, default=8, help="每人事件数")
+    parser.add_argument("--density", type=float, default=0.01, help="关系密度（0~1）")
+    parser.add_argument("--circles", type=int, default=10)
+    parser.add_argument("--circle-size", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", action="append", help="只运行名称包含该字符串的场景")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="延迟/内存允许的相对退化")
+    parser.add_argument("--output", help="把结果写成 JSON 文件")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="在指定数据库上运行（如 PostgreSQL）；会清空其中的全部表。默认使用临时 SQLite 文件")
+    args = parser.parse_args(argv)
+
+    # 必须在导入 app 之前设置，database 模块在导入时创建引擎
+    workdir = tempfile.mkdtemp(prefix="personasphere-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("NVIDIA_API_KEY", "bench-key")
+    try:
+        from fastapi.testclient import TestClient
+        from sqlalchemy import event
+
+        from app import database, migrations
+        from . import mock_llm, synthetic
+
+        if args.database_url:
+            synthetic.reset_database(database.engine)
+        from app.main import app
+
+        spec = synthetic.NetworkSpec(
+            persons=args.persons,
+            events_per_person=args.events,
+            relation_density=args.density,
+            circles=args.circles,
+            circle_size=args.circle_size,
+            seed=args.seed,
+        )
+
+        # 导入不再建表，生成数据前先把结构迁移到最新
+        migrations.ensure_schema(database.engine)
+        mock_llm.install()
+        db = database.SessionLocal()
+        try:
+            counts = synthetic.generate(db, spec)
+        finally:
+            db.close()
+        print("synthetic network:", counts)
+
+        counter = QueryCounter()
+        event.listen(database.engine, "after_cursor_execute", counter)
+
+        results: Dict[str, Any] = {"spec": asdict(spec), "backend": database.engine.dialect.name, "scenarios": {}}
+        if not args.only or any(o in IMPORT_SCENARIO for o in args.only):
+            # 数据库已建好且是最新版本，测的是进程重启时的导入开销
+            results["scenarios"][IMPORT_SCENARIO] = measure_import(min(args.iterations, 10), 1)
+
+        with TestClient(app) as client:
+            # 等后台预热结束，避免预热查询混进各场景的计数
+            while client.get("/readyz").status_code != 200:
+                time.sleep(0.05)
+            for index, (name, fn) in enumerate(build_scenarios(client).items()):
+                if args.only and not any(o in name for o in args.only):
+                    continue
+                offset = index * (args.iterations + args.warmup + 1)
+                results["scenarios"][name] = run_scenario(fn, counter, args.iterations, args.warmup, offset)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not comparable(results, baseline):
+            print("baseline was recorded with a different network spec or backend, skipping comparison")
+            return 0
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
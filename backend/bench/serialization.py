@@ -0,0 +1,103 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+
+def cpu_ms(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="/persons 序列化路径的 CPU 开销对比")
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=8, help="每人事件数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="在指定数据库上运行；会清空其中的全部表。默认使用临时 SQLite 文件")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="personasphere-serialize-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        from typing import List
+
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+        from pydantic import TypeAdapter
+
+        from app import database, migrations, models, schemas, serialize
+        from . import synthetic
+
+        if args.database_url:
+            synthetic.reset_database(database.engine)
+        migrations.migrate(database.engine)
+        db = database.SessionLocal()
+        try:
+            synthetic.generate(db, synthetic.NetworkSpec(persons=args.persons, events_per_person=args.events,
+                                                         relation_density=0.0, circles=0))
+        finally:
+            db.close()
+
+        adapter = TypeAdapter(List[schemas.Person])
+
+        # 旧路径：ORM 实体逐个懒加载子记录 -> schemas.Person(**) -> response_model 再校验 -> json
+        def legacy():
+            db = database.SessionLocal()
+            try:
+                result = []
+                for person in db.query(models.Person).all():
+                    result.append(schemas.Person(
+                        id=person.id, name=person.name, avatar=person.avatar, profile=person.profile,
+                        created_at=person.created_at, updated_at=person.updated_at, events=person.events,
+                        annotations=person.annotations, developments=person.developments,
+                    ))
+                validated = adapter.validate_python(result, from_attributes=True)
+                return JSONResponse(jsonable_encoder(validated)).body
+            finally:
+                db.close()
+
+        def fast():
+            db = database.SessionLocal()
+            try:
+                return serialize.dumps(serialize.persons_payload(db))
+            finally:
+                db.close()
+
+        db = database.SessionLocal()
+        try:
+            payload = serialize.persons_payload(db)
+            models_list = adapter.validate_python(payload)
+        finally:
+            db.close()
+
+        scale = 1000 / args.persons
+        rows: Dict[str, float] = {
+            "end-to-end legacy (ORM + Pydantic)": cpu_ms(legacy, args.repeat),
+            "end-to-end fast (rows + orjson)": cpu_ms(fast, args.repeat),
+            "encode only: Pydantic validate + dump": cpu_ms(
+                lambda: adapter.dump_json(adapter.validate_python(payload)), args.repeat),
+            "encode only: jsonable_encoder + json": cpu_ms(
+                lambda: JSONResponse(jsonable_encoder(models_list)).body, args.repeat),
+            "encode only: serialize.dumps": cpu_ms(lambda: serialize.dumps(payload), args.repeat),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    backend = "orjson" if serialize.orjson is not None else "json"
+    print(f"{args.persons} persons x {args.events} events, serializer={backend}, CPU ms per 1000 persons:")
+    for name, value in rows.items():
+        print(f"  {name:<40}{value * scale:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
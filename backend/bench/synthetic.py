@@ -0,0 +1,167 @@
+import json
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import dates, models
+from app.database import Base
+
+SURNAMES = "王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕苏卢蒋蔡贾丁魏薛叶阎余潘杜戴夏钟汪田任姜范方石姚谭廖邹熊金陆郝孔白崔康毛邱秦江史顾侯邵孟龙万段雷钱汤尹黎易常武乔贺赖龚文"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍鹏辉晨宇浩然子涵欣怡梓轩思远雨桐博文嘉怡俊杰佳琪"
+JOBS = ["投资人", "产品经理", "工程师", "设计师", "律师", "医生", "教师", "创业者", "销售总监", "研究员", "记者", "会计师"]
+TOPICS = ["人工智能", "AI", "芯片", "半导体", "金融科技", "fintech", "大模型", "LLM", "新能源", "生物医药",
+          "跨境电商", "机器人", "区块链", "云计算", "消费品牌", "教育科技", "自动驾驶", "游戏", "文旅", "医疗器械"]
+EVENT_TEMPLATES = ["吃饭", "吃晚饭", "吃午饭", "见面", "聚会", "开会讨论{topic}", "在{city}出差碰面", "喝咖啡聊{topic}",
+                   "参加{topic}论坛", "打球"]
+PLAN_TEMPLATES = ["约饭", "拜访", "一起去{city}", "介绍{topic}方向的朋友", "跟进{topic}项目"]
+NOTES = ["对海鲜过敏", "爱吃榴莲", "不喜欢喝酒", "早睡早起", "深圳中学", "清华大学毕业", "喜欢吃辣", "性格开朗"]
+CITIES = ["上海", "北京", "深圳", "广州", "杭州", "成都"]
+RELATION_TYPES = ["朋友", "同事", "同学", "家人", "合作伙伴"]
+COLORS = ["#4A7B9C", "#9B6B6B", "#5F7256", "#B5A189", "#9251A8"]
+
+
+@dataclass
+class NetworkSpec:
+    persons: int = 500
+    events_per_person: int = 8
+    annotations_per_person: int = 2
+    developments_per_person: int = 2
+    relation_density: float = 0.01
+    circles: int = 10
+    circle_size: int = 40
+    seed: int = 42
+
+
+def _names(rng: random.Random, count: int) -> List[str]:
+    names = set()
+    while len(names) < count:
+        given = "".join(rng.choice(GIVEN) for _ in range(rng.choice((1, 2))))
+        name = rng.choice(SURNAMES) + given
+        if name in names:
+            name = f"{name}{len(names)}"
+        names.add(name)
+    return sorted(names, key=lambda n: rng.random())
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(topic=rng.choice(TOPICS), city=rng.choice(CITIES))
+
+
+def reset_database(engine: Engine) -> None:
+    # 只用于基准测试指定的外部数据库：清空后由 migrations.ensure_schema 重新建表
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_version"))
+
+
+def _sync_sequences(db: Session) -> None:
+    # 批量插入时显式指定了 id，PostgreSQL 的自增序列不会跟着前进
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("persons", "events", "annotations", "developments", "relations", "circles", "person_circles"):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def generate(db: Session, spec: NetworkSpec) -> Dict[str, int]:
+    rng = random.Random(spec.seed)
+    today = date(2026, 2, 20)
+
+    person_rows = []
+    for i, name in enumerate(_names(rng, spec.persons), start=1):
+        profile = {
+            "job": rng.choice(JOBS) if rng.random() < 0.8 else None,
+            "birthday": f"{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.6 else None,
+            "notes": rng.sample(NOTES, rng.randint(0, 3)),
+        }
+        person_rows.append({
+            "id": i,
+            "name": name,
+            "profile_json": json.dumps(profile, ensure_ascii=False),
+            "job": profile["job"],
+            "birthday": profile["birthday"],
+            "birthday_md": dates.birthday_month_day(profile["birthday"]),
+            "notes": models.notes_text(profile["notes"]),
+        })
+    db.bulk_insert_mappings(models.Person, person_rows)
+
+    event_rows, annotation_rows, development_rows = [], [], []
+    for person_id in range(1, spec.persons + 1):
+        for _ in range(spec.events_per_person):
+            day = today - timedelta(days=rng.randint(0, 3 * 365))
+            event_rows.append({
+                "person_id": person_id,
+                "date": day.isoformat(),
+                "location": rng.choice(CITIES) if rng.random() < 0.5 else None,
+                "description": _fill(rng.choice(EVENT_TEMPLATES), rng),
+                "source": "user",
+            })
+        for _ in range(spec.annotations_per_person):
+            day = today + timedelta(days=rng.randint(1, 180))
+            time_value = day.isoformat() if rng.random() < 0.7 else day.strftime("%Y-%m")
+            starts_on, ends_on = dates.parse_time_range(time_value)
+            annotation_rows.append({
+                "person_id": person_id,
+                "time": time_value,
+                "starts_on": starts_on,
+                "ends_on": ends_on,
+                "location": None,
+                "description": _fill(rng.choice(PLAN_TEMPLATES), rng),
+                "source": "user",
+                "confirmed_by_user": True,
+            })
+        for topic in rng.sample(TOPICS, min(spec.developments_per_person, len(TOPICS))):
+            development_rows.append({
+                "person_id": person_id,
+                "content": topic,
+                "type": "resource",
+                "source": "user",
+                "confirmed_by_user": True,
+            })
+    db.bulk_insert_mappings(models.Event, event_rows)
+    db.bulk_insert_mappings(models.Annotation, annotation_rows)
+    db.bulk_insert_mappings(models.Development, development_rows)
+
+    # 按密度随机连边，期望边数 = density * n * (n - 1) / 2，双向各存一条
+    relation_rows = []
+    pairs = set()
+    target_edges = int(spec.relation_density * spec.persons * (spec.persons - 1) / 2)
+    while len(pairs) < target_edges:
+        a, b = rng.randint(1, spec.persons), rng.randint(1, spec.persons)
+        if a == b or (min(a, b), max(a, b)) in pairs:
+            continue
+        pairs.add((min(a, b), max(a, b)))
+        relation_type = rng.choice(RELATION_TYPES)
+        relation_rows.append({"from_person_id": a, "to_person_id": b,
+                              "relation_type": relation_type, "confirmed_by_user": True})
+        relation_rows.append({"from_person_id": b, "to_person_id": a,
+                              "relation_type": relation_type, "confirmed_by_user": True})
+    db.bulk_insert_mappings(models.Relation, relation_rows)
+
+    circle_rows, membership_rows = [], []
+    for circle_id in range(1, spec.circles + 1):
+        circle_rows.append({"id": circle_id, "name": f"圈子{circle_id}", "color": COLORS[circle_id % len(COLORS)]})
+        members = rng.sample(range(1, spec.persons + 1), min(spec.circle_size, spec.persons))
+        membership_rows.extend(
+            {"person_id": person_id, "circle_id": circle_id, "assigned_by_user": True} for person_id in members
+        )
+    db.bulk_insert_mappings(models.Circle, circle_rows)
+    db.bulk_insert_mappings(models.PersonCircle, membership_rows)
+    _sync_sequences(db)
+    db.commit()
+
+    return {
+        "persons": len(person_rows),
+        "events": len(event_rows),
+        "annotations": len(annotation_rows),
+        "developments": len(development_rows),
+        "relations": len(relation_rows),
+        "circles": len(circle_rows),
+        "memberships": len(membership_rows),
+    }
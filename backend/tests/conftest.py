@@ -0,0 +1,59 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# 必须在导入 app 之前设置：database 模块导入时就创建引擎
+_WORKDIR = tempfile.mkdtemp(prefix="personasphere-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}"
+os.environ.setdefault("TENANT_DATA_DIR", os.path.join(_WORKDIR, "tenants"))
+os.environ.setdefault("AVATAR_DIR", os.path.join(_WORKDIR, "avatars"))
+os.environ.setdefault("STARTUP_WARMUP", "0")
+os.environ.pop("NVIDIA_API_KEY", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _reset_external_database():
+    # 指定外部数据库（如 PostgreSQL）时先清空，由应用启动时的结构检查重新建表
+    from sqlalchemy import text
+    from app import models  # 注册全部表
+    from app.database import Base, engine
+
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_version"))
+
+
+if os.getenv("TEST_DATABASE_URL"):
+    _reset_external_database()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def create_person(client):
+    def create(name, relations=(), developments=(), **profile):
+        response = client.post("/confirm", json={
+            "original_text": name,
+            "is_new_person": True,
+            "profile": {"name": name, "events": [], **profile},
+            "annotations": [],
+            "developments": [{"content": content} for content in developments],
+            "relations": [{"name": other, "relation_type": kind} for other, kind in relations],
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["person_id"]
+    return create
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+
+from app import agenda, dates
+from app.database import SessionLocal
+
+
+def _agenda(client, start, end):
+    response = client.get("/agenda", params={"from": start, "to": end})
+    assert response.status_code == 200, response.text
+    return response.json()["items"]
+
+
+@pytest.mark.parametrize("month_day, start, expected", [
+    ("02-29", date(2027, 2, 28), date(2027, 2, 28)),
+    ("02-29", date(2028, 2, 28), date(2028, 2, 29)),
+    ("02-29", date(2027, 3, 1), date(2028, 2, 29)),
+    ("04-31", date(2027, 4, 30), date(2027, 4, 30)),
+    ("01-05", date(2027, 12, 30), date(2028, 1, 5)),
+])
+def test_next_occurrence(month_day, start, expected):
+    assert dates.next_occurrence(month_day, start) == expected
+
+
+def test_month_day_ranges_cover_clamped_days():
+    assert dates.month_day_ranges(date(2027, 2, 28), date(2027, 2, 28)) == [("02-28", "02-31")]
+    assert dates.month_day_ranges(date(2028, 2, 28), date(2028, 2, 28)) == [("02-28", "02-28")]
+    assert dates.month_day_ranges(date(2027, 12, 30), date(2028, 1, 2)) == [("12-30", "12-31"), ("01-01", "01-02")]
+    assert dates.month_day_ranges(date(2027, 1, 1), date(2028, 1, 1)) == [("01-01", "12-31")]
+
+
+def test_leap_day_birthday_in_non_leap_year(client, create_person):
+    person_id = create_person("闰日", birthday="2000-02-29")
+    items = _agenda(client, "2027-02-28", "2027-02-28")
+    assert [(i["person_id"], i["date"], i["description"]) for i in items if i["kind"] == "birthday"] == [
+        (person_id, "2027-02-28", "闰日27岁生日")]
+    assert not [i for i in _agenda(client, "2027-02-27", "2027-02-27") if i["person_id"] == person_id]
+    assert [i["date"] for i in _agenda(client, "2028-02-28", "2028-02-29") if i["person_id"] == person_id] == [
+        "2028-02-29"]
+
+
+def test_birthdays_across_new_year(client, create_person):
+    person_id = create_person("跨年", birthday="01-02")
+    items = [i for i in _agenda(client, "2026-12-30", "2027-01-05") if i["person_id"] == person_id]
+    assert [(i["date"], i["description"]) for i in items] == [("2027-01-02", "跨年生日")]
+
+
+def test_annotations_overlapping_the_window(client, create_person):
+    person_id = create_person("议程")
+    for time, description in (("2027-05", "整月出差"), ("2027-05-20", "见面"), ("2027-07-01", "太晚")):
+        client.post(f"/persons/{person_id}/annotations", json={"time": time, "description": description})
+    items = [i for i in _agenda(client, "2027-05-15", "2027-06-01") if i["person_id"] == person_id]
+    assert [(i["date"], i["end_date"], i["description"]) for i in items] == [
+        ("2027-05-01", "2027-05-31", "整月出差"), ("2027-05-20", None, "见面")]
+
+
+def test_agenda_rejects_bad_ranges(client):
+    assert client.get("/agenda", params={"from": "2027-02-02", "to": "2027-02-01"}).status_code == 400
+    assert client.get("/agenda", params={"from": "2027-01-01", "to": "2028-01-03"}).status_code == 400
+
+
+def test_digest_is_cached_and_invalidated_by_writes(client, create_person, monkeypatch):
+    monkeypatch.setattr(agenda, "today", lambda: date(2027, 8, 1))
+    with SessionLocal() as db:
+        first = agenda.daily_digest(db)
+        assert agenda.daily_digest(db) is first
+    person_id = create_person("摘要", birthday="08-03")
+    items = client.get("/agenda/digest").json()["items"]
+    assert [i["date"] for i in items if i["person_id"] == person_id] == ["2027-08-03"]
+
+
+def test_daily_refresh_precomputes_todays_digest(client, monkeypatch):
+    import asyncio
+
+    from app import startup
+
+    monkeypatch.setattr(agenda, "today", lambda: date(2027, 9, 1))
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 1:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(startup.asyncio, "sleep", fake_sleep)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(startup.refresh_digest_daily())
+    assert 0 < sleeps[0] <= 24 * 3600 + 1
+    assert ("default", date(2027, 9, 1)) in agenda._digests
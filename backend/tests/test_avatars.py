@@ -0,0 +1,107 @@
+import base64
+import hashlib
+import io
+import os
+
+import pytest
+
+from app import avatars, migrations, models
+from app.database import SessionLocal
+
+# 1x1 的透明 PNG
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+PNG_HASH = hashlib.sha256(PNG).hexdigest()[:avatars.HASH_LENGTH]
+
+
+def _upload(client, person_id, data, filename="a.png"):
+    return client.post(f"/persons/{person_id}/avatar", files={"file": (filename, data, "image/png")})
+
+
+@pytest.fixture
+def no_pillow(monkeypatch):
+    monkeypatch.setattr(avatars, "Image", None)
+
+
+def test_upload_stores_by_content_hash(client, create_person, no_pillow):
+    a = create_person("头像甲")
+    b = create_person("头像乙")
+    response = _upload(client, a, PNG)
+    assert response.status_code == 200, response.text
+    assert response.json()["avatar"] == PNG_HASH
+    # 同样的内容指向同一个文件
+    assert _upload(client, b, PNG).json()["avatar"] == PNG_HASH
+    assert os.path.exists(avatars.path_for(PNG_HASH))
+
+    listed = {p["id"]: p["avatar"] for p in client.get("/persons").json()}
+    assert listed[a] == listed[b] == PNG_HASH
+
+
+def test_get_avatar_is_immutable_and_conditional(client, create_person, no_pillow):
+    _upload(client, create_person("头像丙"), PNG)
+    response = client.get(f"/avatars/{PNG_HASH}")
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == avatars.CACHE_CONTROL
+    etag = response.headers["etag"]
+
+    assert client.get(f"/avatars/{PNG_HASH}", headers={"If-None-Match": etag}).status_code == 304
+    # 没有 Pillow 时各尺寸都返回原图，缓存标识按尺寸区分
+    sized = client.get(f"/avatars/{PNG_HASH}", params={"size": avatars.THUMBNAIL_SIZES[0]})
+    assert sized.content == PNG and sized.headers["etag"] != etag
+
+
+def test_get_avatar_rejects_bad_requests(client):
+    assert client.get("/avatars/not-a-hash").status_code == 404
+    assert client.get(f"/avatars/{'0' * avatars.HASH_LENGTH}").status_code == 404
+    assert client.get(f"/avatars/{PNG_HASH}", params={"size": 7}).status_code == 400
+
+
+def test_upload_rejects_bad_images(client, create_person, monkeypatch, no_pillow):
+    person_id = create_person("头像丁")
+    assert _upload(client, person_id, b"").status_code == 400
+    assert _upload(client, person_id, b"plain text, not an image").status_code == 400
+    assert _upload(client, 999999, PNG).status_code == 404
+    monkeypatch.setattr(avatars, "AVATAR_MAX_BYTES", len(PNG) - 1)
+    assert _upload(client, person_id, PNG).status_code == 413
+    assert client.get(f"/persons/{person_id}").json()["avatar"] is None
+
+
+def test_patch_moves_data_url_into_store(client, create_person, no_pillow):
+    person_id = create_person("头像戊")
+    data_url = "data:image/png;base64," + base64.b64encode(PNG).decode()
+    response = client.patch(f"/persons/{person_id}", json={"avatar": data_url})
+    assert response.status_code == 200
+    assert response.json()["avatar"] == PNG_HASH
+
+    external = "https://example.com/a.png"
+    assert client.patch(f"/persons/{person_id}", json={"avatar": external}).json()["avatar"] == external
+    assert client.patch(f"/persons/{person_id}", json={"avatar": "data:image/png;base64,@@"}).status_code == 400
+
+
+def test_migration_moves_inline_avatars(client, create_person, no_pillow):
+    good = create_person("头像迁移")
+    bad = create_person("头像迁移坏")
+    with SessionLocal() as db:
+        db.query(models.Person).filter(models.Person.id == good).update(
+            {"avatar": "data:image/png;base64," + base64.b64encode(PNG).decode()})
+        db.query(models.Person).filter(models.Person.id == bad).update({"avatar": "data:image/png;base64,AAAA"})
+        migrations._avatar_store(db.connection())
+        db.commit()
+    with SessionLocal() as db:
+        assert db.get(models.Person, good).avatar == PNG_HASH
+        # 转存不了的保留原值
+        assert db.get(models.Person, bad).avatar == "data:image/png;base64,AAAA"
+
+
+def test_thumbnails_are_generated():
+    image = pytest.importorskip("PIL.Image")
+    out = io.BytesIO()
+    image.new("RGB", (300, 200), (200, 30, 30)).save(out, "JPEG")
+    avatar_hash = avatars.store(out.getvalue())
+    for size in avatars.THUMBNAIL_SIZES:
+        path, kind = avatars.resolve(avatar_hash, size)
+        assert kind == "image/jpeg"
+        with image.open(path) as thumbnail:
+            assert thumbnail.size == (size, size)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app import batching, llm, metrics, resilience
+from bench import mock_llm
+
+KEY = "key"
+_LINE_RE = re.compile(r"^\[(\d+)\] (.*)$", re.M)
+
+
+def _result(text):
+    return {**mock_llm.EXTRACT_ANSWER, "profile": {**mock_llm.EXTRACT_ANSWER["profile"], "name": text}}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """mock 上游：单条按原文回姓名，批量按编号倒序回；broken 里的文本在批量结果中给坏数据。"""
+    state = SimpleNamespace(calls=[], latency=0.05, broken=set(), cancelled=0)
+
+    async def handler(request):
+        body = json.loads(request.content)
+        system = mock_llm._text(body["messages"][0]["content"])
+        user = mock_llm._text(body["messages"][-1]["content"])
+        batch = "【批量模式】" in system
+        state.calls.append(("batch" if batch else "single", user))
+        try:
+            await asyncio.sleep(state.latency)
+        except asyncio.CancelledError:
+            state.cancelled += 1
+            raise
+        if batch:
+            lines = _LINE_RE.findall(user)
+            content = {"results": [{"index": int(i), "result": "坏" if text in state.broken else _result(text)}
+                                   for i, text in reversed(lines)]}
+        else:
+            content = _result(user)
+        text = json.dumps(content, ensure_ascii=False)
+        return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+    clients = {}
+
+    def get_client():
+        loop = asyncio.get_running_loop()
+        if loop not in clients:
+            clients[loop] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return clients[loop]
+
+    monkeypatch.setattr(llm, "get_client", get_client)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_limiters", {
+        model: resilience.AdaptiveRateLimiter(rate=1e9, burst=10 ** 9, max_rate=1e9) for model in llm.FALLBACK_MODELS})
+    llm.result_cache.clear()
+    yield state
+    llm.result_cache.clear()
+
+
+async def _with_one_inflight(batcher, texts):
+    # 空闲时单条直接发出；先放一条在途，后面的才会攒批
+    first = asyncio.ensure_future(batcher.extract(KEY, "在途"))
+    await asyncio.sleep(0)
+    results = await asyncio.gather(*(batcher.extract(KEY, text) for text in texts))
+    await first
+    return [result.profile.name for result in results]
+
+
+def test_pack_numbers_texts_and_flattens_whitespace():
+    assert batching.pack(["周一  和\n张三吃饭", "李四"]) == "[1] 周一 和 张三吃饭\n[2] 李四"
+
+
+def test_idle_request_is_sent_alone(upstream):
+    result = asyncio.run(batching.ExtractBatcher().extract(KEY, "单独一条"))
+    assert result.profile.name == "单独一条"
+    assert upstream.calls == [("single", "单独一条")]
+
+
+def test_batch_splits_results_by_index_and_dedups(upstream):
+    names = asyncio.run(_with_one_inflight(batching.ExtractBatcher(), ["甲", "乙", "甲"]))
+    assert names == ["甲", "乙", "甲"]
+    assert upstream.calls == [("single", "在途"), ("batch", "[1] 甲\n[2] 乙")]
+
+    # 批量结果按单条的缓存键存下，之后单独抽取同一文本不再请求上游
+    again = asyncio.run(batching.ExtractBatcher().extract(KEY, "乙"))
+    assert again.profile.name == "乙"
+    assert len(upstream.calls) == 2
+
+
+def test_full_batch_flushes_without_waiting(upstream):
+    batcher = batching.ExtractBatcher(window=10.0, max_size=2)
+    names = asyncio.run(asyncio.wait_for(_with_one_inflight(batcher, ["甲", "乙"]), timeout=5))
+    assert names == ["甲", "乙"]
+    assert upstream.calls[1] == ("batch", "[1] 甲\n[2] 乙")
+
+
+def test_broken_item_falls_back_to_single_request(upstream):
+    upstream.broken = {"乙"}
+    before = metrics.EXTRACT_BATCH_FALLBACKS.get()
+    names = asyncio.run(_with_one_inflight(batching.ExtractBatcher(), ["甲", "乙", "丙"]))
+    assert names == ["甲", "乙", "丙"]
+    assert upstream.calls[1:] == [("batch", "[1] 甲\n[2] 乙\n[3] 丙"), ("single", "乙")]
+    assert metrics.EXTRACT_BATCH_FALLBACKS.get() == before + 1
+
+
+def test_abandoned_batch_is_cancelled(upstream):
+    batcher = batching.ExtractBatcher()
+
+    async def scenario():
+        first = asyncio.ensure_future(batcher.extract(KEY, "在途"))
+        await asyncio.sleep(0)
+        upstream.latency = 5.0
+        callers = [asyncio.ensure_future(batcher.extract(KEY, text)) for text in ("甲", "乙")]
+        while not any(kind == "batch" for kind, _ in upstream.calls):
+            await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        # 批量请求在上游被中止，也没有回退成逐条请求
+        assert not batcher._tasks
+        assert upstream.cancelled == 1
+        assert [kind for kind, _ in upstream.calls] == ["single", "batch"]
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import cancellation, llm, metrics, prompts, resilience
+
+ROUTE = "/extract"
+
+
+class FakeRequest:
+    def __init__(self, tenant="default"):
+        self.scope = {}
+        self.url = SimpleNamespace(path=ROUTE)
+        self.state = SimpleNamespace(tenant=tenant)
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+@pytest.fixture
+def hanging_upstream(monkeypatch):
+    """上游一直不返回，记录被调到的模型。"""
+    called = []
+
+    async def post(api_key, body, timeout):
+        called.append(body["model"])
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(llm, "_post", post)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_limiters", {})
+    monkeypatch.setattr(cancellation, "DISCONNECT_POLL_SECONDS", 0.01)
+    return called
+
+
+def _extract():
+    return llm.complete_structured("key", prompts.EXTRACT_PROMPT.render(), "你好",
+                                   llm.parse_extract_response, use_cache=False)
+
+
+async def _when_called(called, action):
+    while not called:
+        await asyncio.sleep(0.01)
+    action()
+
+
+def _run_until_cancelled(request, trigger, job_id=None):
+    async def scenario():
+        helper = asyncio.ensure_future(trigger())
+        try:
+            with pytest.raises(HTTPException) as excinfo:
+                await asyncio.wait_for(cancellation.run(request, _extract(), job_id), timeout=5)
+        finally:
+            await helper
+        return excinfo.value
+    return asyncio.run(scenario())
+
+
+def test_disconnect_stops_the_fallback_loop(hanging_upstream):
+    called = hanging_upstream
+    model = llm.FALLBACK_MODELS[0]
+    before = metrics.LLM_CANCELLED.get(model=model)
+    before_http = metrics.HTTP_CANCELLED.get(route=ROUTE, reason="disconnect")
+    request = FakeRequest()
+
+    error = _run_until_cancelled(request, lambda: _when_called(called, lambda: setattr(request, "disconnected", True)))
+    assert error.status_code == cancellation.STATUS_CANCELLED
+    assert called == [model]
+    assert metrics.LLM_CANCELLED.get(model=model) == before + 1
+    assert metrics.LLM_CANCELLED_ELAPSED.get(model=model) > 0
+    assert metrics.HTTP_CANCELLED.get(route=ROUTE, reason="disconnect") == before_http + 1
+
+
+def test_explicit_cancel_stops_the_fallback_loop(hanging_upstream):
+    called = hanging_upstream
+    model = llm.FALLBACK_MODELS[0]
+    before = metrics.LLM_CANCELLED.get(model=model)
+    before_http = metrics.HTTP_CANCELLED.get(route=ROUTE, reason="api")
+    cancelled = []
+
+    def cancel():
+        cancelled.append(cancellation.cancel("default", "job-1"))
+
+    error = _run_until_cancelled(FakeRequest(), lambda: _when_called(called, cancel), job_id="job-1")
+    assert error.status_code == cancellation.STATUS_CANCELLED
+    assert cancelled == [True]
+    assert called == [model]
+    assert metrics.LLM_CANCELLED.get(model=model) == before + 1
+    assert metrics.HTTP_CANCELLED.get(route=ROUTE, reason="api") == before_http + 1
+    # 结束后登记已清掉，再取消找不到
+    assert not cancellation.cancel("default", "job-1")
+
+
+def test_rejected_job_id_closes_the_coroutine(hanging_upstream):
+    async def scenario():
+        invalid = _extract()
+        with pytest.raises(HTTPException) as excinfo:
+            await cancellation.run(FakeRequest(), invalid, "不合法 id")
+        assert excinfo.value.status_code == 400
+        assert invalid.cr_frame is None
+
+        first = asyncio.ensure_future(cancellation.run(FakeRequest(), asyncio.sleep(30), "job-2"))
+        await asyncio.sleep(0)
+        duplicate = _extract()
+        with pytest.raises(HTTPException) as excinfo:
+            await cancellation.run(FakeRequest(), duplicate, "job-2")
+        assert excinfo.value.status_code == 409
+        assert duplicate.cr_frame is None
+        # 其他租户用同一个 id 不冲突
+        assert not cancellation.cancel("acme", "job-2")
+
+        assert cancellation.cancel("default", "job-2")
+        with pytest.raises(HTTPException):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_cancel_unknown_job_is_404(client):
+    assert client.delete("/jobs/no-such-job").status_code == 404
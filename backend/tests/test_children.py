@@ -0,0 +1,32 @@
+def test_null_on_required_field_is_rejected(client, create_person):
+    person_id = create_person("孙子记录")
+    event = client.post(f"/persons/{person_id}/events",
+                        json={"date": "2026-01-01", "location": "北京", "description": "吃饭"}).json()
+
+    response = client.put(f"/persons/{person_id}/events/{event['id']}", json={"description": None})
+    assert response.status_code == 422
+
+    response = client.patch(f"/persons/{person_id}/events/{event['id']}", json={"location": None})
+    assert response.status_code == 200
+    assert response.json()["location"] is None
+    assert response.json()["description"] == "吃饭"
+
+
+def test_create_requires_fields(client, create_person):
+    person_id = create_person("孙子新建")
+    assert client.post(f"/persons/{person_id}/events", json={"date": "2026-01-01"}).status_code == 422
+    assert client.post(f"/persons/{person_id}/developments", json={"type": "need"}).status_code == 422
+    response = client.post(f"/persons/{person_id}/developments", json={"content": "芯片"})
+    assert response.status_code == 200
+    assert response.json()["type"] == "resource"
+
+
+def test_openapi_create_schemas_have_required_fields(client):
+    spec = client.get("/openapi.json").json()
+    schemas = spec["components"]["schemas"]
+    for path, name, required in (("/persons/{person_id}/events", "EventCreate", {"date", "description"}),
+                                 ("/persons/{person_id}/annotations", "AnnotationCreate", {"time", "description"}),
+                                 ("/persons/{person_id}/developments", "DevelopmentCreate", {"content"})):
+        body = spec["paths"][path]["post"]["requestBody"]["content"]["application/json"]["schema"]
+        assert body["$ref"].endswith("/" + name)
+        assert set(schemas[name]["required"]) == required
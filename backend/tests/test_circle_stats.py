@@ -0,0 +1,101 @@
+from app import circle_stats, models
+from app.database import SessionLocal
+
+
+def _stored():
+    with SessionLocal() as db:
+        return circle_stats.stats_payload(db)
+
+
+def _assert_matches_full_refresh():
+    # 增量维护的结果应与全量重算一致
+    incremental = _stored()
+    with SessionLocal() as db:
+        circle_stats.refresh(db.connection())
+        full = circle_stats.stats_payload(db)
+        db.rollback()
+    assert incremental == full
+
+
+def _stats(client, *circle_ids):
+    response = client.get("/circles/stats")
+    assert response.status_code == 200
+    by_id = {row["circle_id"]: row for row in response.json()}
+    return [by_id[circle_id] for circle_id in circle_ids]
+
+
+def _circle(client, name, person_ids):
+    response = client.post("/circles/confirm", json={
+        "circles": [{"name": name, "color": "#445566", "person_ids": person_ids}]})
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        return db.query(models.Circle.id).filter(models.Circle.name == name).order_by(models.Circle.id.desc()).scalar()
+
+
+def test_stats_follow_membership_and_development_writes(client, create_person):
+    a = create_person("统计甲", developments=["LLM", "芯片"])
+    b = create_person("统计乙", developments=["llm"])
+    c = create_person("统计丙")
+    first = _circle(client, "统计圈一", [a, b])
+    second = _circle(client, "统计圈二", [b, c])
+
+    one, two = _stats(client, first, second)
+    assert one["member_count"] == 2 and two["member_count"] == 2
+    assert one["overlaps"] == [{"circle_id": second, "count": 1}]
+    assert two["overlaps"] == [{"circle_id": first, "count": 1}]
+    # 大小写不同的同一方向合并计数，展示第一次出现的写法
+    assert one["top_topics"][0] == {"topic": "LLM", "count": 2}
+    assert two["top_topics"] == [{"topic": "llm", "count": 1}]
+    _assert_matches_full_refresh()
+
+    assert client.post(f"/circles/{second}/persons/{a}").status_code == 200
+    assert client.post(f"/persons/{c}/developments", json={"content": "芯片", "type": "resource"}).status_code == 200
+    one, two = _stats(client, first, second)
+    assert two["member_count"] == 3
+    assert one["overlaps"] == [{"circle_id": second, "count": 2}]
+    assert {"topic": "芯片", "count": 2} in two["top_topics"]
+    _assert_matches_full_refresh()
+
+    assert client.delete(f"/circles/{second}/persons/{b}").status_code == 200
+    assert client.delete(f"/persons/{a}").status_code == 200
+    one, two = _stats(client, first, second)
+    assert one["member_count"] == 1 and two["member_count"] == 1
+    assert one["overlaps"] == [] and two["overlaps"] == []
+    _assert_matches_full_refresh()
+
+
+def test_deleting_a_circle_drops_its_overlaps(client, create_person):
+    a = create_person("统计丁")
+    keep = _circle(client, "统计留下", [a])
+    gone = _circle(client, "统计删除", [a])
+    assert _stats(client, keep)[0]["overlaps"] == [{"circle_id": gone, "count": 1}]
+
+    assert client.delete(f"/circles/{gone}").status_code == 200
+    assert _stats(client, keep)[0]["overlaps"] == []
+    assert gone not in {row["circle_id"] for row in _stored()}
+    _assert_matches_full_refresh()
+
+
+def test_bulk_merge_triggers_full_refresh(client, create_person):
+    a = create_person("统计合并甲", developments=["出海"])
+    b = create_person("统计合并乙", developments=["出海"])
+    first = _circle(client, "统计合并圈一", [a])
+    second = _circle(client, "统计合并圈二", [b])
+
+    assert client.post("/persons/merge", json={"target_id": a, "source_ids": [b]}).status_code == 200
+    one, two = _stats(client, first, second)
+    assert one["overlaps"] == [{"circle_id": second, "count": 1}]
+    assert two["member_count"] == 1
+    assert two["top_topics"] == [{"topic": "出海", "count": 1}]
+    _assert_matches_full_refresh()
+
+
+def test_rollback_discards_pending_refresh(client, create_person):
+    a = create_person("统计回滚")
+    circle = _circle(client, "统计回滚圈", [a])
+    with SessionLocal() as db:
+        db.add(models.Development(person_id=a, content="回滚方向", type="resource"))
+        db.flush()
+        db.rollback()
+        assert "circle_stats" not in db.info
+    assert _stats(client, circle)[0]["top_topics"] == []
@@ -0,0 +1,106 @@
+"""核心读写路径；设置 TEST_DATABASE_URL 指向 PostgreSQL 时同一组用例在 PostgreSQL 上运行。"""
+import pytest
+from sqlalchemy import event
+
+from app import database, migrations, models
+
+
+def test_schema_check_reads_one_row(client):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        assert migrations.ensure_schema(database.engine) == migrations.LATEST_VERSION
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    assert statements == ["SELECT MAX(version) FROM schema_version"]
+
+
+def test_person_lifecycle(client, create_person):
+    person_id = create_person("周一鸣", job="Fintech 产品经理", birthday="1990-05-20",
+                              events=[{"date": "2026-01-03", "description": "吃饭"}],
+                              developments=["金融科技"])
+
+    person = client.get(f"/persons/{person_id}").json()
+    assert person["profile"]["job"] == "Fintech 产品经理"
+    assert [e["description"] for e in person["events"]] == ["吃饭"]
+    assert [d["content"] for d in person["developments"]] == ["金融科技"]
+
+    names = lambda **params: {p["name"] for p in client.get("/persons", params=params).json()}
+    assert "周一鸣" in names(job="fintech")
+    assert "周一鸣" in names(birthday="05")
+    assert "周一鸣" in names(birthday="05-20")
+    assert "周一鸣" not in names(birthday="06")
+    assert "周一鸣" not in names(job="100%")
+
+    response = client.patch(f"/persons/{person_id}", json={
+        "profile": {"job": "投资人", "birthday": "05-21"},
+        "events": {"upsert": [{"date": "2026-02-01", "description": "见面"}]},
+    })
+    assert response.status_code == 200
+    assert response.json()["profile"]["birthday"] == "05-21"
+
+    page = client.get(f"/persons/{person_id}/timeline", params={"limit": 1}).json()
+    assert [item["date"] for item in page["items"]] == ["2026-02-01"]
+    page = client.get(f"/persons/{person_id}/timeline", params={"cursor": page["next_cursor"]}).json()
+    assert [item["date"] for item in page["items"]] == ["2026-01-03"]
+
+    assert client.delete(f"/persons/{person_id}").status_code == 200
+    assert client.get(f"/persons/{person_id}").status_code == 404
+
+
+def test_relations_circles_and_merge(client, create_person):
+    a = create_person("吴建国", relations=[("吴建国的同事", "同事")])
+    b = create_person("吴建国2")
+    edges = client.get("/graph").json()["edges"]
+    assert any(a in (e["source"], e["target"]) for e in edges)
+
+    circle = client.post("/circles", json={"name": "校友会", "color": "#4A7B9C"}).json()
+    for person_id in (a, b):
+        assert client.post(f"/circles/{circle['id']}/persons/{person_id}").status_code == 200
+    stats = {s["circle_id"]: s for s in client.get("/circles/stats").json()}
+    assert stats[circle["id"]]["member_count"] == 2
+
+    merged = client.post("/persons/merge", json={"target_id": a, "source_ids": [b]})
+    assert merged.status_code == 200
+    assert client.get(f"/persons/{b}").status_code == 404
+    stats = {s["circle_id"]: s for s in client.get("/circles/stats").json()}
+    assert stats[circle["id"]]["member_count"] == 1
+
+    assert client.delete(f"/persons/{a}").status_code == 200
+    assert client.delete(f"/circles/{circle['id']}").status_code == 200
+
+
+def test_note_search_uses_notes_not_json(client, create_person):
+    person_id = create_person("郑晓岚", job="律师", notes=["喜欢 Jazz", "养了两只猫"])
+    names = lambda **params: {p["name"] for p in client.get("/persons", params=params).json()}
+    assert "郑晓岚" in names(note="jazz")
+    assert "郑晓岚" in names(note="两只猫")
+    # 以前对整段 profile_json 做 LIKE，键名和 JSON 标点也会命中
+    assert "郑晓岚" not in names(note="job")
+    assert "郑晓岚" not in names(note='", "')
+    assert client.delete(f"/persons/{person_id}").status_code == 200
+
+
+def test_profile_cache_is_read_only():
+    person = models.Person(name="缓存", profile={"job": "医生", "notes": ["a"]})
+    assert person.profile is person.profile
+    with pytest.raises(TypeError):
+        person.profile["job"] = "护士"
+    profile = dict(person.profile)
+    profile["job"] = "护士"
+    person.profile = person.profile  # 只读映射可以原样赋值回去
+    assert person.profile == {"job": "医生", "notes": ["a"]}
+    person.profile = profile
+    assert person.job == "护士"
+
+
+def test_update_does_not_mutate_cached_notes(client, create_person):
+    person_id = create_person("钱多多", notes=["喜欢咖啡"])
+    response = client.post("/confirm", json={
+        "original_text": "钱多多", "is_new_person": False, "person_id": person_id,
+        "profile": {"name": "钱多多", "events": [], "notes": ["养猫"]},
+        "annotations": [], "developments": [], "relations": [],
+    })
+    assert response.status_code == 200, response.text
+    assert client.get(f"/persons/{person_id}").json()["profile"]["notes"] == ["喜欢咖啡", "养猫"]
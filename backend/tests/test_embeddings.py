@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app import embeddings
+
+# 同一方向的不同写法：应聚到一起
+SAME_DIRECTION = [
+    ("人工智能", "AI"),
+    ("芯片", "半导体"),
+    ("金融科技", "fintech"),
+    ("大模型", "LLM"),
+    ("Generative AI", "生成式AI"),
+    ("跨境电商", "cross-border"),
+    ("AI芯片", "人工智能芯片"),
+]
+# 共享一个概念但方向不同：不能合并
+DIFFERENT_DIRECTION = [
+    ("AI医疗", "AI教育"),
+    ("新能源汽车", "光伏"),
+    ("投资人", "VC投资"),
+    ("大模型", "人工智能"),
+    ("芯片", "AI芯片"),
+    ("email", "ai"),
+]
+
+
+@pytest.mark.parametrize("a,b", SAME_DIRECTION)
+def test_synonyms_cluster(a, b):
+    assert embeddings.similarity(a, b) >= embeddings.CLUSTER_THRESHOLD
+    assert embeddings.cluster([a, b]) == [0, 0]
+
+
+@pytest.mark.parametrize("a,b", DIFFERENT_DIRECTION)
+def test_distinct_directions_stay_apart(a, b):
+    assert embeddings.similarity(a, b) < embeddings.CLUSTER_THRESHOLD
+    assert embeddings.cluster([a, b]) == [0, 1]
+
+
+def test_store_search_skips_removed_rows():
+    store = embeddings.EmbeddingStore(capacity=2)
+    store.upsert_many([(1, 10, "金融科技"), (2, 11, "芯片"), (3, 12, "fintech")])
+    store.remove(1)
+    results = store.search(embeddings.embed("金融科技"), min_score=0.5)
+    assert [(dev_id, person_id) for dev_id, person_id, _ in results] == [(3, 12)]
+    assert np.isclose(results[0][2], 1.0)
@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from app import batching, fastpath, schemas
+
+TODAY = date(2026, 2, 20)
+
+# 称谓、职务、时间词形似人名，不能当成人物高置信度返回
+NOT_A_PERSON = ["和老板吃饭", "和老师吃饭", "和高管吃饭", "和小组见面", "和周末吃饭", "和马上吃饭"]
+
+
+@pytest.mark.parametrize("text", NOT_A_PERSON)
+def test_title_and_time_words_are_not_names(text):
+    result = fastpath.extract(text, TODAY)
+    assert result.extraction is None
+    assert result.confidence == 0.0
+
+
+def test_known_person_overrides_stop_list():
+    result = fastpath.extract("和老板吃饭", TODAY, is_known=lambda name: name == "老板")
+    assert result.confidence == 1.0
+    assert result.extraction.profile.name == "老板"
+
+
+def test_full_name_is_extracted():
+    result = fastpath.extract("昨天和张三在上海吃晚饭", TODAY)
+    assert result.confidence == 1.0
+    assert result.extraction.profile.name == "张三"
+    assert result.extraction.profile.events[0].date == "2026-02-19"
+    assert result.extraction.profile.events[0].location == "上海"
+
+
+def test_unknown_nickname_lowers_confidence():
+    assert fastpath.extract("和小王吃饭", TODAY).confidence == 1.0
+    unknown = fastpath.extract("和小王吃饭", TODAY, is_known=lambda name: False)
+    assert unknown.confidence < fastpath.MIN_CONFIDENCE
+    known = fastpath.extract("和小王吃饭", TODAY, is_known=lambda name: True)
+    assert known.confidence == 1.0
+
+
+@pytest.mark.parametrize("text", NOT_A_PERSON[:3])
+def test_extract_escalates_to_model(client, monkeypatch, text):
+    calls = []
+
+    async def fake_extract(api_key, text):
+        calls.append(text)
+        return schemas.ExtractResponse(profile={"name": "某人"})
+
+    monkeypatch.setenv("NVIDIA_API_KEY", "test-key")
+    monkeypatch.setattr(batching, "extract", fake_extract)
+    response = client.post("/extract", json={"text": text})
+    assert response.status_code == 200
+    assert response.json()["profile"]["name"] == "某人"
+    assert calls == [text]
+
+
+def test_extract_without_key_does_not_invent_person(client):
+    response = client.post("/extract", json={"text": "和老板吃饭"})
+    assert response.status_code == 500
@@ -0,0 +1,64 @@
+import pytest
+
+from app import http_cache
+
+
+def test_write_in_another_worker_invalidates_cache(client, create_person):
+    first = client.get("/persons")
+    etag = first.headers["etag"]
+    assert client.get("/persons", headers={"If-None-Match": etag}).status_code == 304
+
+    # 模拟别的 worker 写入：本进程的计数器保持写入前的样子，只有库里的版本号变了
+    local = dict(http_cache._versions)
+    create_person("别的进程写入")
+    http_cache._versions.clear()
+    http_cache._versions.update(local)
+
+    response = client.get("/persons", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "别的进程写入" in {p["name"] for p in response.json()}
+
+
+def test_per_process_versions_refuse_multiple_workers(monkeypatch):
+    monkeypatch.setattr(http_cache, "SHARED_VERSIONS", False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError):
+        http_cache.check_workers()
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    http_cache.check_workers()
+
+
+def test_shared_bump_commits_with_the_data(client):
+    from sqlalchemy import event
+
+    from app import database, models
+    from app.database import SessionLocal
+
+    def persons_version():
+        with SessionLocal() as db:
+            return http_cache.shared_versions(db, ("persons",))
+
+    before = persons_version()
+    with SessionLocal() as db:
+        db.add(models.Person(name="回滚的人"))
+        db.flush()
+        db.rollback()
+    assert persons_version() == before
+
+    log = []
+    cursor = lambda conn, cur, statement, *args: log.append(statement.split()[0] + (
+        " table_versions" if "table_versions" in statement else ""))
+    commit = lambda conn: log.append("COMMIT")
+    event.listen(database.engine, "before_cursor_execute", cursor)
+    event.listen(database.engine, "commit", commit)
+    try:
+        with SessionLocal() as db:
+            db.add(models.Person(name="一起提交"))
+            db.commit()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", cursor)
+        event.remove(database.engine, "commit", commit)
+    assert log.index("INSERT table_versions") < log.index("COMMIT")
+    assert log.count("COMMIT") == 1
+    assert persons_version()[0] == before[0] + 1
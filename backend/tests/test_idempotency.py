@@ -0,0 +1,59 @@
+import pytest
+
+from app import idempotency, models
+from app.database import SessionLocal
+
+
+def _confirm_payload(name):
+    return {"original_text": name, "is_new_person": True, "profile": {"name": name, "events": []},
+            "annotations": [], "developments": [], "relations": []}
+
+
+def _crash_before_finish(monkeypatch):
+    def crash(*args):
+        raise RuntimeError("进程在存响应前退出")
+    monkeypatch.setattr(idempotency, "_finish", crash)
+
+
+def test_retry_rebuilds_response_after_crash_between_commit_and_store(client, monkeypatch):
+    headers = {"Idempotency-Key": "crash-after-commit-1"}
+    with monkeypatch.context() as m:
+        _crash_before_finish(m)
+        with pytest.raises(RuntimeError):
+            client.post("/confirm", json=_confirm_payload("崩溃后重试"), headers=headers)
+
+    # 宽限期内仍视为首次请求还在收尾
+    monkeypatch.setattr(idempotency, "WAIT_SECONDS", 0.1)
+    assert client.post("/confirm", json=_confirm_payload("崩溃后重试"), headers=headers).status_code == 409
+
+    monkeypatch.setattr(idempotency, "COMMITTED_GRACE_SECONDS", 0.0)
+    response = client.post("/confirm", json=_confirm_payload("崩溃后重试"), headers=headers)
+    assert response.status_code == 200
+    assert response.headers[idempotency.REPLAY_HEADER] == "true"
+
+    with SessionLocal() as db:
+        ids = [p.id for p in db.query(models.Person).filter(models.Person.name == "崩溃后重试")]
+    assert ids == [response.json()["person_id"]]
+
+    # 重建的响应已存下，之后照常原样返回
+    again = client.post("/confirm", json=_confirm_payload("崩溃后重试"), headers=headers)
+    assert again.json() == response.json()
+
+
+def test_endpoint_without_rebuild_is_replayed_after_crash(client, create_person, monkeypatch):
+    person_id = create_person("圈子重放")
+    payload = {"circles": [{"name": "重放圈", "color": "#123456", "person_ids": [person_id]}]}
+    headers = {"Idempotency-Key": "crash-after-commit-2"}
+    with monkeypatch.context() as m:
+        _crash_before_finish(m)
+        with pytest.raises(RuntimeError):
+            client.post("/circles/confirm", json=payload, headers=headers)
+
+    monkeypatch.setattr(idempotency, "COMMITTED_GRACE_SECONDS", 0.0)
+    response = client.post("/circles/confirm", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert idempotency.REPLAY_HEADER not in response.headers
+
+    with SessionLocal() as db:
+        circle = db.query(models.Circle).filter(models.Circle.name == "重放圈").one()
+        assert db.query(models.PersonCircle).filter(models.PersonCircle.circle_id == circle.id).count() == 1
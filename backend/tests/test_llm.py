@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import llm, prompts, resilience
+
+MODEL = "z-ai/glm4.7"
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """按顺序返回预设的 (状态码, 响应体)，记录每次请求是否带结构化参数。"""
+    sent = []
+    replies = []
+
+    async def post(api_key, body, timeout):
+        sent.append("response_format" in body or "nvext" in body)
+        status, text = replies.pop(0)
+        return httpx.Response(status, text=text,
+                              request=httpx.Request("POST", llm.NVIDIA_API_URL))
+
+    monkeypatch.setattr(llm, "_post", post)
+    monkeypatch.setattr(llm, "_downgrades", {})
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_limiters", {})
+    return sent, replies
+
+
+def _call():
+    messages = [{"role": "user", "content": "你好"}]
+    return asyncio.run(llm.chat_completion("key", MODEL, messages))
+
+
+OK = (200, '{"choices": [{"message": {"content": "{}"}}]}')
+
+
+def test_unrelated_400_does_not_downgrade_model(upstream):
+    sent, replies = upstream
+    replies.extend([(400, '{"error": "prompt is too long"}'), (400, '{"error": "prompt is too long"}'), OK])
+    with pytest.raises(llm.LLMError):
+        _call()
+    _call()
+    assert sent == [True, False, True]
+
+
+def test_unsupported_response_format_downgrades_until_expiry(upstream, monkeypatch):
+    sent, replies = upstream
+    replies.extend([(400, '{"error": "response_format is not supported"}'), OK, OK])
+    _call()
+    _call()
+    assert sent == [True, False, False]
+
+    monkeypatch.setattr(llm, "_downgrades", {k: 0.0 for k in llm._downgrades})
+    replies.append(OK)
+    _call()
+    assert sent[-1] is True
+
+
+def test_retry_without_extras_takes_a_limiter_token(upstream):
+    sent, replies = upstream
+    limiter = resilience.limiter_for(MODEL)
+    limiter.rate = 0.001  # 不补充令牌
+    limiter._tokens = 1.0
+    replies.append((400, '{"error": "response_format is not supported"}'))
+    with pytest.raises(llm.ModelUnavailable):
+        _call()
+    assert sent == [True]
+
+
+def test_unparseable_output_trips_the_breaker(upstream, monkeypatch):
+    sent, replies = upstream
+    monkeypatch.setattr(llm, "FALLBACK_MODELS", [MODEL])
+    replies.extend([(200, '{"choices": [{"message": {"content": "不是 JSON"}}]}')] * resilience.BREAKER_MIN_CALLS)
+
+    def complete():
+        return asyncio.run(llm.complete_structured(
+            "key", prompts.EXTRACT_PROMPT.render(), "你好", llm.parse_extract_response, use_cache=False))
+
+    for _ in range(resilience.BREAKER_MIN_CALLS):
+        with pytest.raises(llm.LLMError, match="JSON"):
+            complete()
+    assert resilience.breaker_for(MODEL).state == resilience.OPEN
+    with pytest.raises(llm.LLMError, match="熔断"):
+        complete()
+    assert len(sent) == resilience.BREAKER_MIN_CALLS
@@ -0,0 +1,66 @@
+from app import models
+from app.database import SessionLocal
+
+
+def _setup(client, create_person):
+    target = create_person(
+        "合并目标", relations=[("合并丙", "朋友")], developments=["跨境支付"],
+        events=[{"date": "2026-01-02", "description": "一起吃饭"}], birthday="05-20", notes=["喜欢茶"])
+    source = create_person(
+        "合并来源", relations=[("合并目标", "同学"), ("合并丙", "同事")], developments=["跨境支付", "芯片"],
+        events=[{"date": "2026-01-02", "description": "在公司附近吃午饭聊合作"},
+                {"date": "2026-02-03", "description": "参加行业峰会"}],
+        job="投资人", birthday="06-01", notes=["喜欢茶", "怕辣"])
+    for person_id in (target, source):
+        client.post(f"/persons/{person_id}/annotations", json={"time": "2026-03", "description": "约饭"})
+    client.post(f"/persons/{source}/annotations", json={"time": "2026-04", "description": "回访"})
+    response = client.post("/circles/confirm", json={"circles": [
+        {"name": "合并共同圈", "color": "#111111", "person_ids": [target, source]},
+        {"name": "合并来源圈", "color": "#222222", "person_ids": [source]},
+    ]})
+    assert response.status_code == 200
+    return target, source
+
+
+def test_merge_collapses_duplicates(client, create_person):
+    target, source = _setup(client, create_person)
+    response = client.post("/persons/merge", json={"target_id": target, "source_ids": [source]})
+    assert response.status_code == 200, response.text
+    person = response.json()
+
+    # 同一天的相似事件只留描述更详细的一条
+    assert sorted((e["date"], e["description"]) for e in person["events"]) == [
+        ("2026-01-02", "在公司附近吃午饭聊合作"), ("2026-02-03", "参加行业峰会")]
+    assert sorted((a["time"], a["description"]) for a in person["annotations"]) == [
+        ("2026-03", "约饭"), ("2026-04", "回访")]
+    assert sorted(d["content"] for d in person["developments"]) == ["芯片", "跨境支付"]
+    assert all(child["person_id"] == target for kind in ("events", "annotations", "developments")
+               for child in person[kind])
+
+    # 目标已有的字段不覆盖，缺的从来源补上，备注去重合并
+    assert person["profile"]["birthday"] == "05-20"
+    assert person["profile"]["job"] == "投资人"
+    assert person["profile"]["notes"] == ["喜欢茶", "怕辣"]
+
+    assert client.get(f"/persons/{source}").status_code == 404
+    with SessionLocal() as db:
+        third = db.query(models.Person.id).filter(models.Person.name == "合并丙").scalar()
+        pairs = sorted((r.from_person_id, r.to_person_id, r.relation_type) for r in db.query(models.Relation).filter(
+            (models.Relation.from_person_id == target) | (models.Relation.to_person_id == target)))
+        # 来源与目标之间的关系成了自环被删掉；与丙的重复关系只留目标原有的
+        assert pairs == sorted([(target, third, "朋友"), (third, target, "朋友")])
+        assert db.query(models.Relation).filter(
+            (models.Relation.from_person_id == source) | (models.Relation.to_person_id == source)).count() == 0
+
+        circles = sorted(name for name, in db.query(models.Circle.name).join(
+            models.PersonCircle, models.PersonCircle.circle_id == models.Circle.id)
+            .filter(models.PersonCircle.person_id == target))
+        assert circles == ["合并共同圈", "合并来源圈"]
+
+
+def test_merge_rejects_bad_ids(client, create_person):
+    target = create_person("合并校验")
+    assert client.post("/persons/merge", json={"target_id": target, "source_ids": [target]}).status_code == 400
+    assert client.post("/persons/merge", json={"target_id": target, "source_ids": [999999]}).status_code == 404
+    assert client.post("/persons/merge", json={"target_id": target, "source_ids": []}).status_code == 422
+    assert client.get(f"/persons/{target}").status_code == 200
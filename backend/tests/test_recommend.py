@@ -0,0 +1,69 @@
+import math
+
+from app import recommend
+
+
+def _as_dict(scores):
+    return {i: (round(s, 6), c) for i, s, c in zip(scores.ids.tolist(), scores.scores.tolist(), scores.counts.tolist())}
+
+
+def test_circle_and_graph_scores():
+    index = recommend.NetworkIndex()
+    for person_id, circle_id in ((1, 10), (1, 11), (2, 10), (2, 11), (3, 10)):
+        index.add_membership(person_id, circle_id)
+    for a, b in ((1, 2), (2, 4), (1, 5), (5, 4)):
+        index.add_relation(a, b, "同事")
+
+    assert _as_dict(index.circle_scores(1)) == {2: (1.0, 2), 3: (round(1 / math.sqrt(2), 6), 1)}
+    # 直接联系人满分；4 与 1 有两个共同联系人
+    graph = _as_dict(index.graph_scores(1))
+    assert graph[2] == (1.0, 0) and graph[5] == (1.0, 0)
+    assert graph[4] == (round(0.5 * 2 / math.sqrt(2 * 2), 6), 2)
+    assert 1 not in graph
+
+
+def test_scores_follow_incremental_updates():
+    index = recommend.NetworkIndex()
+    index.add_membership(1, 10)
+    index.add_membership(2, 10)
+    assert _as_dict(index.circle_scores(1)) == {2: (1.0, 1)}
+
+    # 打分缓存过的行在写入后要作废
+    index.add_membership(3, 10)
+    index.add_membership(2, 11)
+    assert _as_dict(index.circle_scores(1)) == {2: (round(1 / math.sqrt(2), 6), 1), 3: (1.0, 1)}
+
+    index.remove_circle(10)
+    assert _as_dict(index.circle_scores(1)) == {}
+
+    index.add_relation(1, 2, "朋友")
+    index.add_relation(2, 3, "朋友")
+    index.remove_person(2)
+    assert _as_dict(index.graph_scores(1)) == {}
+    assert _as_dict(index.graph_scores(3)) == {}
+
+
+def test_rank_breaks_ties_by_id_and_keeps_signals():
+    circle = recommend.Scores(*map(recommend.np.array, ([2, 3, 8], [1.0, 1.0, 0.5], [2, 2, 1])))
+    graph = recommend.Scores(*map(recommend.np.array, ([8], [1.0], [3])))
+    development = recommend.scores_from({9: 0.5})
+
+    ids, total, shared, common, dev = (c.tolist() for c in recommend.rank(circle, graph, development, limit=4))
+    assert ids == [8, 2, 3, 9]
+    assert [round(t, 6) for t in total] == [0.45, 0.3, 0.3, 0.2]
+    assert (shared, common, dev) == ([1, 2, 2, 0], [3, 0, 0, 0], [0.0, 0.0, 0.0, 0.5])
+    # 截断处同分时按 id 取
+    assert recommend.rank(circle, graph, development, limit=2)[0].tolist() == [8, 2]
+
+
+def test_similar_persons_endpoint(client, create_person):
+    me = create_person("推荐甲", relations=[("推荐乙", "同事")])
+    mate = create_person("推荐丙")
+    response = client.post("/circles/confirm", json={
+        "circles": [{"name": "推荐圈", "color": "#336699", "person_ids": [me, mate]}]})
+    assert response.status_code == 200
+
+    similar = {p["name"]: p for p in client.get(f"/persons/{me}/similar").json()}
+    assert similar["推荐丙"]["shared_circles"] == 1
+    assert similar["推荐乙"]["relation_type"] == "同事"
+    assert client.get("/persons/999999/similar").status_code == 404
@@ -0,0 +1,87 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+from types import MappingProxyType
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import models, schemas, serialize
+from app.database import SessionLocal
+
+
+def _ordered(raw):
+    # 按解析后的原顺序重新输出，连字段顺序一起比较
+    return json.dumps(json.loads(raw), ensure_ascii=False)
+
+
+def _legacy(schema, value):
+    return json.dumps(jsonable_encoder(TypeAdapter(schema).validate_python(value)), ensure_ascii=False)
+
+
+def test_persons_payload_matches_response_model(client, create_person):
+    person_id = create_person("序列化甲", relations=[("序列化乙", "同事")], developments=["跨境支付"],
+                              events=[{"date": "2026-05-01", "location": "杭州", "description": "见面"}],
+                              job="工程师", notes=["喜欢咖啡"])
+    client.post(f"/persons/{person_id}/annotations", json={"time": "2026-06", "description": "回访"})
+
+    with SessionLocal() as db:
+        persons = db.query(models.Person).order_by(models.Person.id).all()
+        assert _ordered(serialize.dumps(serialize.persons_payload(db))) == _legacy(List[schemas.Person], persons)
+        person = db.get(models.Person, person_id)
+        expected = _legacy(schemas.Person, person)
+        assert _ordered(serialize.dumps(serialize.person_payload(db, person_id))) == expected
+        assert _ordered(serialize.dumps(serialize.person_dict(person))) == expected
+
+    assert _ordered(client.get(f"/persons/{person_id}").content) == expected
+
+
+def test_circles_payload_matches_response_model(client, create_person):
+    person_id = create_person("序列化圈员")
+    client.post("/circles/confirm", json={
+        "circles": [{"name": "序列化圈", "color": "#abcdef", "person_ids": [person_id]}]})
+
+    with SessionLocal() as db:
+        circles = db.query(models.Circle).order_by(models.Circle.id).all()
+        assert _ordered(serialize.dumps(serialize.circles_payload(db))) == _legacy(List[schemas.Circle], circles)
+        legacy = [{"name": c.name, "color": c.color, "id": c.id, "created_at": c.created_at,
+                   "members": [pc.person for pc in sorted(c.person_circles, key=lambda pc: pc.id)]}
+                  for c in circles]
+        with_members = serialize.circles_with_members_payload(db)
+        assert _ordered(serialize.dumps(with_members)) == _legacy(List[schemas.CircleWithMembers], legacy)
+
+
+VALUES = {
+    "utc": datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+    "naive": datetime(2026, 1, 2, 3, 4, 5),
+    "offset": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=8))),
+    "day": date(2026, 2, 28),
+    "profile": MappingProxyType({"name": "张三", "notes": ["对海鲜过敏"]}),
+    "model": schemas.EventBase(date="2026-01-02", description="吃饭"),
+    "numbers": [1, 0.5, None, True],
+}
+
+
+def test_orjson_and_stdlib_fallback_agree(monkeypatch):
+    fast = serialize.dumps(VALUES)
+    monkeypatch.setattr(serialize, "orjson", None)
+    assert serialize.dumps(VALUES) == fast
+    assert json.loads(fast) == {
+        "utc": "2026-01-02T03:04:05.123456Z",
+        "naive": "2026-01-02T03:04:05",
+        "offset": "2026-01-02T03:04:05+08:00",
+        "day": "2026-02-28",
+        "profile": {"name": "张三", "notes": ["对海鲜过敏"]},
+        "model": {"date": "2026-01-02", "location": None, "description": "吃饭"},
+        "numbers": [1, 0.5, None, True],
+    }
+    # 非 ASCII 原样输出，不转义
+    assert "张三".encode("utf-8") in fast
+
+
+def test_dumps_rejects_unknown_types_and_loads_empty():
+    with pytest.raises(TypeError):
+        serialize.dumps({"value": object()})
+    assert serialize.loads(None) == {} and serialize.loads("") == {}
+    assert serialize.loads('{"a": [1]}') == {"a": [1]}
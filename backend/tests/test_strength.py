@@ -0,0 +1,14 @@
+from datetime import date
+
+from app import agenda, strength
+from app.database import SessionLocal
+
+
+def test_decay_uses_app_timezone_today(client, monkeypatch):
+    # 进程本地日期和 APP_TIMEZONE 的日期在午夜前后会不同，强度要跟议程用同一个“今天”
+    monkeypatch.setattr(agenda, "today", lambda: date(2031, 1, 1))
+    with SessionLocal() as db:
+        assert strength.index_for(db).day == date(2031, 1, 1)
+    etag = client.get("/graph").headers["ETag"]
+    monkeypatch.setattr(agenda, "today", lambda: date(2031, 1, 2))
+    assert client.get("/graph").headers["ETag"] != etag
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from app import database
+from app.database import TenantEngines
+
+
+@pytest.fixture
+def tenants(monkeypatch):
+    monkeypatch.setitem(database.TENANT_KEYS, "acme", "acme-key")
+    monkeypatch.setitem(database.TENANT_KEYS, "beta", "beta-key")
+    return {name: {"X-Tenant-ID": name, "X-Tenant-Key": f"{name}-key"} for name in ("acme", "beta")}
+
+
+def _names(client, headers=None):
+    return {p["name"] for p in client.get("/persons", headers=headers or {}).json()}
+
+
+def test_tenants_are_isolated(client, tenants):
+    response = client.post("/confirm", headers=tenants["acme"], json={
+        "original_text": "只在 acme", "is_new_person": True, "profile": {"name": "只在 acme", "events": []},
+        "annotations": [], "developments": [], "relations": [],
+    })
+    assert response.status_code == 200, response.text
+    assert "只在 acme" in _names(client, tenants["acme"])
+    assert "只在 acme" not in _names(client, tenants["beta"])
+    assert "只在 acme" not in _names(client)
+
+
+def test_unknown_tenant_is_not_created(client, tenants):
+    response = client.get("/persons", headers={"X-Tenant-ID": "nobody", "X-Tenant-Key": "x"})
+    assert response.status_code == 404
+    assert not os.path.exists(os.path.join(database.TENANT_DATA_DIR, "nobody.db"))
+    with pytest.raises(LookupError):
+        database.tenant_engines.acquire("nobody")
+
+
+@pytest.mark.parametrize("key", [None, "wrong", "beta-key"])
+def test_tenant_requires_its_own_key(client, tenants, key):
+    headers = {"X-Tenant-ID": "acme"}
+    if key is not None:
+        headers["X-Tenant-Key"] = key
+    assert client.get("/persons", headers=headers).status_code == 401
+
+
+def test_invalid_tenant_id(client):
+    assert client.get("/persons", headers={"X-Tenant-ID": "../etc"}).status_code == 400
+
+
+def test_eviction_drops_engine_and_init_lock(tenants):
+    engines = TenantEngines(max_engines=1, idle_seconds=600)
+    try:
+        engines.acquire("acme")
+        engines.release("acme")
+        engines.acquire("beta")
+        engines.release("beta")
+        assert engines.open_tenants() == ["beta"]
+        assert set(engines._init_locks) == {"beta"}
+    finally:
+        engines.dispose_all()
+
+
+def test_tenant_keys_config():
+    assert database.parse_tenant_keys(" acme:k1, beta:k:2 ,") == {"acme": "k1", "beta": "k:2"}
+    for raw in ("acme", "acme:", "default:k", "a/b:k"):
+        with pytest.raises(ValueError):
+            database.parse_tenant_keys(raw)
+
+
+def test_eviction_releases_tenant_caches(client, tenants, monkeypatch):
+    from app import agenda, embeddings, http_cache, recommend, strength
+
+    headers = tenants["acme"]
+    person_id = client.post("/confirm", headers=headers, json={
+        "original_text": "缓存", "is_new_person": True, "profile": {"name": "缓存", "events": []},
+        "annotations": [], "developments": [{"content": "跨境支付"}], "relations": [],
+    }).json()["person_id"]
+    for path in ("/graph", "/graph/strongest", "/recommend?topic=支付", f"/persons/{person_id}/similar",
+                 "/agenda/digest", "/persons"):
+        assert client.get(path, headers=headers).status_code == 200, path
+    assert "acme" in embeddings._stores and "acme" in strength._indexes and "acme" in recommend._indexes
+
+    monkeypatch.setattr(database.tenant_engines, "idle_seconds", 0)
+    database.tenant_engines.sweep()
+    assert "acme" not in database.tenant_engines.open_tenants()
+    assert "acme" not in embeddings._stores and "acme" not in embeddings._generations
+    assert "acme" not in recommend._indexes and "acme" not in strength._indexes
+    assert not [k for k in agenda._digests if k[0] == "acme"]
+    assert not [k for k in http_cache._bodies if k[0] == "acme"]
+    assert client.get("/persons", headers=headers).status_code == 200
+
+
+def test_per_process_versions_do_not_repeat_after_eviction(monkeypatch):
+    from app import http_cache
+
+    monkeypatch.setattr(http_cache, "_versions", {})
+    before = http_cache.versions("acme", ("persons",))
+    http_cache.bump("acme", ["persons"])
+    bumped = http_cache.versions("acme", ("persons",))
+    http_cache._forget_tenant("acme")
+    after = http_cache.versions("acme", ("persons",))
+    assert len({before, bumped, after}) == 3
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import event
+
+from app import database, timeline
+from app.database import SessionLocal
+
+
+@pytest.mark.skipif(database.engine.dialect.name != "sqlite", reason="EXPLAIN QUERY PLAN 是 SQLite 的语法")
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("cursor", [None, ("2026-01-01", 1, 5)])
+def test_timeline_pages_are_ordered_by_index(client, cursor, descending):
+    statements = []
+    listener = lambda conn, cur, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        with SessionLocal() as db:
+            timeline.get_page(db, 1, cursor, 10, descending)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+    with database.engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = " ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+            assert "USING INDEX ix_" in plan and "TEMP B-TREE" not in plan, plan
+
+
+def test_undated_annotations_sort_first(client, create_person):
+    person_id = create_person("时间线", events=[{"date": "2026-03-01", "description": "见面"}])
+    client.post(f"/persons/{person_id}/annotations", json={"time": "最近", "description": "没日期"})
+    client.post(f"/persons/{person_id}/annotations", json={"time": "2026-04-01", "description": "有日期"})
+
+    page = client.get(f"/persons/{person_id}/timeline", params={"order": "asc", "limit": 2}).json()
+    rest = client.get(f"/persons/{person_id}/timeline",
+                      params={"order": "asc", "cursor": page["next_cursor"]}).json()
+    assert [i["description"] for i in page["items"] + rest["items"]] == ["没日期", "见面", "有日期"]
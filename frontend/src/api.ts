@@ -7,6 +7,7 @@ import type {
   GraphResponse,
   Circle,
   CircleWithMembers,
+  CircleStats,
   AutoGenerateCirclesResponse,
   SuggestedCircle,
 } from './types';
@@ -20,13 +21,38 @@ const api = axios.create({
   },
 });
 
-export const extractInfo = async (text: string): Promise<ExtractResponse> => {
-  const response = await api.post<ExtractResponse>('/extract', { text });
+// signal 中止请求时连接随之断开，后端会停止仍在进行的模型调用
+export const extractInfo = async (text: string, signal?: AbortSignal): Promise<ExtractResponse> => {
+  const response = await api.post<ExtractResponse>('/extract', { text }, { signal });
   return response.data;
 };
 
+// 写接口带 Idempotency-Key：同一次提交的重试共用一个键，后端只执行一次写入
+const WRITE_TIMEOUT_MS = 10000;
+const WRITE_ATTEMPTS = 3;
+
+const postIdempotent = async <T>(url: string, data: unknown) => {
+  const key = crypto.randomUUID();
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await api.post<T>(url, data, {
+        headers: { 'Idempotency-Key': key },
+        timeout: WRITE_TIMEOUT_MS,
+      });
+    } catch (error) {
+      // 只重试超时、断网和 409（首次请求仍在处理），业务错误直接抛出
+      const status = axios.isAxiosError(error) ? error.response?.status : undefined;
+      const retryable = axios.isAxiosError(error) && (status === undefined || status === 409);
+      if (!retryable || attempt >= WRITE_ATTEMPTS) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 300 * attempt));
+    }
+  }
+};
+
 export const confirmData = async (data: ConfirmRequest): Promise<ConfirmResponse> => {
-  const response = await api.post<ConfirmResponse>('/confirm', data);
+  const response = await postIdempotent<ConfirmResponse>('/confirm', data);
   return response.data;
 };
 
@@ -78,6 +104,12 @@ export const getCirclesWithMembers = async (): Promise<CircleWithMembers[]> => {
   return response.data;
 };
 
+// 圈子页只需要成员数和构成，不必拉全部成员档案
+export const getCircleStats = async (): Promise<CircleStats[]> => {
+  const response = await api.get<CircleStats[]>('/circles/stats');
+  return response.data;
+};
+
 export const assignPersonToCircle = async (circleId: number, personId: number): Promise<void> => {
   await api.post(`/circles/${circleId}/persons/${personId}`);
 };
@@ -92,7 +124,7 @@ export const autoGenerateCircles = async (): Promise<AutoGenerateCirclesResponse
 };
 
 export const confirmCircles = async (circles: SuggestedCircle[]): Promise<void> => {
-  await api.post('/circles/confirm', { circles });
+  await postIdempotent('/circles/confirm', { circles });
 };
 
 export const deletePerson = async (personId: number): Promise<void> => {
@@ -110,6 +142,23 @@ export const updatePerson = async (personId: number, data: {
   return response.data;
 };
 
+export const uploadAvatar = async (personId: number, file: File): Promise<Person> => {
+  const form = new FormData();
+  form.append('file', file);
+  const response = await api.post<Person>(`/persons/${personId}/avatar`, form, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+  return response.data;
+};
+
+// 人物数据里的 avatar 是头像哈希，图片走单独的可长期缓存地址；旧数据中的完整 URL 原样使用
+const AVATAR_HASH_RE = /^[0-9a-f]{32}$/;
+
+export const avatarUrl = (avatar: string | undefined, size?: 48 | 96 | 256): string | undefined => {
+  if (!avatar || !AVATAR_HASH_RE.test(avatar)) return avatar;
+  return `${API_BASE_URL}/avatars/${avatar}${size ? `?size=${size}` : ''}`;
+};
+
 export const deleteEvent = async (personId: number, eventId: number): Promise<void> => {
   await api.delete(`/persons/${personId}/events/${eventId}`);
 };
@@ -152,10 +201,10 @@ export interface CompareResponse {
   conflicts: ConflictItem[];
 }
 
-export const compareData = async (personId: number, extractedData: any): Promise<CompareResponse> => {
+export const compareData = async (personId: number, extractedData: any, signal?: AbortSignal): Promise<CompareResponse> => {
   const response = await api.post<CompareResponse>('/extract/compare', { 
     person_id: personId, 
     extracted_data: extractedData 
-  });
+  }, { signal });
   return response.data;
 };
@@ -7,17 +7,17 @@ const { Title } = Typography;
 const MORANDI_COLORS = ['#4A7B9C', '#9B6B6B', '#5F7256', '#B5A189', '#9251A8'];
 
 export function CirclesPage() {
-  const { circlesWithMembers, loading, fetchCirclesWithMembers } = useAppStore();
+  const { circleStats, loading, fetchCircleStats } = useAppStore();
 
   useEffect(() => {
-    fetchCirclesWithMembers();
-  }, [fetchCirclesWithMembers]);
+    fetchCircleStats();
+  }, [fetchCircleStats]);
 
   return (
     <div>
       <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: 20 }}>
         <Title level={4} style={{ color: MORANDI_COLORS[0], margin: 0 }}>
-          圈子 ({circlesWithMembers.length})
+          圈子 ({circleStats.length})
         </Title>
         <div>
           <Button style={{ marginRight: 8 }}>新建圈子</Button>
@@ -29,7 +29,7 @@ export function CirclesPage() {
         <div style={{ textAlign: 'center', padding: 40 }}>
           <Spin size="large" />
         </div>
-      ) : circlesWithMembers.length === 0 ? (
+      ) : circleStats.length === 0 ? (
         <Card style={{ textAlign: 'center', padding: 40, borderRadius: 12, border: 'none' }}>
           <Empty
             description="还没有创建任何圈子"
@@ -38,8 +38,8 @@ export function CirclesPage() {
         </Card>
       ) : (
         <Row gutter={[16, 16]}>
-          {circlesWithMembers.map((circle) => (
-            <Col xs={24} sm={12} md={8} lg={6} key={circle.id}>
+          {circleStats.map((circle) => (
+            <Col xs={24} sm={12} md={8} lg={6} key={circle.circle_id}>
               <Card
                 style={{
                   marginBottom: 16,
@@ -53,8 +53,13 @@ export function CirclesPage() {
                     {circle.name}
                   </Title>
                   <div style={{ color: 'rgba(0,0,0,0.45)', fontSize: 12 }}>
-                    {circle.members?.length || 0} 位成员
+                    {circle.member_count} 位成员
                   </div>
+                  {circle.top_topics.length > 0 && (
+                    <div style={{ color: 'rgba(0,0,0,0.45)', fontSize: 12, marginTop: 4 }}>
+                      {circle.top_topics.slice(0, 3).map((t) => t.topic).join(' · ')}
+                    </div>
+                  )}
                 </div>
               </Card>
             </Col>
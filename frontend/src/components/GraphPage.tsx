@@ -3,7 +3,7 @@ import { Card, Typography, Empty, Spin, Button, message } from 'antd';
 import { SaveOutlined } from '@ant-design/icons';
 import cytoscape from 'cytoscape';
 import { useAppStore } from '../store';
-import { saveGraphLayout, getGraphLayout } from '../api';
+import { saveGraphLayout, getGraphLayout, avatarUrl } from '../api';
 import { PersonDetailModal } from './PersonDetailModal';
 import type { Person } from '../types';
 
@@ -49,7 +49,7 @@ export function GraphPage() {
           data: {
             id: String(node.id),
             name: node.name,
-            avatar: node.avatar,
+            avatar: avatarUrl(node.avatar, 48),
             degree: nodeDegrees[node.id] || 0,
           },
         })),
@@ -59,6 +59,7 @@ export function GraphPage() {
             source: String(edge.source),
             target: String(edge.target),
             relation_type: edge.relation_type,
+            weight: edge.weight ?? 0,
           },
         })),
       ];
@@ -102,7 +103,8 @@ export function GraphPage() {
           {
             selector: 'edge',
             style: {
-              'width': 2,
+              // 线宽随关系强度变化
+              'width': 'mapData(weight, 0, 1, 1, 6)',
               'line-color': '#B5A189',
               'target-arrow-shape': 'none',
               'curve-style': 'bezier',
@@ -1,4 +1,5 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
+import axios from 'axios';
 import { Card, Input, Button, Space, Typography, Row, Col, Avatar, Tag, Empty, Spin, message } from 'antd';
 import { SendOutlined, UserOutlined } from '@ant-design/icons';
 import { extractInfo, checkName, compareData } from '../api';
@@ -25,10 +26,20 @@ export function InfoPage() {
   const [isUpdatingExisting, setIsUpdatingExisting] = useState(false);
   const { persons, setExtractedData, setOriginalText, fetchPersons, loading: storeLoading, setIsComparedData } = useAppStore();
 
+  // 重新提交或离开页面时中止上一次还没返回的抽取/比对请求
+  const pendingRequest = useRef<AbortController | null>(null);
+  const startRequest = () => {
+    pendingRequest.current?.abort();
+    pendingRequest.current = new AbortController();
+    return pendingRequest.current.signal;
+  };
+
   useEffect(() => {
     fetchPersons();
   }, [fetchPersons]);
 
+  useEffect(() => () => pendingRequest.current?.abort(), []);
+
   const handleSubmit = async () => {
     if (!text.trim()) {
       return;
@@ -36,7 +47,7 @@ export function InfoPage() {
 
     try {
       setLoading(true);
-      const data = await extractInfo(text);
+      const data = await extractInfo(text, startRequest());
       
       const nameCheck = await checkName(data.profile.name);
       
@@ -52,6 +63,9 @@ export function InfoPage() {
         setShowConfirm(true);
       }
     } catch (error) {
+      if (axios.isCancel(error)) {
+        return;
+      }
       console.error('提取信息失败:', error);
       message.error('提取信息失败，请重试');
     } finally {
@@ -63,7 +77,7 @@ export function InfoPage() {
     try {
       setLoading(true);
       if (tempExtractedData && conflictPerson) {
-        const comparedData = await compareData(conflictPerson.id, tempExtractedData);
+        const comparedData = await compareData(conflictPerson.id, tempExtractedData, startRequest());
         setIsUpdatingExisting(true);
         setIsComparedData(true);
         setExtractedData(comparedData);
@@ -72,6 +86,9 @@ export function InfoPage() {
         setShowConfirm(true);
       }
     } catch (error) {
+      if (axios.isCancel(error)) {
+        return;
+      }
       console.error('比较数据失败:', error);
       message.error('比较数据失败，请重试');
     } finally {
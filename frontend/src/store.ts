@@ -1,12 +1,13 @@
 import { create } from 'zustand';
-import type { Person, ExtractResponse, GraphResponse, Circle, CircleWithMembers } from './types';
-import { getPersons, getGraph, getCircles, getCirclesWithMembers } from './api';
+import type { Person, ExtractResponse, GraphResponse, Circle, CircleWithMembers, CircleStats } from './types';
+import { getPersons, getGraph, getCircles, getCirclesWithMembers, getCircleStats } from './api';
 
 interface AppState {
   persons: Person[];
   graphData: GraphResponse | null;
   circles: Circle[];
   circlesWithMembers: CircleWithMembers[];
+  circleStats: CircleStats[];
   extractedData: ExtractResponse | null;
   originalText: string;
   loading: boolean;
@@ -27,6 +28,7 @@ interface AppState {
   fetchGraphData: () => Promise<void>;
   fetchCircles: () => Promise<void>;
   fetchCirclesWithMembers: () => Promise<void>;
+  fetchCircleStats: () => Promise<void>;
 }
 
 export const useAppStore = create<AppState>((set) => ({
@@ -34,6 +36,7 @@ export const useAppStore = create<AppState>((set) => ({
   graphData: null,
   circles: [],
   circlesWithMembers: [],
+  circleStats: [],
   extractedData: null,
   originalText: '',
   loading: false,
@@ -97,4 +100,16 @@ export const useAppStore = create<AppState>((set) => ({
       set({ loading: false });
     }
   },
+
+  fetchCircleStats: async () => {
+    try {
+      set({ loading: true, error: null });
+      const circleStats = await getCircleStats();
+      set({ circleStats });
+    } catch (error) {
+      set({ error: '获取圈子统计失败' });
+    } finally {
+      set({ loading: false });
+    }
+  },
 }));
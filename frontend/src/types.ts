@@ -60,6 +60,7 @@ export interface GraphEdge {
   source: number;
   target: number;
   relation_type: string;
+  weight?: number;
 }
 
 export interface GraphResponse {
@@ -78,6 +79,15 @@ export interface CircleWithMembers extends Circle {
   members: Person[];
 }
 
+export interface CircleStats {
+  circle_id: number;
+  name: string;
+  color: string;
+  member_count: number;
+  overlaps: { circle_id: number; count: number }[];
+  top_topics: { topic: string; count: number }[];
+}
+
 export interface SuggestedCircle {
   name: string;
   color: string;